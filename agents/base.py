@@ -1,5 +1,27 @@
+import re
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+
+from config.llm import LLMError
+from telemetry.metrics import span
+
+
+_STORE_ID = re.compile(r"\bstore-[\w-]+", re.IGNORECASE)
+
+
+def extract_store_id(context: Optional[str]) -> Optional[str]:
+    """
+    Pull the store id (e.g. "store-001") out of the context string the
+    frontend sends, such as "Current store: store-001".
+    """
+    if not context:
+        return None
+    match = _STORE_ID.search(context)
+    return match.group(0) if match else None
+
+
+def error_message(error: LLMError) -> str:
+    return f"The AI service is temporarily unavailable ({error.kind}). Please try again shortly."
 
 
 class BaseAgent(ABC):
@@ -11,6 +33,9 @@ class BaseAgent(ABC):
     - can run a task using an LLM
     """
 
+    # Extra options for this agent's LLM calls (e.g. max_tokens)
+    llm_options: Dict[str, Any] = {}
+
     def __init__(
         self,
         name: str,
@@ -28,20 +53,53 @@ class BaseAgent(ABC):
         """
         pass
 
-    def run(self, user_input: str, context: Optional[str] = None) -> Dict[str, Any]:
+    async def prepare(self, user_input: str, context: Optional[str] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Returns the prompt and the structured data for the response's
+        `data` field. Agents that compute data before calling the LLM
+        override this.
+        """
+        return self.build_prompt(user_input, context), None
+
+    async def run(self, user_input: str, context: Optional[str] = None) -> Dict[str, Any]:
         """
         Execute the agent with given input and context.
         """
-        prompt = self.build_prompt(user_input, context)
+        with span(f"{self.name}.prepare"):
+            prompt, data = await self.prepare(user_input, context)
+
+        try:
+            with span(f"{self.name}.llm"):
+                response_text = await self.llm(prompt, **self.llm_options)
+        except LLMError as e:
+            return self.build_error_response(e, data)
+
+        return self.build_response(response_text, data)
 
-        response_text = self.llm(prompt)
+    async def run_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Streaming variant of `run` for a prompt from `prepare`: yields the
+        answer text as it is generated. Callers assemble the final
+        envelope with `build_response`.
+        """
+        async for token in self.llm.stream(prompt, **self.llm_options):
+            yield token
 
+    def build_response(self, response_text: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         return {
             "agent": self.name,
             "response": response_text,
             "output": response_text,
-            "data": None,
+            "data": data,
             "publicUrl": None,
             "downloadUrl": None,
             "meta": {},
         }
+
+    def build_error_response(self, error: LLMError, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Envelope for a failed LLM call; `error` carries the structured cause.
+        """
+        response = self.build_response(error_message(error), data)
+        response["error"] = error.to_dict()
+        return response
@@ -0,0 +1,96 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_message(message: str) -> str:
+    """
+    Case/whitespace-insensitive form of a user message, used as a cache key.
+    """
+    text = _WHITESPACE.sub(" ", (message or "").strip().lower())
+    return _TRAILING_PUNCT.sub("", text)
+
+
+class TTLCache:
+    """
+    LRU cache with a per-entry time-to-live.
+
+    Entries can carry a tag (the store id they were computed from) so that
+    a change to one store's inventory drops only that store's entries.
+    Untagged entries are dropped on any inventory change.
+    """
+
+    ANY_STORE = "*"
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, str]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, tag: Optional[str] = None) -> None:
+        tag = tag or self.ANY_STORE
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tag)
+        self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        """
+        Drop entries for one store (plus untagged ones); `None` clears everything.
+        """
+        if tag is None:
+            self._entries.clear()
+            self._tags.clear()
+            return
+
+        for t in (tag, self.ANY_STORE):
+            for key in list(self._tags.get(t, ())):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._tags.get(entry[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry[2]]
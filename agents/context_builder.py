@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import versions
+from memory.store import estimate_tokens
+
+# StockAgent's risk bands (days of cover), shared with its prompt. They are
+# the agent's own bands, stricter than the endpoints' is_critical flag.
+RISK_CRITICAL_DAYS = 3
+RISK_LOW_DAYS = 7
+
+
+def risk_band(days_of_cover: Optional[float]) -> str:
+    """
+    Risk levels as defined in the StockAgent prompt.
+    """
+    if days_of_cover is None:
+        return "NO_SALES"
+    if days_of_cover < RISK_CRITICAL_DAYS:
+        return "CRITICAL"
+    if days_of_cover < RISK_LOW_DAYS:
+        return "LOW"
+    return "HEALTHY"
+
+
+class InventoryContextBuilder:
+    """
+    Assembles the store data StockAgent and SalesAgent reason over.
+
+    Pulls the store's rows, precomputes `days_of_cover` and the risk band,
+    ranks products riskiest first and renders them as a compact pipe table
+    truncated to `token_budget`. The rendered block is cached per store
+    until that store's inventory version changes.
+    """
+
+    HEADER = "product_name | current_stock | avg_daily_sales | days_of_cover | risk"
+
+    def __init__(self, database, token_budget: int = 1200):
+        self.database = database
+        self.token_budget = token_budget
+        self._cache: Dict[str, Tuple[int, str]] = {}
+
+    async def build(self, store_id: Optional[str]) -> str:
+        if not store_id:
+            return ""
+
+        version = versions.get_version(store_id)
+        cached = self._cache.get(store_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        rows = await self._fetch(store_id)
+        text = self.render(store_id, rows)
+        self._cache[store_id] = (version, text)
+        return text
+
+    async def _fetch(self, store_id: str) -> List[Dict[str, Any]]:
+        rows = await self.database.fetch_all(
+            """
+            SELECT p.id, p.name, p.current_stock, p.avg_daily_sales, s.name AS store_name
+            FROM products p LEFT JOIN stores s ON s.id = p.store_id
+            WHERE p.store_id = :store_id
+            """,
+            values={"store_id": store_id},
+        )
+        products = []
+        for row in rows:
+            product = dict(row)
+            stock = product.get("current_stock") or 0
+            sales = product.get("avg_daily_sales") or 0
+            product["days_of_cover"] = round(stock / sales, 1) if sales > 0 else None
+            product["risk"] = risk_band(product["days_of_cover"])
+            products.append(product)
+        return products
+
+    def render(self, store_id: str, products: List[Dict[str, Any]]) -> str:
+        if not products:
+            return f"Store {store_id}: no products found."
+
+        # Riskiest first (faster sellers break ties); products without sales
+        # have no cover figure and go last
+        ranked = sorted(
+            products,
+            key=lambda p: (
+                p["days_of_cover"] is None,
+                p["days_of_cover"] or 0.0,
+                -(p.get("avg_daily_sales") or 0),
+            ),
+        )
+        counts = {band: 0 for band in ("CRITICAL", "LOW", "HEALTHY", "NO_SALES")}
+        for p in ranked:
+            counts[p["risk"]] += 1
+
+        store_name = ranked[0].get("store_name") or store_id
+        lines = [
+            f"Store: {store_name} ({store_id}) | products: {len(ranked)} | "
+            f"critical: {counts['CRITICAL']} | low: {counts['LOW']} | healthy: {counts['HEALTHY']}",
+            self.HEADER,
+        ]
+        used = sum(estimate_tokens(line) for line in lines)
+
+        shown = 0
+        for p in ranked:
+            cover = p["days_of_cover"] if p["days_of_cover"] is not None else "n/a"
+            line = f"{p.get('name')} | {p.get('current_stock') or 0} | {p.get('avg_daily_sales') or 0} | {cover} | {p['risk']}"
+            cost = estimate_tokens(line)
+            if used + cost > self.token_budget:
+                break
+            lines.append(line)
+            used += cost
+            shown += 1
+
+        if shown < len(ranked):
+            lines.append(f"... {len(ranked) - shown} lower-risk products omitted")
+        return "\n".join(lines)
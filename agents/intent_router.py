@@ -0,0 +1,193 @@
+import math
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+AGENTS = ("sales_agent", "reporting_agent", "stock_agent")
+
+# Keyword rules: each match adds RULE_WEIGHT to the agent's log-score.
+RULES: Dict[str, List[str]] = {
+    "sales_agent": [
+        r"\bsales?\b", r"\bsold\b", r"\bselling\b", r"\brevenue\b", r"\btrend(s|ing)?\b",
+        r"\bbest[- ]sellers?\b", r"\btop (products|sellers|items)\b", r"\bperformance\b",
+        r"\binsights?\b", r"\bdemand\b", r"\bgrowth\b",
+    ],
+    "reporting_agent": [
+        r"\breports?\b", r"\bkpis?\b", r"\btable\b", r"\bsummar(y|ize|ise)\b",
+        r"\bdashboard\b", r"\bexport\b", r"\bweekly\b", r"\bmonthly\b", r"\bmetrics\b",
+        r"\bpdf\b", r"\bcsv\b",
+    ],
+    "stock_agent": [
+        r"\bstocks?\b", r"\binventory\b", r"\breorder\b", r"\breplenish\w*\b",
+        r"\btransfers?\b", r"\bcritical\b", r"\brun(ning)? out\b", r"\bout of stock\b",
+        r"\bdays? of cover\b", r"\bdays? left\b", r"\bsafety stock\b", r"\blow stock\b",
+        r"\brestock\w*\b",
+    ],
+}
+
+RULE_WEIGHT = 1.5
+
+# Naive Bayes log-likelihoods are averaged per feature and scaled, so long
+# messages don't produce overconfident scores.
+NB_SCALE = 6.0
+
+# Labeled examples for the hashed n-gram model.
+EXAMPLES: List[Tuple[str, str]] = [
+    ("sales_agent", "how are sales going this week"),
+    ("sales_agent", "which products sell the best"),
+    ("sales_agent", "why did revenue drop"),
+    ("sales_agent", "what are the top sellers in this store"),
+    ("sales_agent", "analyze sales performance"),
+    ("sales_agent", "give me insights on customer demand"),
+    ("sales_agent", "is the keyboard selling better than the mouse"),
+    ("sales_agent", "what should we do to increase sales"),
+    ("sales_agent", "show the sales trend for headphones"),
+    ("sales_agent", "which items are growing fastest"),
+    ("sales_agent", "recommend how to boost revenue"),
+    ("sales_agent", "compare sales between products"),
+    ("reporting_agent", "generate a weekly report"),
+    ("reporting_agent", "create a kpi summary"),
+    ("reporting_agent", "give me a table of all products"),
+    ("reporting_agent", "prepare a monthly sales report"),
+    ("reporting_agent", "summarize the store metrics"),
+    ("reporting_agent", "export the inventory report as csv"),
+    ("reporting_agent", "build a dashboard summary"),
+    ("reporting_agent", "report on store performance kpis"),
+    ("reporting_agent", "list totals and key metrics in a table"),
+    ("reporting_agent", "make a structured report for management"),
+    ("reporting_agent", "produce an overview report for all stores"),
+    ("reporting_agent", "i need a report"),
+    ("stock_agent", "which products are critical"),
+    ("stock_agent", "what should i reorder"),
+    ("stock_agent", "how many days of cover do we have"),
+    ("stock_agent", "are we running out of anything"),
+    ("stock_agent", "show low stock items"),
+    ("stock_agent", "suggest replenishment for this store"),
+    ("stock_agent", "should we transfer stock between stores"),
+    ("stock_agent", "inventory risk for the warehouse"),
+    ("stock_agent", "which items are below safety stock"),
+    ("stock_agent", "how much stock is left for webcams"),
+    ("stock_agent", "what needs restocking"),
+    ("stock_agent", "check stock levels"),
+]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Boundaries between the parts of a compound request
+_CLAUSE = re.compile(r"[;?]|,?\s+(?:and also|and then|as well as|and|also|plus|then)\s+", re.IGNORECASE)
+
+
+def _features(text: str, buckets: int) -> List[int]:
+    """
+    Hashed word unigrams, word bigrams and character trigrams.
+    """
+    words = _TOKEN.findall(text.lower())
+    grams = list(words)
+    grams.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return [zlib.crc32(g.encode("utf-8")) % buckets for g in grams]
+
+
+class IntentRouter:
+    """
+    In-process intent classifier placed in front of the routing LLM call.
+
+    Scores each agent with a multinomial naive Bayes model over hashed
+    n-grams plus keyword rules, and returns the winning agent with a
+    softmax confidence. Callers fall back to the LLM when the confidence
+    is below `threshold`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        buckets: int = 4096,
+        examples: Optional[List[Tuple[str, str]]] = None,
+    ):
+        self.threshold = threshold
+        self.buckets = buckets
+        self.rules = {
+            agent: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for agent, patterns in RULES.items()
+        }
+        self.local_hits = 0
+        self.fallbacks = 0
+        self.fit(examples if examples is not None else EXAMPLES)
+
+    def fit(self, examples: List[Tuple[str, str]]) -> None:
+        counts = {agent: {} for agent in AGENTS}
+        totals = {agent: 0 for agent in AGENTS}
+        docs = {agent: 0 for agent in AGENTS}
+
+        for agent, text in examples:
+            docs[agent] += 1
+            for f in _features(text, self.buckets):
+                counts[agent][f] = counts[agent].get(f, 0) + 1
+                totals[agent] += 1
+
+        n_docs = sum(docs.values()) or 1
+        self._prior = {a: math.log((docs[a] + 1) / (n_docs + len(AGENTS))) for a in AGENTS}
+        self._log_prob = {
+            a: {f: math.log((c + 1) / (totals[a] + self.buckets)) for f, c in counts[a].items()}
+            for a in AGENTS
+        }
+        self._unseen = {a: math.log(1 / (totals[a] + self.buckets)) for a in AGENTS}
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        """
+        Returns (agent_name, confidence in [0, 1]).
+        """
+        features = _features(text, self.buckets)
+        scores = {}
+        for agent in AGENTS:
+            log_prob = self._log_prob[agent]
+            unseen = self._unseen[agent]
+            likelihood = sum(log_prob.get(f, unseen) for f in features) / max(len(features), 1)
+            score = self._prior[agent] + NB_SCALE * likelihood
+            score += RULE_WEIGHT * sum(1 for rule in self.rules[agent] if rule.search(text))
+            scores[agent] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / norm
+
+    def route(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Returns the agent when the local model is confident enough, else
+        (None, confidence) so the caller asks the LLM. Updates the counters.
+        """
+        agent, confidence = self.classify(text)
+        if confidence >= self.threshold:
+            self.local_hits += 1
+            return agent, confidence
+        self.fallbacks += 1
+        return None, confidence
+
+    def plan(self, text: str) -> Optional[List[str]]:
+        """
+        Agents for a compound request whose parts confidently ask for
+        different agents, in the order asked: "how are sales trending and
+        what should I reorder?" -> [sales_agent, stock_agent]. None when the
+        request has a single intent. Does not update the counters.
+        """
+        agents: List[str] = []
+        for clause in _CLAUSE.split(text):
+            if len(_TOKEN.findall(clause.lower())) < 2:
+                continue
+            agent, confidence = self.classify(clause)
+            if confidence >= self.threshold and agent not in agents:
+                agents.append(agent)
+        return agents if len(agents) > 1 else None
+
+    def stats(self) -> Dict[str, float]:
+        total = self.local_hits + self.fallbacks
+        return {
+            "threshold": self.threshold,
+            "local_hits": self.local_hits,
+            "llm_fallbacks": self.fallbacks,
+            "local_hit_rate": round(self.local_hits / total, 4) if total else 0.0,
+        }
@@ -1,15 +1,62 @@
+import asyncio
+import time
+
+from agents.base import error_message, extract_store_id
+from agents.cache import TTLCache, normalize_message
+from agents.intent_router import IntentRouter
 from agents.sales_agent import SalesAgent
 from agents.reporting_agent import ReportingAgent
 from agents.stock_agent import StockAgent
+from config.llm import LLMError
+from db import versions
+from telemetry.metrics import record_failure, span
+
+
+# Headings of the per-agent parts of a multi-agent answer
+SECTION_TITLES = {
+    "sales_agent": "Sales",
+    "reporting_agent": "Report",
+    "stock_agent": "Stock",
+}
 
 
 class Orchestrator:
     """
     Decides which agent should handle the user's request.
+
+    Compound requests ("how are sales trending and what should I
+    reorder?") are planned onto several agents, which run concurrently
+    (at most `max_parallel_agents` at a time, each within `agent_timeout`
+    seconds); their answers are merged into one envelope whose
+    meta.sections holds each agent's part and timing.
     """
 
-    def __init__(self, llm):
+    # Agents whose context includes the inventory snapshot and retrieval
+    INVENTORY_AGENTS = ("sales_agent", "stock_agent")
+
+    def __init__(
+        self,
+        llm,
+        cache_size: int = 1024,
+        cache_ttl: float = 300.0,
+        router_threshold: float = 0.8,
+        retriever=None,
+        retrieval_k: int = 20,
+        memory=None,
+        context_builder=None,
+        database=None,
+        artifacts=None,
+        max_parallel_agents: int = 3,
+        agent_timeout: float = 25.0,
+    ):
         self.llm = llm
+        self.max_parallel_agents = max_parallel_agents
+        self.agent_timeout = agent_timeout
+        self.retriever = retriever
+        self.memory = memory
+        self.context_builder = context_builder
+        self.retrieval_k = retrieval_k
+        self.intent_router = IntentRouter(threshold=router_threshold)
 
         self.sales_agent = SalesAgent(
             name="sales_agent",
@@ -20,16 +67,61 @@ class Orchestrator:
         self.reporting_agent = ReportingAgent(
             name="reporting_agent",
             llm=llm,
-            system_prompt=""
+            system_prompt="",
+            database=database,
+            artifacts=artifacts,
         )
 
         self.stock_agent = StockAgent(
             name="stock_agent",
             llm=llm,
-            system_prompt=""
+            system_prompt="",
+            database=database,
         )
 
-    def route(self, user_input: str, context: str = None):
+        self.agents = {
+            "sales_agent": self.sales_agent,
+            "reporting_agent": self.reporting_agent,
+            "stock_agent": self.stock_agent,
+        }
+
+        # Routing only depends on the message; answers also depend on the
+        # context and are dropped when the store's inventory changes.
+        self.decision_cache = TTLCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.response_cache = TTLCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        versions.subscribe(self.response_cache.invalidate)
+
+    async def decide(self, user_input: str):
+        """
+        Returns the agent name for the request, or an error envelope when
+        the LLM call failed.
+        """
+        with span("route"):
+            return await self._decide(user_input)
+
+    async def plan(self, user_input: str):
+        """
+        Like `decide`, but returns the list of agents to run: several for
+        a compound request, otherwise the one `decide` picks.
+        """
+        agents = self.intent_router.plan(user_input)
+        if agents:
+            return agents
+        decision = await self.decide(user_input)
+        return [decision] if isinstance(decision, str) else decision
+
+    async def _decide(self, user_input: str):
+        decision_key = normalize_message(user_input)
+        cached = self.decision_cache.get(decision_key)
+        if cached is not None:
+            return cached
+
+        # Fast path: confident local classification skips the routing LLM call
+        agent_name, _ = self.intent_router.route(user_input)
+        if agent_name is not None:
+            self.decision_cache.set(decision_key, agent_name)
+            return agent_name
+
         decision_prompt = f"""
 You are an AI orchestrator.
 
@@ -49,45 +141,372 @@ Respond with ONLY one of the following values:
 - stock_agent
 """
 
-        decision_raw = self.llm(decision_prompt)
+        try:
+            decision_raw = await self.llm(decision_prompt)
+        except LLMError as e:
+            # Routing failed; tell the user instead of guessing an agent
+            return self._error_response(e)
         decision = (decision_raw or "").strip()
 
-        # If the LLM call returned an error message, directly return it to the user
-        if "An error occurred in the LLM call" in decision:
-            return {
-                "agent": "general",
-                "response": decision,
-                "output": decision,
-                "data": None,
-                "publicUrl": None,
-                "downloadUrl": None,
-                "meta": {},
-            }
+        agent_name = self._parse_decision(decision)
+        if agent_name is not None:
+            self.decision_cache.set(decision_key, agent_name)
+        return agent_name
 
+    @staticmethod
+    def _parse_decision(decision: str):
         d = decision.lower()
 
         if d in ("sales_agent", "sales"):
-            return self.sales_agent.run(user_input, context)
+            return "sales_agent"
 
         if d in ("reporting_agent", "report", "report_agent"):
-            return self.reporting_agent.run(user_input, context)
+            return "reporting_agent"
 
         if d in ("stock_agent", "stock", "inventory_agent", "inventory"):
-            return self.stock_agent.run(user_input, context)
+            return "stock_agent"
 
         if "sales" in d:
-            return self.sales_agent.run(user_input, context)
+            return "sales_agent"
 
         if "report" in d:
-            return self.reporting_agent.run(user_input, context)
+            return "reporting_agent"
 
         if "stock" in d or "inventory" in d:
-            return self.stock_agent.run(user_input, context)
+            return "stock_agent"
 
-        # fallback
+        return None
+
+    @staticmethod
+    def _error_response(error: LLMError):
+        text = error_message(error)
+        return {
+            "agent": "general",
+            "response": text,
+            "output": text,
+            "data": None,
+            "publicUrl": None,
+            "downloadUrl": None,
+            "error": error.to_dict(),
+            "meta": {},
+        }
+
+    @staticmethod
+    def _fallback_response():
         fallback_text = "I couldn't route your request to a suitable agent at the moment. Could you please clarify your request a bit more?"
         return {
             "agent": "general",
             "response": fallback_text,
             "output": fallback_text,
         }
+
+    def _cached_response(self, cache_key):
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        return {**cached, "meta": {**cached.get("meta", {}), "cached": True}}
+
+    def _store_response(self, cache_key, result, context, plan):
+        result.setdefault("meta", {})["cached"] = False
+        if not result.get("error") and not result["meta"].get("incomplete"):
+            # Answers built on other stores' data are dropped on any change
+            cross_store = any(getattr(self.agents[name], "cross_store", False) for name in plan)
+            tag = None if cross_store else extract_store_id(context)
+            self.response_cache.set(cache_key, result, tag=tag)
+
+    async def _history(self, session_id: str = None) -> str:
+        if self.memory is None or not session_id:
+            return ""
+        with span("history"):
+            await self.memory.ensure_loaded(session_id)
+            return self.memory.history(session_id)
+
+    def _remember(self, session_id: str, user_input: str, result) -> None:
+        if self.memory is None or not session_id:
+            return
+        self.memory.append(session_id, "user", user_input)
+        self.memory.append(session_id, "assistant", str(result.get("response") or ""))
+
+    async def build_context(self, agent_name: str, user_input: str, context: str = None, history: str = ""):
+        """
+        Adds the conversation history and, for the agents that reason over
+        product rows, the store's inventory snapshot and the products
+        relevant to the question to the client context.
+        """
+        sections = [context or ""]
+        if history:
+            sections.append(f"Conversation so far:\n{history}")
+
+        if agent_name not in self.INVENTORY_AGENTS:
+            return "\n\n".join(s for s in sections if s) or context
+
+        store_id = extract_store_id(context)
+        if self.context_builder is not None:
+            snapshot = await self.context_builder.build(store_id)
+            if snapshot:
+                sections.append(f"Inventory snapshot (riskiest first):\n{snapshot}")
+
+        if self.retriever is not None:
+            rows = await self.retriever.search(user_input, store_id=store_id, k=self.retrieval_k)
+            if rows:
+                sections.append(f"Relevant products:\n{self.retriever.format_rows(rows)}")
+
+        return "\n\n".join(s for s in sections if s) or context
+
+    async def route(self, user_input: str, context: str = None, session_id: str = None):
+        result = await self._route(user_input, context, session_id)
+        self._remember(session_id, user_input, result)
+        return result
+
+    async def _route(self, user_input: str, context: str = None, session_id: str = None):
+        plan = await self.plan(user_input)
+        if isinstance(plan, dict):
+            return plan
+
+        if plan is None:
+            # fallback
+            return self._fallback_response()
+
+        history = await self._history(session_id)
+        cache_key = (normalize_message(user_input), context or "", history, tuple(plan))
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+        if len(plan) > 1:
+            started = time.perf_counter()
+            sections = self._start_sections(plan, user_input, context, history)
+            outcomes = await asyncio.gather(*sections)
+            result = self._merge(plan, outcomes, started)
+        else:
+            decision = plan[0]
+            with span("context"):
+                agent_context = await self.build_context(decision, user_input, context, history)
+            result = await self.agents[decision].run(user_input, agent_context)
+        self._store_response(cache_key, result, context, plan)
+        return result
+
+    def _start_sections(self, plan, user_input: str, context: str = None, history: str = ""):
+        """
+        Starts one task per planned agent. Each resolves to (agent name,
+        envelope, elapsed ms) and never raises: a failed or timed-out agent
+        yields an envelope with an `error`.
+        """
+        slots = asyncio.Semaphore(max(1, self.max_parallel_agents))
+        # Sales and stock agents get the same context; build it once
+        contexts = {}
+
+        async def run(name):
+            async with slots:
+                shared = name in self.INVENTORY_AGENTS
+                if shared not in contexts:
+                    contexts[shared] = asyncio.ensure_future(self.build_context(name, user_input, context, history))
+                with span("context"):
+                    agent_context = await asyncio.shield(contexts[shared])
+                return await self.agents[name].run(user_input, agent_context)
+
+        async def section(name):
+            started = time.perf_counter()
+            try:
+                # The deadline includes waiting for a slot
+                result = await asyncio.wait_for(run(name), timeout=self.agent_timeout)
+            except asyncio.TimeoutError as e:
+                record_failure(name, e)
+                text = f"The {SECTION_TITLES[name].lower()} analysis did not finish within {self.agent_timeout:g}s."
+                result = {"agent": name, "response": text, "data": None, "error": {"type": "timeout", "message": text}}
+            except Exception as e:
+                record_failure(name, e)
+                text = f"The {SECTION_TITLES[name].lower()} analysis failed: {e}"
+                result = {"agent": name, "response": text, "data": None, "error": {"type": "internal", "message": str(e)}}
+            return name, result, round((time.perf_counter() - started) * 1000, 1)
+
+        return [asyncio.ensure_future(section(name)) for name in plan]
+
+    @staticmethod
+    def _section_text(name: str, result) -> str:
+        return f"{SECTION_TITLES[name]}:\n{(result.get('response') or '').strip()}"
+
+    def _merge(self, plan, outcomes, started: float):
+        """
+        One envelope from the agents' outcomes, in plan order. The first
+        agent that answered is the primary one: its name and data fill the
+        top-level fields, so single-agent clients keep working.
+        """
+        by_agent = {name: (result, elapsed) for name, result, elapsed in outcomes}
+        sections = []
+        for name in plan:
+            result, elapsed = by_agent[name]
+            section = {
+                "agent": name,
+                "response": result.get("response") or "",
+                "data": result.get("data"),
+                "elapsed_ms": elapsed,
+            }
+            if result.get("error"):
+                section["error"] = result["error"]
+            if result.get("publicUrl"):
+                section["publicUrl"] = result["publicUrl"]
+                section["downloadUrl"] = result.get("downloadUrl")
+            sections.append(section)
+
+        answered = [s for s in sections if "error" not in s]
+        primary = (answered or sections)[0]
+        linked = next((s for s in sections if s.get("publicUrl")), {})
+        text = "\n\n".join(self._section_text(name, by_agent[name][0]) for name in plan)
+        merged = {
+            "agent": primary["agent"],
+            "response": text,
+            "output": text,
+            "data": primary["data"],
+            "publicUrl": linked.get("publicUrl"),
+            "downloadUrl": linked.get("downloadUrl"),
+            "meta": {
+                "agents": list(plan),
+                "sections": sections,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                "incomplete": len(answered) < len(sections),
+            },
+        }
+        if not answered:
+            merged["error"] = sections[0]["error"]
+        return merged
+
+    async def route_batch(self, items, concurrency: int = 8):
+        """
+        Routes many requests together. Each item is a dict with message and
+        optional context/session_id; results come back in input order.
+
+        - Distinct messages are routed once, before any agent runs.
+        - Identical requests (same normalized message, context and session)
+          share one in-flight execution.
+        - At most `concurrency` agent executions run at the same time.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        batch_started = time.perf_counter()
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        distinct = {normalize_message(item["message"]): item["message"] for item in items}
+        await asyncio.gather(
+            *(bounded(self.decide(message)) for message in distinct.values()),
+            return_exceptions=True,
+        )
+
+        async def execute(item):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await self.route(item["message"], item.get("context"), item.get("session_id"))
+                except Exception as e:
+                    record_failure("batch", e)
+                    text = f"An error occurred while processing your request: {e}"
+                    result = {
+                        "agent": "error",
+                        "response": text,
+                        "output": text,
+                        "error": {"type": "internal", "message": str(e)},
+                        "meta": {"cached": False},
+                    }
+                finished = time.perf_counter()
+            return result, {
+                "queued_ms": round((started - batch_started) * 1000, 1),
+                "run_ms": round((finished - started) * 1000, 1),
+            }
+
+        keys = [
+            (normalize_message(item["message"]), item.get("context") or "", item.get("session_id"))
+            for item in items
+        ]
+        inflight = {}
+        owners = []
+        for key, item in zip(keys, items):
+            owners.append(key not in inflight)
+            if key not in inflight:
+                inflight[key] = asyncio.ensure_future(execute(item))
+        await asyncio.gather(*inflight.values())
+
+        results = []
+        for index, (key, owner) in enumerate(zip(keys, owners)):
+            result, timing = inflight[key].result()
+            results.append({
+                **result,
+                "meta": {**(result.get("meta") or {}), "deduplicated": not owner},
+                "index": index,
+                "timing": timing,
+            })
+        return results
+
+    async def route_stream(self, user_input: str, context: str = None, session_id: str = None):
+        """
+        Streaming variant of `route`. Yields (event, payload) pairs:
+        "route" with the chosen agent, "token" per text delta, and "final"
+        with the same envelope `route` would return.
+
+        A multi-agent plan is announced in "route" as `agents`; each
+        agent's section arrives as one "token" as soon as it is done.
+        """
+        plan = await self.plan(user_input)
+        if isinstance(plan, dict) or plan is None:
+            result = plan if plan is not None else self._fallback_response()
+            self._remember(session_id, user_input, result)
+            yield "route", {"agent": result["agent"]}
+            yield "final", result
+            return
+
+        decision = plan[0]
+        yield "route", {"agent": decision, "agents": plan}
+
+        history = await self._history(session_id)
+        cache_key = (normalize_message(user_input), context or "", history, tuple(plan))
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            self._remember(session_id, user_input, cached)
+            yield "token", {"text": cached.get("response") or ""}
+            yield "final", cached
+            return
+
+        if len(plan) > 1:
+            started = time.perf_counter()
+            sections = self._start_sections(plan, user_input, context, history)
+            try:
+                separator = ""
+                for next_done in asyncio.as_completed(sections):
+                    name, result, _ = await next_done
+                    yield "token", {"text": separator + self._section_text(name, result)}
+                    separator = "\n\n"
+            finally:
+                # The client went away; stop the agents still running
+                for task in sections:
+                    task.cancel()
+            result = self._merge(plan, [task.result() for task in sections], started)
+            self._store_response(cache_key, result, context, plan)
+            self._remember(session_id, user_input, result)
+            yield "final", result
+            return
+
+        agent = self.agents[decision]
+        with span("context"):
+            agent_context = await self.build_context(decision, user_input, context, history)
+        with span(f"{agent.name}.prepare"):
+            prompt, data = await agent.prepare(user_input, agent_context)
+        parts = []
+        try:
+            # Includes the time the client takes to consume each token
+            with span(f"{agent.name}.llm"):
+                async for token in agent.run_stream(prompt):
+                    parts.append(token)
+                    yield "token", {"text": token}
+        except LLMError as e:
+            result = agent.build_error_response(e, data)
+            result.setdefault("meta", {})["cached"] = False
+            result["meta"]["partial"] = "".join(parts)
+            self._remember(session_id, user_input, result)
+            yield "final", result
+            return
+
+        result = agent.build_response("".join(parts).strip(), data)
+        self._store_response(cache_key, result, context, plan)
+        self._remember(session_id, user_input, result)
+        yield "final", result
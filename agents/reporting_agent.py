@@ -1,37 +1,66 @@
-from typing import Optional
-from agents.base import BaseAgent
+from typing import Any, Dict, Optional, Tuple
+from agents.base import BaseAgent, extract_store_id
+from analytics.reporting import build_report, export_report, report_digest
+from telemetry.metrics import record_failure
 
 
 class ReportingAgent(BaseAgent):
     """
     Agent responsible for generating structured reports from sales data.
+
+    KPIs and tables are computed by analytics.reporting and returned in
+    the response's `data`; the LLM only writes the narrative summary over
+    a fixed-size digest of them. With an ArtifactStore, the full product
+    table is exported too and linked through publicUrl/downloadUrl.
     """
 
+    llm_options = {"max_tokens": 300}
+
+    def __init__(self, name: str, llm, system_prompt: str, database=None, artifacts=None):
+        super().__init__(name=name, llm=llm, system_prompt=system_prompt)
+        self.database = database
+        self.artifacts = artifacts
+
+    async def prepare(self, user_input: str, context: Optional[str] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        if self.database is None:
+            return self.build_prompt(user_input, context), None
+
+        report = await build_report(self.database, extract_store_id(context))
+        if self.artifacts is not None:
+            try:
+                report["artifact"] = await export_report(self.database, self.artifacts, report)
+            except Exception as e:
+                record_failure("report_export", e)
+        return self.build_prompt(user_input, report_digest(report)), report
+
+    def build_response(self, response_text: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        response = super().build_response(response_text, data)
+        artifact = (data or {}).get("artifact")
+        if artifact:
+            response["publicUrl"] = artifact["publicUrl"]
+            response["downloadUrl"] = artifact["downloadUrl"]
+        return response
+
     def build_prompt(self, user_input: str, context: Optional[str] = None) -> str:
         prompt = f"""
 You are a reporting and business intelligence AI.
 
 Your task:
-- Generate structured reports from provided data
-- Extract KPIs and metrics
-- Output data in a structured format
+- Write the summary of a report whose KPIs and tables are already computed
+- Highlight the most important figures for the user's request
 
 Rules:
 - Do NOT analyze reasons or provide opinions
 - Do NOT invent data
-- Use only the provided context
+- Do NOT recompute or restate whole tables; they are shown to the user separately
+- Use only the provided report data
 
-Data:
+Report data:
 {context if context else "No data provided."}
 
 User Request:
 {user_input}
 
-Output strictly in JSON with the following structure:
-{{
-  "summary": string,
-  "kpis": object,
-  "table": array
-}}
+Respond with a concise plain-text summary of at most 120 words.
 """
         return prompt
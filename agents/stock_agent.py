@@ -1,12 +1,43 @@
-from typing import Optional
-from agents.base import BaseAgent
+from typing import Any, Dict, Optional, Tuple
+from agents.base import BaseAgent, extract_store_id
+from agents.context_builder import RISK_CRITICAL_DAYS, RISK_LOW_DAYS
+from analytics.transfers import TransferPlanner, transfer_digest
+from telemetry.metrics import record_failure
 
 
 class StockAgent(BaseAgent):
     """
     Agent responsible for inventory risk analysis and stock-related recommendations.
+
+    With a database, cross-store transfers are planned by
+    analytics.transfers and returned in the response's `data`; the LLM
+    only sees a digest of them and must not propose transfers of its own.
     """
 
+    def __init__(self, name: str, llm, system_prompt: str, database=None):
+        super().__init__(name=name, llm=llm, system_prompt=system_prompt)
+        self.transfers = TransferPlanner(database) if database is not None else None
+
+    @property
+    def cross_store(self) -> bool:
+        """
+        Answers depend on every store's inventory, not just the current one.
+        """
+        return self.transfers is not None
+
+    async def prepare(self, user_input: str, context: Optional[str] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        if self.transfers is None:
+            return self.build_prompt(user_input, context), None
+
+        try:
+            view = await self.transfers.for_store(extract_store_id(context))
+        except Exception as e:
+            record_failure("transfers", e)
+            return self.build_prompt(user_input, context), None
+
+        digest = f"Transfer plan (computed across all stores; do not recompute):\n{transfer_digest(view)}"
+        return self.build_prompt(user_input, "\n\n".join(s for s in (context, digest) if s)), view
+
     def build_prompt(self, user_input: str, context: Optional[str] = None) -> str:
         prompt = f"""
 You are an inventory and stock management AI.
@@ -19,15 +50,16 @@ Your goal:
 Important definitions:
 - days_of_cover = current_stock / avg_daily_sales
 - Stock risk levels:
-  - days_of_cover < 3      → CRITICAL
-  - 3 ≤ days_of_cover < 7  → LOW
-  - days_of_cover ≥ 7      → HEALTHY
+  - days_of_cover < {RISK_CRITICAL_DAYS}      → CRITICAL
+  - {RISK_CRITICAL_DAYS} ≤ days_of_cover < {RISK_LOW_DAYS}  → LOW
+  - days_of_cover ≥ {RISK_LOW_DAYS}      → HEALTHY
 
 Rules:
 - Do NOT calculate days_of_cover yourself; it is already provided
 - Do NOT invent numbers or assumptions
 - Use ONLY the provided stock data
 - Do NOT modify or update any stock values
+- Recommend only transfers listed in the transfer plan, with its quantities; if there is none, do not suggest transfers
 
 Stock Data:
 Each product includes:
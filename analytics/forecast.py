@@ -0,0 +1,224 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from db import versions
+from db.sales import epoch_day
+
+HISTORY_DAYS = 91
+HORIZON_DAYS = 14
+SES_ALPHAS = (0.1, 0.2, 0.3, 0.5)
+CROSTON_ALPHA = 0.1
+# Average demand interval above which a series is treated as intermittent
+INTERMITTENT_ADI = 1.32
+# z-score for a 95% cycle service level
+SERVICE_Z = 1.65
+CHUNK_ROWS = 20000
+
+METHODS = ("ses", "croston")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _ses(demand: np.ndarray):
+    """
+    Simple exponential smoothing for every row at once, with alpha picked
+    per row from SES_ALPHAS by one-step-ahead squared error.
+    """
+    n, days = demand.shape
+    alphas = np.asarray(SES_ALPHAS)[:, None]
+    level = np.repeat(demand[:, :7].mean(axis=1)[None, :], len(SES_ALPHAS), axis=0)
+    sse = np.zeros_like(level)
+    for t in range(days):
+        error = demand[:, t] - level
+        sse += error * error
+        level += alphas * error
+
+    best = np.argmin(sse, axis=0)
+    rows = np.arange(n)
+    return level[best, rows], np.sqrt(sse[best, rows] / days)
+
+
+def _croston(demand: np.ndarray):
+    """
+    Croston's method with the Syntetos-Boylan bias correction, for every
+    row at once: demand sizes and inter-demand intervals are smoothed
+    separately and only updated on days with demand.
+    """
+    n, days = demand.shape
+    alpha = CROSTON_ALPHA
+    nonzero = demand > 0
+    counts = nonzero.sum(axis=1)
+
+    size = np.where(counts > 0, demand.sum(axis=1) / np.maximum(counts, 1), 0.0)
+    interval = np.where(counts > 0, days / np.maximum(counts, 1), 1.0)
+    since = np.ones(n)
+    sse = np.zeros(n)
+    correction = 1 - alpha / 2
+
+    for t in range(days):
+        forecast = correction * size / interval
+        error = demand[:, t] - forecast
+        sse += error * error
+
+        hit = nonzero[:, t]
+        size = np.where(hit, size + alpha * (demand[:, t] - size), size)
+        interval = np.where(hit, interval + alpha * (since - interval), interval)
+        since = np.where(hit, 1.0, since + 1.0)
+
+    return correction * size / interval, np.sqrt(sse / days)
+
+
+def fit_demand(demand: np.ndarray, lead_times: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fits every product's daily demand series (rows of `demand`) and returns
+    per-row method code, daily forecast, residual sigma and the safety
+    stock for its lead time. Pure NumPy; runs inside the process pool.
+    """
+    n, days = demand.shape
+    ses_forecast, ses_sigma = _ses(demand)
+    croston_forecast, croston_sigma = _croston(demand)
+
+    demand_days = np.count_nonzero(demand, axis=1)
+    adi = days / np.maximum(demand_days, 1)
+    intermittent = adi > INTERMITTENT_ADI
+
+    forecast = np.where(intermittent, croston_forecast, ses_forecast)
+    sigma = np.where(intermittent, croston_sigma, ses_sigma)
+    safety = np.ceil(SERVICE_Z * sigma * np.sqrt(np.maximum(lead_times, 0)))
+    return {
+        "method": intermittent.astype(np.int8),
+        "forecast": np.maximum(forecast, 0.0),
+        "sigma": sigma,
+        "safety_stock": safety.astype(np.int64),
+    }
+
+
+async def _fit_in_pool(demand: np.ndarray, lead_times: np.ndarray) -> Dict[str, np.ndarray]:
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    chunks = [
+        loop.run_in_executor(pool, fit_demand, demand[i:i + CHUNK_ROWS], lead_times[i:i + CHUNK_ROWS])
+        for i in range(0, demand.shape[0], CHUNK_ROWS)
+    ]
+    parts = await asyncio.gather(*chunks)
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+async def refresh_forecasts(database, store_id: Optional[str] = None, now: Optional[float] = None) -> int:
+    """
+    Refits demand forecasts for one store (or all) and stores them in
+    `product_forecasts`, for products with sales history only; the rest
+    lose any stale forecast. The fitted safety stock takes the place of
+    the product's own `safety_stock` in the materialized metrics and the
+    reorder suggestion, which stays untouched in `products`.
+    """
+    today = epoch_day(now or time.time())
+    since = today - HISTORY_DAYS
+    store_filter = "" if store_id is None else "WHERE store_id = :store_id"
+    values = {} if store_id is None else {"store_id": store_id}
+
+    products = await database.fetch_all(
+        f"SELECT id, store_id, lead_time_days FROM products {store_filter}", values=values
+    )
+    if not products:
+        return 0
+
+    keys = [(row["store_id"], row["id"]) for row in products]
+    index = {key: i for i, key in enumerate(keys)}
+    lead_times = np.fromiter((row["lead_time_days"] or 0 for row in products), dtype=np.float64, count=len(products))
+
+    daily = await database.fetch_all(
+        f"""
+        SELECT store_id, product_id, day, quantity FROM sales_daily
+        WHERE day > :since AND day <= :today {"AND store_id = :store_id" if store_id else ""}
+        """,
+        values={**values, "since": since, "today": today},
+    )
+    demand = np.zeros((len(keys), HISTORY_DAYS))
+    hits = [(index[(r["store_id"], r["product_id"])], r["day"] - since - 1, r["quantity"])
+            for r in daily if (r["store_id"], r["product_id"]) in index]
+    if hits:
+        rows, cols, qty = (np.asarray(v) for v in zip(*hits))
+        np.add.at(demand, (rows, cols), qty)
+
+    fit = await _fit_in_pool(demand, lead_times)
+    has_history = demand.any(axis=1)
+    fitted_at = time.time()
+
+    fitted = [
+        {
+            "store_id": s,
+            "product_id": p,
+            "method": METHODS[m],
+            "daily_forecast": round(f, 3),
+            "sigma": round(sg, 3),
+            "safety_stock": ss,
+            "horizon_days": HORIZON_DAYS,
+            "fitted_at": fitted_at,
+        }
+        for (s, p), m, f, sg, ss in zip(
+            keys, fit["method"].tolist(), fit["forecast"].tolist(),
+            fit["sigma"].tolist(), fit["safety_stock"].tolist(),
+        )
+    ]
+    forecasts = [f for f, history in zip(fitted, has_history.tolist()) if history]
+    stale = [
+        {"store_id": f["store_id"], "product_id": f["product_id"]}
+        for f, history in zip(fitted, has_history.tolist()) if not history
+    ]
+
+    # Writes only: SQLiteStorage applies the block at exit, so reads here would fail
+    async with database.transaction():
+        if forecasts:
+            await database.execute_many(
+                """
+                INSERT OR REPLACE INTO product_forecasts
+                    (store_id, product_id, method, daily_forecast, sigma, safety_stock, horizon_days, fitted_at)
+                VALUES (:store_id, :product_id, :method, :daily_forecast, :sigma, :safety_stock, :horizon_days, :fitted_at)
+                """,
+                values=forecasts,
+            )
+        if stale:
+            await database.execute_many(
+                "DELETE FROM product_forecasts WHERE store_id = :store_id AND product_id = :product_id",
+                values=stale,
+            )
+
+    await versions.after_write(database)
+    return len(forecasts)
+
+
+def forecast_payload(row) -> Optional[Dict[str, object]]:
+    """
+    `sales_forecast` value for a product_forecasts row (or None).
+    """
+    if row is None or row["daily_forecast"] is None:
+        return None
+    return {
+        "method": row["method"],
+        "daily": row["daily_forecast"],
+        "horizon_days": row["horizon_days"],
+        "total": round(row["daily_forecast"] * row["horizon_days"], 1),
+        "sigma": row["sigma"],
+        "safety_stock": row["safety_stock"],
+        "fitted_at": row["fitted_at"],
+    }
@@ -0,0 +1,189 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+PRODUCT_COLUMNS = (
+    "id", "name", "price", "store_id",
+    "current_stock", "avg_daily_sales", "safety_stock", "lead_time_days",
+)
+
+ALL_STORES = "all"
+
+CRITICAL_DAYS = 7
+LOW_STOCK_DAYS = 30
+
+
+def _numeric(rows: Sequence, column: str, dtype=np.float64) -> np.ndarray:
+    # NULLs count as 0, as the per-row code did with `value or 0`
+    return np.fromiter((row[column] or 0 for row in rows), dtype=dtype, count=len(rows))
+
+
+def _round_tenths(values: np.ndarray) -> np.ndarray:
+    """
+    `round(v, 1)` for each value. np.round scales by 10 first, which can
+    push a near-tie (0.35, 30.05) the other way, so those few go through
+    Python's round.
+    """
+    rounded = np.round(values, 1)
+    scaled = values * 10
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(value, 1) for value in values[near_tie].tolist()]
+    return rounded
+
+
+class InventoryMetrics:
+    """
+    Columnar inventory metrics for a batch of `products` rows.
+
+    All derived columns (`estimated_days_left`, `sales_trend`,
+    `reorder_qty_suggestion`, `is_critical`) are computed once with NumPy
+    over the whole batch, whether it is one store or every store.
+    """
+
+    def __init__(self, rows: Sequence, default_store_id: Optional[str] = None):
+        self.size = len(rows)
+        self.ids = [str(row["id"] or "") for row in rows]
+        self.names = [str(row["name"] or "") for row in rows]
+        self.prices = [row["price"] for row in rows]
+        self.store_ids = [str(row["store_id"] or default_store_id or "") for row in rows]
+
+        self.current_stock = _numeric(rows, "current_stock")
+        self.avg_daily_sales = _numeric(rows, "avg_daily_sales")
+        self.safety_stock = _numeric(rows, "safety_stock")
+        self.lead_time_days = _numeric(rows, "lead_time_days", np.int64)
+
+        self._compute()
+
+    @classmethod
+    async def fetch(
+        cls,
+        database,
+        store_id: str,
+        after_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        critical_only: bool = False,
+    ) -> "InventoryMetrics":
+        """
+        Loads a store's products (or every store's). With `after_id`/`limit`
+        the rows come back as a keyset page ordered by product id;
+        `critical_only` filters through the materialized inventory_metrics.
+        """
+        # The fitted safety stock (analytics/forecast.py) wins over the product's own
+        columns = ", ".join(
+            "COALESCE(f.safety_stock, p.safety_stock) AS safety_stock" if column == "safety_stock" else f"p.{column}"
+            for column in PRODUCT_COLUMNS
+        )
+        query = (
+            f"SELECT {columns} FROM products p"
+            " LEFT JOIN product_forecasts f ON f.store_id = p.store_id AND f.product_id = p.id"
+        )
+        conditions, values = [], {}
+        if critical_only:
+            query += " JOIN inventory_metrics m ON m.store_id = p.store_id AND m.product_id = p.id"
+            conditions.append("m.is_critical = 1")
+        if store_id != ALL_STORES:
+            conditions.append("p.store_id = :store_id")
+            values["store_id"] = store_id
+        if after_id is not None:
+            conditions.append("p.id > :after_id")
+            values["after_id"] = after_id
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        if after_id is not None or limit is not None:
+            query += " ORDER BY p.id"
+        elif store_id == ALL_STORES:
+            query += " ORDER BY p.store_id"
+        if limit is not None:
+            query += " LIMIT :limit"
+            values["limit"] = limit
+
+        rows = await database.fetch_all(query, values=values)
+        return cls(rows, default_store_id=None if store_id == ALL_STORES else store_id)
+
+    def _compute(self) -> None:
+        selling = self.avg_daily_sales > 0
+        safe_sales = np.where(selling, self.avg_daily_sales, 1.0)
+
+        # NaN marks "no sales, no estimate"
+        self.days_left = np.where(selling, _round_tenths(self.current_stock / safe_sales), np.nan)
+
+        with np.errstate(invalid="ignore"):
+            self.is_critical = self.days_left <= CRITICAL_DAYS
+            increasing = self.days_left >= LOW_STOCK_DAYS
+            # Zero days left is falsy and was never counted as "low stock"
+            self.is_low_stock = (self.days_left != 0) & (self.days_left <= LOW_STOCK_DAYS)
+
+        self.sales_trend = np.where(
+            self.is_critical, "decreasing", np.where(increasing, "increasing", "stable")
+        )
+
+        need = self.safety_stock + self.avg_daily_sales * self.lead_time_days - self.current_stock
+        self.reorder_qty = np.maximum(0, np.trunc(need)).astype(np.int64)
+
+    def summary(self, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        critical = self.is_critical if mask is None else self.is_critical[mask]
+        low = self.is_low_stock if mask is None else self.is_low_stock[mask]
+        return {
+            "total_products": int(critical.size),
+            "critical_count": int(np.count_nonzero(critical)),
+            "low_stock_count": int(np.count_nonzero(low)),
+        }
+
+    def summary_by_store(self) -> Dict[str, Dict[str, int]]:
+        """
+        Per-store summaries in one grouped pass (for store_id=all).
+        """
+        if not self.size:
+            return {}
+        stores, codes = np.unique(np.asarray(self.store_ids), return_inverse=True)
+        totals = np.bincount(codes, minlength=stores.size)
+        critical = np.bincount(codes, weights=self.is_critical, minlength=stores.size)
+        low = np.bincount(codes, weights=self.is_low_stock, minlength=stores.size)
+        return {
+            str(store): {
+                "total_products": int(totals[i]),
+                "critical_count": int(critical[i]),
+                "low_stock_count": int(low[i]),
+            }
+            for i, store in enumerate(stores)
+        }
+
+    def products(self, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Response rows; `price` and `estimated_days_left` are omitted when unknown.
+        `fields` restricts each row to those keys.
+        """
+        days = np.where(np.isnan(self.days_left), None, self.days_left).tolist()
+        result = []
+        for (pid, name, price, store_id, stock, sales, safety, lead, days_left, trend, reorder, critical) in zip(
+            self.ids, self.names, self.prices, self.store_ids,
+            self.current_stock.tolist(), self.avg_daily_sales.tolist(),
+            self.safety_stock.tolist(), self.lead_time_days.tolist(),
+            days, self.sales_trend.tolist(), self.reorder_qty.tolist(), self.is_critical.tolist(),
+        ):
+            product = {
+                "id": pid,
+                "product_id": pid,
+                "name": name,
+                "price": price,
+                "store_id": store_id,
+                "current_stock": stock,
+                "avg_daily_sales": sales,
+                "safety_stock": safety,
+                "lead_time_days": lead,
+                "estimated_days_left": days_left,
+                "sales_trend": trend,
+                "reorder_qty_suggestion": reorder,
+                "is_critical": critical,
+            }
+            if price is None:
+                del product["price"]
+            if days_left is None:
+                del product["estimated_days_left"]
+            if fields is not None:
+                product = {key: product[key] for key in fields if key in product}
+            result.append(product)
+        return result
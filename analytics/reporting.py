@@ -0,0 +1,221 @@
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from analytics.inventory import ALL_STORES, InventoryMetrics
+from db import versions
+from db.sales import epoch_day, week_start
+
+REPORT_WEEKS = 4
+TOP_N = 10
+# Rows per table that go into the LLM digest
+DIGEST_ROWS = 5
+
+# Columns of the per-product export attached to a report
+EXPORT_COLUMNS = (
+    "store_id", "product_id", "name", "price", "current_stock", "avg_daily_sales",
+    "days_of_cover", "is_critical", "reorder_qty", "units_sold", "revenue",
+)
+
+
+def _top(order: np.ndarray, limit: int) -> List[int]:
+    return order[:limit].tolist()
+
+
+async def build_report(
+    database,
+    store_id: Optional[str] = None,
+    weeks: int = REPORT_WEEKS,
+    top_n: int = TOP_N,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    KPIs and tables for ReportingAgent, computed with NumPy over the
+    store's products (or every store's) and the `sales_weekly` rollup.
+
+    The window covers the last `weeks` complete weeks; "movers" compare
+    the last complete week with the one before.
+    """
+    scope = store_id or ALL_STORES
+    weeks = max(weeks, 2)
+    last_week = week_start(epoch_day(now or time.time())) - 7
+    first_week = last_week - 7 * (weeks - 1)
+
+    metrics = await InventoryMetrics.fetch(database, scope)
+    store_filter = "" if scope == ALL_STORES else "AND store_id = :store_id"
+    values = {"first_week": first_week, "last_week": last_week}
+    if scope != ALL_STORES:
+        values["store_id"] = scope
+    rollups = await database.fetch_all(
+        f"""
+        SELECT store_id, product_id, week, quantity, revenue FROM sales_weekly
+        WHERE week BETWEEN :first_week AND :last_week {store_filter}
+        """,
+        values=values,
+    )
+
+    index = {pid: i for i, pid in enumerate(metrics.ids)}
+    quantity = np.zeros((metrics.size, weeks))
+    revenue = np.zeros((metrics.size, weeks))
+    hits = [(index[r["product_id"]], (r["week"] - first_week) // 7, r["quantity"], r["revenue"])
+            for r in rollups if r["product_id"] in index]
+    if hits:
+        rows, cols, qty, rev = (np.asarray(v) for v in zip(*hits))
+        np.add.at(quantity, (rows, cols), qty)
+        np.add.at(revenue, (rows, cols), rev)
+
+    prices = np.fromiter((p or 0 for p in metrics.prices), dtype=np.float64, count=metrics.size)
+    product_revenue = revenue.sum(axis=1)
+    units_sold = quantity.sum(axis=1)
+    weekly_revenue = revenue.sum(axis=0)
+    last_qty, previous_qty = quantity[:, -1], quantity[:, -2]
+    delta = last_qty - previous_qty
+
+    # Revenue and stock per store in one grouped pass
+    stores, codes = np.unique(np.asarray(metrics.store_ids, dtype=str), return_inverse=True)
+    store_revenue = np.bincount(codes, weights=product_revenue, minlength=stores.size)
+    store_units = np.bincount(codes, weights=units_sold, minlength=stores.size)
+    store_critical = np.bincount(codes, weights=metrics.is_critical, minlength=stores.size)
+    store_products = np.bincount(codes, minlength=stores.size)
+
+    summary = metrics.summary()
+    previous_revenue, last_revenue = float(weekly_revenue[-2]), float(weekly_revenue[-1])
+    kpis = {
+        **summary,
+        "stores": int(np.count_nonzero(store_products)),
+        "total_stock_units": int(metrics.current_stock.sum()),
+        "inventory_value": round(float((metrics.current_stock * prices).sum()), 2),
+        "reorder_units": int(metrics.reorder_qty.sum()),
+        "total_revenue": round(float(product_revenue.sum()), 2),
+        "units_sold": round(float(units_sold.sum()), 1),
+        "last_week_revenue": round(last_revenue, 2),
+        "revenue_change_pct": (
+            round((last_revenue - previous_revenue) / previous_revenue * 100, 1) if previous_revenue > 0 else None
+        ),
+    }
+
+    revenue_by_store = [
+        {
+            "store_id": str(stores[i]),
+            "revenue": round(float(store_revenue[i]), 2),
+            "units_sold": round(float(store_units[i]), 1),
+            "products": int(store_products[i]),
+            "critical_count": int(store_critical[i]),
+        }
+        for i in _top(np.argsort(-store_revenue, kind="stable"), len(stores))
+        if store_products[i]
+    ]
+
+    moving = np.flatnonzero(delta != 0)
+    movers = moving[np.argsort(-np.abs(delta[moving]), kind="stable")]
+    top_movers = [
+        {
+            "product_id": metrics.ids[i],
+            "name": metrics.names[i],
+            "store_id": metrics.store_ids[i],
+            "last_week": float(last_qty[i]),
+            "previous_week": float(previous_qty[i]),
+            "change": float(delta[i]),
+            "change_pct": round(float(delta[i] / previous_qty[i] * 100), 1) if previous_qty[i] > 0 else None,
+        }
+        for i in _top(movers, top_n)
+    ]
+
+    selling = np.flatnonzero(product_revenue > 0)
+    top_products = [
+        {
+            "product_id": metrics.ids[i],
+            "name": metrics.names[i],
+            "store_id": metrics.store_ids[i],
+            "revenue": round(float(product_revenue[i]), 2),
+            "units_sold": round(float(units_sold[i]), 1),
+        }
+        for i in _top(selling[np.argsort(-product_revenue[selling], kind="stable")], top_n)
+    ]
+
+    critical = np.flatnonzero(metrics.is_critical)
+    critical_items = [
+        {
+            "product_id": metrics.ids[i],
+            "name": metrics.names[i],
+            "store_id": metrics.store_ids[i],
+            "current_stock": float(metrics.current_stock[i]),
+            "days_left": float(metrics.days_left[i]),
+            "reorder_qty": int(metrics.reorder_qty[i]),
+        }
+        for i in _top(critical[np.argsort(metrics.days_left[critical], kind="stable")], top_n)
+    ]
+
+    return {
+        "title": f"Inventory and sales report ({scope})",
+        "type": "sales",
+        "store_id": scope,
+        "generatedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "period": {"first_week": first_week, "last_week": last_week, "weeks": weeks},
+        "kpis": kpis,
+        "tables": {
+            "revenue_by_store": revenue_by_store,
+            "top_movers": top_movers,
+            "top_products": top_products,
+            "critical_items": critical_items,
+        },
+    }
+
+
+def report_digest(report: Dict[str, Any], rows: int = DIGEST_ROWS) -> str:
+    """
+    Compact text of a report for the summary prompt. Its size depends on
+    `rows`, not on the number of products.
+    """
+    lines = [f"Scope: {report['store_id']} | last {report['period']['weeks']} complete weeks"]
+    lines.append("KPIs: " + ", ".join(f"{key}={value}" for key, value in report["kpis"].items()))
+    for name, table in report["tables"].items():
+        if not table:
+            lines.append(f"{name}: none")
+            continue
+        columns = list(table[0])
+        lines.append(f"{name} (top {min(rows, len(table))} of {len(table)}): " + " | ".join(columns))
+        lines.extend(" | ".join(str(row[c]) for c in columns) for row in table[:rows])
+    return "\n".join(lines)
+
+
+def export_rows(database, report: Dict[str, Any]) -> AsyncIterator[Mapping[str, Any]]:
+    """
+    Streams the per-product rows behind a report (every product in scope,
+    with its metrics and window sales) without loading them all.
+    """
+    scope, period = report["store_id"], report["period"]
+    store_filter = "" if scope == ALL_STORES else "WHERE p.store_id = :store_id"
+    values = {"first_week": period["first_week"], "last_week": period["last_week"]}
+    if scope != ALL_STORES:
+        values["store_id"] = scope
+    return database.iterate(
+        f"""
+        SELECT p.store_id, p.id AS product_id, p.name, p.price, p.current_stock, p.avg_daily_sales,
+               ROUND(m.days_of_cover, 1) AS days_of_cover, COALESCE(m.is_critical, 0) AS is_critical, COALESCE(m.reorder_qty, 0) AS reorder_qty,
+               COALESCE(w.quantity, 0) AS units_sold, ROUND(COALESCE(w.revenue, 0), 2) AS revenue
+        FROM products p
+        LEFT JOIN inventory_metrics m ON m.store_id = p.store_id AND m.product_id = p.id
+        LEFT JOIN (
+            SELECT store_id, product_id, SUM(quantity) AS quantity, SUM(revenue) AS revenue
+            FROM sales_weekly WHERE week BETWEEN :first_week AND :last_week
+            GROUP BY store_id, product_id
+        ) w ON w.store_id = p.store_id AND w.product_id = p.id
+        {store_filter}
+        ORDER BY p.store_id, p.id
+        """,
+        values=values,
+    )
+
+
+async def export_report(database, artifacts, report: Dict[str, Any], fmt: str = "csv") -> Dict[str, Any]:
+    """
+    Exports the report's product table through an ArtifactStore. Repeated
+    reports over unchanged inventory reuse the existing file.
+    """
+    scope, period = report["store_id"], report["period"]
+    version = versions.get_global_version() if scope == ALL_STORES else versions.get_version(scope)
+    fingerprint = ("report", scope, period["first_week"], period["weeks"], version)
+    return await artifacts.export(export_rows(database, report), EXPORT_COLUMNS, fmt=fmt, fingerprint=fingerprint)
@@ -0,0 +1,89 @@
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from analytics.forecast import forecast_payload
+from db.sales import epoch_day, week_start
+
+
+async def sales_overview(database, store_id: str, weeks: int = 8, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Per-product sales figures for `/sales/overview`, answered from the
+    `sales_weekly` rollup (products x weeks rows) instead of raw events.
+
+    The window covers the last `weeks` complete weeks:
+    - total_sold / total_revenue: sums over the window
+    - weekly_trend: % change of the last complete week vs the one before
+    - sales_consistency: 1 - coefficient of variation of weekly units, in [0, 1]
+    """
+    weeks = max(weeks, 2)
+    last_week = week_start(epoch_day(now or time.time())) - 7
+    first_week = last_week - 7 * (weeks - 1)
+
+    products = await database.fetch_all(
+        """
+        SELECT p.id, p.name, p.avg_daily_sales,
+               f.method, f.daily_forecast, f.sigma, f.safety_stock, f.horizon_days, f.fitted_at
+        FROM products p
+        LEFT JOIN product_forecasts f ON f.store_id = p.store_id AND f.product_id = p.id
+        WHERE p.store_id = :store_id
+        """,
+        values={"store_id": store_id},
+    )
+    rollups = await database.fetch_all(
+        """
+        SELECT product_id, week, quantity, revenue FROM sales_weekly
+        WHERE store_id = :store_id AND week BETWEEN :first_week AND :last_week
+        """,
+        values={"store_id": store_id, "first_week": first_week, "last_week": last_week},
+    )
+
+    ids = [str(row["id"]) for row in products]
+    index = {pid: i for i, pid in enumerate(ids)}
+    quantity = np.zeros((len(ids), weeks))
+    revenue = np.zeros((len(ids), weeks))
+
+    hits = [(index[r["product_id"]], (r["week"] - first_week) // 7, r["quantity"], r["revenue"])
+            for r in rollups if r["product_id"] in index]
+    if hits:
+        rows, cols, qty, rev = (np.asarray(v) for v in zip(*hits))
+        np.add.at(quantity, (rows, cols), qty)
+        np.add.at(revenue, (rows, cols), rev)
+
+    total_sold = quantity.sum(axis=1)
+    total_revenue = revenue.sum(axis=1)
+
+    last, previous = quantity[:, -1], quantity[:, -2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.where(previous > 0, (last - previous) / previous * 100, np.where(last > 0, 100.0, 0.0))
+        mean = quantity.mean(axis=1)
+        cv = np.where(mean > 0, quantity.std(axis=1) / mean, np.inf)
+    consistency = np.clip(1 - cv, 0, 1)
+
+    items = [
+        {
+            "product_id": pid,
+            "product_name": row["name"],
+            "total_sold": sold,
+            "total_revenue": round(rev, 2),
+            "avg_daily_sales": float(row["avg_daily_sales"] or 0),
+            "weekly_trend": round(tr, 1),
+            "sales_consistency": round(cons, 2),
+            "sales_forecast": forecast_payload(row),
+        }
+        for pid, row, sold, rev, tr, cons in zip(
+            ids, products, total_sold.tolist(), total_revenue.tolist(), trend.tolist(), consistency.tolist()
+        )
+    ]
+
+    summary = None
+    if items:
+        top = int(np.argmax(total_revenue))
+        summary = {
+            "total_revenue": round(float(total_revenue.sum()), 2),
+            "avg_daily_sales": round(sum(p["avg_daily_sales"] for p in items), 2),
+            "top_product": items[top] if total_revenue[top] > 0 else None,
+        }
+
+    return {"store_id": store_id, "products": items, "summary": summary}
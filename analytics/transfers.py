@@ -0,0 +1,260 @@
+"""
+Cross-store stock transfers.
+
+Products are matched across stores by name. Per product and store:
+
+- surplus = stock above the reorder point (safety stock plus lead-time
+  demand), so a donor never drops into its own reorder zone;
+- deficit = lead-time demand not covered by stock.
+
+For every product stocked in two or more stores, surplus is allocated to
+deficits greedily: largest donors first, most urgent receivers (fewest
+days of cover) first. The allocation is done for all products at once
+with cumulative sums on one number line, where each product owns a
+segment as long as its total surplus; every breakpoint between donor and
+receiver intervals starts one transfer.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from analytics.inventory import ALL_STORES, InventoryMetrics
+from db import versions
+
+# Transfers listed in the prompt digest
+DIGEST_ROWS = 10
+# Transfers returned in `data`; the summary always counts all of them
+MAX_ROWS = 500
+
+
+class TransferPlan:
+    """
+    Columnar result of `plan_transfers`, most urgent receiver first.
+    Transfer rows are only built as dicts for the slice a caller asks for.
+    """
+
+    def __init__(
+        self,
+        metrics: InventoryMetrics,
+        stores: np.ndarray,
+        source_store: np.ndarray,
+        target_store: np.ndarray,
+        source_row: np.ndarray,
+        target_row: np.ndarray,
+        quantity: np.ndarray,
+        cover_before: np.ndarray,
+        cover_after: np.ndarray,
+        summary: Dict[str, int],
+    ):
+        self.metrics = metrics
+        self.stores = stores
+        self.source_store = source_store
+        self.target_store = target_store
+        self.source_row = source_row
+        self.target_row = target_row
+        self.quantity = quantity
+        self.cover_before = cover_before
+        self.cover_after = cover_after
+        self.summary = summary
+
+    @classmethod
+    def empty(cls, metrics: InventoryMetrics) -> "TransferPlan":
+        none = np.zeros(0, dtype=np.int64)
+        summary = {"products_considered": 0, "products_balanced": 0, "transfers": 0, "units": 0, "unmet_units": 0}
+        return cls(metrics, np.zeros(0, dtype=str), none, none, none, none, none,
+                   np.zeros(0), np.zeros(0), summary)
+
+    def rows(self, index: np.ndarray) -> List[Dict[str, Any]]:
+        names, ids = self.metrics.names, self.metrics.ids
+        # Receivers without sales have no cover figure
+        before = np.where(np.isinf(self.cover_before[index]), np.nan, np.round(self.cover_before[index], 1))
+        after = np.where(np.isinf(self.cover_after[index]), np.nan, np.round(self.cover_after[index], 1))
+        return [
+            {
+                "product_name": names[dst],
+                "from_store": str(self.stores[src_store]),
+                "to_store": str(self.stores[dst_store]),
+                "from_product_id": ids[src],
+                "to_product_id": ids[dst],
+                "quantity": qty,
+                "to_days_of_cover_before": None if b != b else b,
+                "to_days_of_cover_after": None if a != a else a,
+            }
+            for src, dst, src_store, dst_store, qty, b, a in zip(
+                self.source_row[index].tolist(), self.target_row[index].tolist(),
+                self.source_store[index].tolist(), self.target_store[index].tolist(),
+                self.quantity[index].tolist(), before.tolist(), after.tolist(),
+            )
+        ]
+
+    def view(self, store_id: Optional[str] = None, max_rows: int = MAX_ROWS) -> Dict[str, Any]:
+        """
+        The transfers into or out of one store (all when `store_id` is None
+        or "all"), capped at `max_rows`, with the network-wide summary.
+        """
+        summary = dict(self.summary)
+        index = np.arange(self.quantity.size)
+        if store_id and store_id != ALL_STORES:
+            code = np.searchsorted(self.stores, store_id)
+            known = code < self.stores.size and self.stores[code] == store_id
+            incoming = (self.target_store == code) if known else np.zeros(index.size, dtype=bool)
+            outgoing = (self.source_store == code) if known else np.zeros(index.size, dtype=bool)
+            index = np.flatnonzero(incoming | outgoing)
+            summary["store_id"] = store_id
+            summary["store_transfers"] = int(index.size)
+            summary["store_units_in"] = int(self.quantity[incoming].sum())
+            summary["store_units_out"] = int(self.quantity[outgoing].sum())
+        summary["listed"] = int(min(index.size, max_rows))
+        return {"transfers": self.rows(index[:max_rows]), "summary": summary}
+
+
+def plan_transfers(metrics: InventoryMetrics, min_qty: int = 1) -> TransferPlan:
+    """
+    Transfer plan over every product in `metrics` (normally all stores).
+    """
+    if not metrics.size:
+        return TransferPlan.empty(metrics)
+
+    names = np.asarray([name.strip().lower() for name in metrics.names])
+    products, product_codes = np.unique(names, return_inverse=True)
+    stores, store_codes = np.unique(np.asarray(metrics.store_ids), return_inverse=True)
+
+    # One cell per (product, store); duplicate rows in a store add up
+    keys, first_row, cell_of_row = np.unique(
+        product_codes.astype(np.int64) * stores.size + store_codes, return_index=True, return_inverse=True
+    )
+    group = keys // stores.size
+    store = keys % stores.size
+    stock = np.bincount(cell_of_row, weights=metrics.current_stock)
+    sales = np.bincount(cell_of_row, weights=metrics.avg_daily_sales)
+    safety = np.bincount(cell_of_row, weights=metrics.safety_stock)
+    lead_demand = np.bincount(cell_of_row, weights=metrics.avg_daily_sales * metrics.lead_time_days)
+
+    surplus = np.floor(stock - safety - lead_demand).clip(min=0).astype(np.int64)
+    deficit = np.ceil(lead_demand - stock).clip(min=0).astype(np.int64)
+    shared = np.bincount(group, minlength=products.size)[group] > 1
+    surplus[~shared] = 0
+    deficit[~shared] = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(sales > 0, stock / sales, np.inf)
+
+    donors = np.flatnonzero(surplus)
+    donors = donors[np.lexsort((-surplus[donors], group[donors]))]
+    receivers = np.flatnonzero(deficit)
+    receivers = receivers[np.lexsort((-deficit[receivers], cover[receivers], group[receivers]))]
+
+    supply = np.bincount(group[donors], weights=surplus[donors], minlength=products.size).astype(np.int64)
+    demand = np.bincount(group[receivers], weights=deficit[receivers], minlength=products.size).astype(np.int64)
+    moved = np.minimum(supply, demand)
+
+    # Product g owns [start[g], start[g] + supply[g]); only the first moved[g] units move
+    start = np.concatenate(([0], np.cumsum(supply)[:-1]))
+    donor_end = np.cumsum(surplus[donors])
+    demand_start = np.concatenate(([0], np.cumsum(demand)[:-1]))
+    receiver_cum = np.cumsum(deficit[receivers]) - demand_start[group[receivers]]
+    receiver_end = start[group[receivers]] + np.minimum(receiver_cum, moved[group[receivers]])
+    donor_cap = np.minimum(donor_end, start[group[donors]] + moved[group[donors]])
+
+    points = np.unique(np.concatenate((start, donor_cap, receiver_end)))
+    seg_start, seg_len = points[:-1], np.diff(points)
+    seg_group = np.searchsorted(start, seg_start, side="right") - 1
+    valid = (seg_len > 0) & (seg_start < start[seg_group] + moved[seg_group])
+    seg_start, seg_len = seg_start[valid], seg_len[valid]
+
+    source = donors[np.searchsorted(donor_end, seg_start, side="right")]
+    target = receivers[np.searchsorted(receiver_end, seg_start, side="right")]
+    keep = seg_len >= min_qty
+    source, target, quantity = source[keep], target[keep], seg_len[keep]
+
+    received = np.bincount(target, weights=quantity, minlength=keys.size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover_after = np.where(sales > 0, (stock + received) / sales, np.inf)
+
+    order = np.lexsort((-quantity, cover[target]))
+    source, target, quantity = source[order], target[order], quantity[order]
+
+    return TransferPlan(
+        metrics,
+        stores,
+        source_store=store[source],
+        target_store=store[target],
+        source_row=first_row[source],
+        target_row=first_row[target],
+        quantity=quantity,
+        cover_before=cover[target],
+        cover_after=cover_after[target],
+        summary={
+            "products_considered": int(np.count_nonzero(np.bincount(group, minlength=products.size) > 1)),
+            "products_balanced": int(np.unique(group[target]).size),
+            "transfers": int(quantity.size),
+            "units": int(quantity.sum()),
+            "unmet_units": int(deficit.sum() - quantity.sum()),
+        },
+    )
+
+
+def transfer_digest(view: Dict[str, Any], rows: int = DIGEST_ROWS) -> str:
+    """
+    Compact text of a store view for the StockAgent prompt.
+    """
+    summary = view["summary"]
+    lines = [
+        f"{summary['transfers']} transfers moving {summary['units']} units across "
+        f"{summary['products_balanced']} of {summary['products_considered']} products stocked in several stores; "
+        f"{summary['unmet_units']} units of shortfall cannot be covered by other stores."
+    ]
+    if "store_id" in summary:
+        lines.append(
+            f"{summary['store_id']}: receives {summary['store_units_in']} units, sends {summary['store_units_out']} units."
+        )
+    if not view["transfers"]:
+        lines.append("No transfers suggested.")
+        return "\n".join(lines)
+
+    lines.append("product_name | from_store | to_store | quantity | days_of_cover before -> after")
+    for t in view["transfers"][:rows]:
+        before = t["to_days_of_cover_before"] if t["to_days_of_cover_before"] is not None else "n/a"
+        after = t["to_days_of_cover_after"] if t["to_days_of_cover_after"] is not None else "n/a"
+        lines.append(f"{t['product_name']} | {t['from_store']} | {t['to_store']} | {t['quantity']} | {before} -> {after}")
+    if len(view["transfers"]) > rows:
+        lines.append(f"... {len(view['transfers']) - rows} more transfers in the response data")
+    return "\n".join(lines)
+
+
+class TransferPlanner:
+    """
+    Network-wide transfer plan, recomputed only when any store's inventory
+    changes. Concurrent requests after a change share one computation.
+    """
+
+    def __init__(self, database, min_qty: int = 1):
+        self.database = database
+        self.min_qty = min_qty
+        self._plan: Optional[TransferPlan] = None
+        self._version: Optional[int] = None
+        self._pending: Optional[asyncio.Task] = None
+        self._pending_version: Optional[int] = None
+
+    async def _compute(self) -> TransferPlan:
+        metrics = await InventoryMetrics.fetch(self.database, ALL_STORES)
+        return plan_transfers(metrics, self.min_qty)
+
+    async def plan(self) -> TransferPlan:
+        version = versions.get_global_version()
+        if self._plan is not None and self._version == version:
+            return self._plan
+        if self._pending is None or self._pending_version != version:
+            self._pending = asyncio.ensure_future(self._compute())
+            self._pending_version = version
+        task = self._pending
+        try:
+            plan = await asyncio.shield(task)
+        finally:
+            if self._pending is task and task.done():
+                self._pending = None
+        self._plan, self._version = plan, version
+        return plan
+
+    async def for_store(self, store_id: Optional[str], max_rows: int = MAX_ROWS) -> Dict[str, Any]:
+        return (await self.plan()).view(store_id, max_rows)
@@ -1,73 +1,305 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from config.settings import get_llm, database
+from config.settings import (
+    get_llm, database, VECTOR_STORE_PATH, REPORTS_PATH, PUBLIC_BASE_URL, JOB_WORKERS,
+    BATCH_CONCURRENCY, BATCH_MAX_ITEMS, MAX_PARALLEL_AGENTS, AGENT_TIMEOUT,
+)
+from analytics.inventory import InventoryMetrics, ALL_STORES
+from analytics.sales import sales_overview
+from analytics.forecast import refresh_forecasts
+from db import versions
+from db.materialized import metrics_summary
+from db.sales import record_sales
+from reports.artifacts import FORMATS, ArtifactStore, file_chunks, parse_range
+from telemetry.metrics import REGISTRY, collect, span
 from typing import List, Optional
+import asyncio
+import json
+import os
+import time
 import traceback
+import zlib
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
 class AIRequest(BaseModel):
     message: str
     context: str | None = None
+    session_id: str | None = None
 
-@router.post("/query")
-async def query_ai(request: AIRequest):
-    try:
+_orchestrator = None
+_retriever = None
+_memory = None
+_artifacts = None
+_jobs = None
+
+def get_artifacts():
+    global _artifacts
+    if _artifacts is None:
+        _artifacts = ArtifactStore(REPORTS_PATH, base_url=PUBLIC_BASE_URL)
+    return _artifacts
+
+def get_memory():
+    global _memory
+    if _memory is None:
+        from memory.store import MemoryStore
+        _memory = MemoryStore(database)
+    return _memory
+
+def get_retriever():
+    global _retriever
+    if _retriever is None:
+        from rag.retriever import HybridRetriever
+        from rag.vector_store import VectorStore
+        _retriever = HybridRetriever(database, VectorStore(VECTOR_STORE_PATH))
+    return _retriever
+
+def get_orchestrator():
+    """
+    Single long-lived orchestrator shared by every request, so agents and
+    the pooled LLM client are built once instead of per query.
+    """
+    global _orchestrator
+    if _orchestrator is None:
         from agents.orchestrator import Orchestrator
+        from agents.context_builder import InventoryContextBuilder
+        _orchestrator = Orchestrator(
+            get_llm(),
+            retriever=get_retriever(),
+            memory=get_memory(),
+            context_builder=InventoryContextBuilder(database),
+            database=database,
+            artifacts=get_artifacts(),
+            max_parallel_agents=MAX_PARALLEL_AGENTS,
+            agent_timeout=AGENT_TIMEOUT,
+        )
+    return _orchestrator
 
-        llm = get_llm()
-        orchestrator = Orchestrator(llm)
+@router.get("/router/stats")
+async def router_stats():
+    """
+    Local intent router hit/fallback counters, for tuning its threshold.
+    """
+    return get_orchestrator().intent_router.stats()
 
-        # route() metodunun async olup olmadığını kontrol et
+@router.get("/llm/stats")
+async def llm_stats():
+    """
+    Upstream LLM requests issued vs. calls coalesced onto an in-flight one.
+    """
+    return get_llm().stats()
+
+def _with_trace(result: dict, trace) -> dict:
+    # Cached envelopes are shared, so the timings go into a copy
+    return {**result, "meta": {**(result.get("meta") or {}), **trace.meta()}}
+
+@router.post("/query")
+async def query_ai(request: AIRequest):
+    """
+    The response's meta.timings has the milliseconds spent per stage
+    (route, history, context, <agent>.prepare, <agent>.llm, db) and
+    meta.tokens the LLM tokens used.
+    """
+    with collect() as trace:
         try:
-            # Önce async olarak çağırmayı dene
-            if hasattr(orchestrator.route, '__call__'):
-                import inspect
-                if inspect.iscoroutinefunction(orchestrator.route):
-                    # Async ise await ile çağır
-                    result = await orchestrator.route(
-                        user_input=request.message,
-                        context=request.context
-                    )
-                else:
-                    # Sync ise direkt çağır
-                    result = orchestrator.route(
-                        user_input=request.message,
-                        context=request.context
-                    )
-            else:
-                result = orchestrator.route(
-                    user_input=request.message,
-                    context=request.context
-                )
-                
-        except TypeError as e:
-            # Eğer await hatası alırsak, sync olarak dene
-            print(f"Await error, trying sync: {e}")
-            result = orchestrator.route(
+            orchestrator = get_orchestrator()
+            result = await orchestrator.route(
                 user_input=request.message,
-                context=request.context
+                context=request.context,
+                session_id=request.session_id
             )
 
-        return result
-        
-    except Exception as e:
-        error_msg = f"Error in query_ai: {str(e)}"
-        print(error_msg)
-        traceback.print_exc()
-        
-        return {
-            "agent": "error",
-            "response": f"An error occurred while processing your request: {str(e)}",
-            "error": str(e),
-            "publicUrl": None,
-            "downloadUrl": None,
-            "meta": {
-                "planner": "error_handler",
-                "summarizer": "error_handler",
-                "cached": False
+        except Exception as e:
+            error_msg = f"Error in query_ai: {str(e)}"
+            print(error_msg)
+            traceback.print_exc()
+
+            result = {
+                "agent": "error",
+                "response": f"An error occurred while processing your request: {str(e)}",
+                "error": str(e),
+                "publicUrl": None,
+                "downloadUrl": None,
+                "meta": {
+                    "planner": "error_handler",
+                    "summarizer": "error_handler",
+                    "cached": False
+                }
             }
-        }
+        result = _with_trace(result, trace)
+
+    with span("serialize"):
+        content = json.dumps(result, default=str)
+    return Response(content=content, media_type="application/json")
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/query/stream")
+async def query_ai_stream(request: AIRequest):
+    """
+    Server-Sent Events variant of /ai/query: a "route" event with the chosen
+    agent, "token" events as the answer is generated, then a "final" event
+    carrying the usual response envelope.
+    """
+    async def events():
+        try:
+            orchestrator = get_orchestrator()
+            with collect() as trace:
+                async for event, data in orchestrator.route_stream(
+                    user_input=request.message,
+                    context=request.context,
+                    session_id=request.session_id
+                ):
+                    if event == "final":
+                        data = _with_trace(data, trace)
+                    yield _sse(event, data)
+        except Exception as e:
+            print(f"Error in query_ai_stream: {e}")
+            traceback.print_exc()
+            yield _sse("final", {
+                "agent": "error",
+                "response": f"An error occurred while processing your request: {str(e)}",
+                "error": str(e),
+                "publicUrl": None,
+                "downloadUrl": None,
+                "meta": {
+                    "planner": "error_handler",
+                    "summarizer": "error_handler",
+                    "cached": False
+                }
+            })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class BatchRequest(BaseModel):
+    items: List[AIRequest]
+    concurrency: Optional[int] = None
+
+@router.post("/batch")
+async def query_ai_batch(request: BatchRequest):
+    """
+    Runs many /ai/query requests together: each distinct message is routed
+    once, identical requests share one execution, and agent calls run with
+    bounded concurrency. Results keep the input order and carry timings.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+
+    started = time.perf_counter()
+    results = await get_orchestrator().route_batch(
+        [item.dict() for item in request.items], concurrency=concurrency
+    )
+    return {
+        "results": results,
+        "summary": {
+            "items": len(results),
+            "executed": sum(1 for r in results if not r["meta"]["deduplicated"]),
+            "concurrency": concurrency,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
+
+class JobRequest(BaseModel):
+    kind: str = "query"
+    message: Optional[str] = None
+    context: Optional[str] = None
+    session_id: Optional[str] = None
+    store_id: Optional[str] = None
+    priority: int = 0
+    timeout: Optional[float] = None
+
+async def _run_query_job(payload: dict, job):
+    job.report(0.1, "routing")
+    return await get_orchestrator().route(
+        user_input=payload["message"],
+        context=payload.get("context"),
+        session_id=payload.get("session_id"),
+    )
+
+async def _run_report_job(payload: dict, job):
+    store_id = payload.get("store_id")
+    context = payload.get("context") or (f"Current store: {store_id}" if store_id else None)
+    job.report(0.1, "building report")
+    agent = get_orchestrator().agents["reporting_agent"]
+    return await agent.run(payload.get("message") or "Generate a report", context)
+
+async def _run_forecast_job(payload: dict, job):
+    job.report(0.1, "fitting forecasts")
+    fitted = await refresh_forecasts(database, payload.get("store_id"))
+    return {"store_id": payload.get("store_id"), "fitted": fitted}
+
+def get_jobs():
+    global _jobs
+    if _jobs is None:
+        from jobs.queue import JobQueue
+        _jobs = JobQueue(
+            database,
+            handlers={
+                "query": _run_query_job,
+                "report": _run_report_job,
+                "forecast_refresh": _run_forecast_job,
+            },
+            workers=JOB_WORKERS,
+        )
+    return _jobs
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queues a long-running request (query, report or forecast_refresh) and
+    returns its id at once; poll /ai/jobs/{id} or follow /ai/jobs/{id}/events.
+    """
+    if request.kind == "query" and not request.message:
+        raise HTTPException(status_code=400, detail="A query job needs a message")
+    payload = request.dict(exclude={"kind", "priority", "timeout"})
+    try:
+        job = await get_jobs().submit(request.kind, payload, priority=request.priority, timeout=request.timeout)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {request.kind}")
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs")
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await get_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = await get_jobs().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events with a "progress" event per job update and a
+    final "done" event once the job has finished.
+    """
+    if await get_jobs().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for snapshot in get_jobs().watch(job_id):
+            finished = snapshot["status"] in ("succeeded", "failed", "cancelled")
+            yield _sse("done" if finished else "progress", snapshot)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 inventory_router = APIRouter(tags=["Inventory"])
 
@@ -90,166 +322,191 @@ class StockResponse(BaseModel):
     store_id: str
     products: List[ProductResponse]
     summary: Optional[dict] = None
+    next_cursor: Optional[str] = None
 
-@inventory_router.get("/inventory/stock", response_model=StockResponse)
-async def get_stock(store_id: str):
-    try:
-        query = "SELECT * FROM products WHERE store_id = :store_id"
-        rows = await database.fetch_all(query=query, values={"store_id": store_id})
-        products = []
-        
-        for row in rows:
-            product = dict(row)
-            
-            # Temel alanları ayarla
-            current_stock = product.get("current_stock") or 0.0
-            avg_daily_sales = product.get("avg_daily_sales") or 0.0
-            safety_stock = product.get("safety_stock") or 0.0
-            lead_time_days = product.get("lead_time_days") or 0
-            
-            # Hesaplanmış alanlar (basit versiyon)
-            estimated_days_left = None
-            if avg_daily_sales > 0:
-                estimated_days_left = round(current_stock / avg_daily_sales, 1)
-            
-            sales_trend = "stable"
-            if estimated_days_left is not None:
-                if estimated_days_left <= 7:
-                    sales_trend = "decreasing"
-                elif estimated_days_left >= 30:
-                    sales_trend = "increasing"
-            
-            reorder_qty_suggestion = max(0, int(safety_stock + avg_daily_sales * lead_time_days - current_stock))
-            is_critical = estimated_days_left is not None and estimated_days_left <= 7
-            
-            product_data = {
-                "id": str(product.get("id") or product.get("product_id") or ""),
-                "product_id": str(product.get("product_id") or product.get("id") or ""),
-                "name": str(product.get("name") or ""),
-                "price": product.get("price"),
-                "store_id": str(product.get("store_id") or store_id),
-                "current_stock": float(current_stock),
-                "avg_daily_sales": float(avg_daily_sales),
-                "safety_stock": float(safety_stock),
-                "lead_time_days": int(lead_time_days),
-                "estimated_days_left": estimated_days_left,
-                "sales_trend": sales_trend,
-                "reorder_qty_suggestion": int(reorder_qty_suggestion),
-                "is_critical": bool(is_critical)
-            }
-            
-            # None değerleri temizle
-            product_data = {k: v for k, v in product_data.items() if v is not None}
-            products.append(product_data)
-        
-        # Summary hesapla
-        if products:
-            total_products = len(products)
-            critical_count = sum(1 for p in products if p.get("is_critical"))
-            low_stock_count = sum(1 for p in products if p.get("estimated_days_left") and p.get("estimated_days_left") <= 30)
-            
+PRODUCT_FIELDS = list(ProductResponse.__fields__)
+
+# Versions are the in-memory mirror of the data_versions table
+# (db/versions.py), so a 304 costs no query, yet ETags agree across
+# workers and restarts and move on writes from any process
+def _etag(scope: str, version: int, *params) -> str:
+    digest = zlib.crc32(repr(params).encode())
+    return f'W/"{scope}-{version}-{digest:08x}"'
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    header = request.headers.get("if-none-match")
+    if header and (header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
+
+def _json_response(payload, etag: str, headers: Optional[dict] = None) -> Response:
+    """
+    Serializes the already-shaped payload once; the response_model on the
+    route only documents it, so large pages skip pydantic re-validation.
+    """
+    with span("serialize"):
+        content = json.dumps(payload, separators=(",", ":"))
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache", **(headers or {})},
+    )
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in PRODUCT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+async def _stock_payload(
+    store_id: str,
+    empty_summary: Optional[dict],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    critical_only: bool = False,
+) -> dict:
+    metrics = await InventoryMetrics.fetch(
+        database, store_id, after_id=cursor, limit=limit, critical_only=critical_only
+    )
+    if cursor is None and limit is None and not critical_only:
+        summary = metrics.summary() if metrics.size else empty_summary
+        if summary is not None and store_id == ALL_STORES:
+            summary["by_store"] = metrics.summary_by_store()
+    else:
+        # A page only holds part of the store; count the whole store from
+        # the materialized metrics instead
+        by_store = await metrics_summary(database, None if store_id == ALL_STORES else store_id)
+        summary = empty_summary
+        if by_store:
             summary = {
-                "total_products": total_products,
-                "critical_count": critical_count,
-                "low_stock_count": low_stock_count
+                key: sum(counts[key] for counts in by_store.values())
+                for key in ("total_products", "critical_count", "low_stock_count")
             }
-        else:
-            summary = None
-        
-        return {
-            "store_id": store_id,
-            "products": products,
-            "summary": summary
-        }
-        
+            if store_id == ALL_STORES:
+                summary["by_store"] = by_store
+
+    next_cursor = None
+    if limit is not None and metrics.size == limit:
+        next_cursor = metrics.ids[-1]
+    return {
+        "store_id": store_id,
+        "products": metrics.products(fields),
+        "summary": summary,
+        "next_cursor": next_cursor,
+    }
+
+async def _stock_response(
+    request: Request,
+    handler: str,
+    store_id: str,
+    empty_summary: Optional[dict],
+    cursor: Optional[str],
+    limit: Optional[int],
+    fields: Optional[str],
+    critical_only: bool,
+):
+    selected = _parse_fields(fields)
+    version = versions.get_global_version() if store_id == ALL_STORES else versions.get_version(store_id)
+    etag = _etag("stock", version, request.url.path, store_id, cursor, limit, selected, critical_only)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        payload = await _stock_payload(
+            store_id, empty_summary, cursor=cursor, limit=limit, fields=selected, critical_only=critical_only
+        )
+        return _json_response(payload, etag)
+
     except Exception as e:
-        print(f"Error in get_stock: {e}")
+        print(f"Error in {handler}: {e}")
         traceback.print_exc()
-        return {
-            "store_id": store_id,
-            "products": [],
-            "summary": None
-        }
+        # Not an empty store: no ETag, so nothing caches it
+        return JSONResponse(status_code=500, content={"detail": "Inventory unavailable"})
+
+@inventory_router.get("/inventory/stock", response_model=StockResponse)
+async def get_stock(
+    request: Request,
+    store_id: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    fields: Optional[str] = None,
+    critical_only: bool = False,
+):
+    return await _stock_response(
+        request, "get_stock", store_id, None, cursor, limit, fields, critical_only
+    )
 
 @inventory_router.get("/inventory/items", response_model=StockResponse)
-async def get_inventory_items(store_id: str):
+async def get_inventory_items(
+    request: Request,
+    store_id: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    fields: Optional[str] = None,
+    critical_only: bool = False,
+):
+    return await _stock_response(
+        request, "get_inventory_items", store_id,
+        {"total_products": 0, "critical_count": 0, "low_stock_count": 0},
+        cursor, limit, fields, critical_only,
+    )
+
+class CriticalItem(BaseModel):
+    store_id: str
+    product_id: str
+    name: str
+    current_stock: float = 0.0
+    avg_daily_sales: float = 0.0
+    days_of_cover: Optional[float] = None
+    reorder_qty: int = 0
+
+class CriticalResponse(BaseModel):
+    store_id: str
+    items: List[CriticalItem]
+
+@inventory_router.get("/inventory/critical", response_model=CriticalResponse)
+async def get_critical_items(store_id: str = ALL_STORES, limit: int = 500):
+    """
+    Critical items, most urgent first, read from the materialized
+    inventory_metrics table through its partial index.
+    """
     try:
-        query = "SELECT * FROM products WHERE store_id = :store_id"
-        rows = await database.fetch_all(query=query, values={"store_id": store_id})
-        products = []
-        
-        for row in rows:
-            product = dict(row)
-            current_stock = product.get("current_stock") or 0
-            avg_daily_sales = product.get("avg_daily_sales") or 0
-            safety_stock = product.get("safety_stock") or 0
-            lead_time_days = product.get("lead_time_days") or 0
-
-            # Days Left
-            estimated_days_left = None
-            if avg_daily_sales > 0:
-                estimated_days_left = round(current_stock / avg_daily_sales, 1)
-
-            # Trend
-            sales_trend = "stable"
-            if estimated_days_left is not None:
-                if estimated_days_left <= 7:
-                    sales_trend = "decreasing"
-                elif estimated_days_left >= 30:
-                    sales_trend = "increasing"
-
-            # Reorder Qty
-            reorder_qty_suggestion = max(0, int(safety_stock + avg_daily_sales * lead_time_days - current_stock))
-
-            # Critical stock kontrolü
-            is_critical = estimated_days_left is not None and estimated_days_left <= 7
-
-            # Product dict'i
-            product_data = {
-                "id": str(product.get("id") or product.get("product_id") or ""),
-                "product_id": str(product.get("product_id") or product.get("id") or ""),
-                "name": str(product.get("name") or ""),
-                "price": product.get("price"),
-                "store_id": str(product.get("store_id") or store_id),
-                "current_stock": float(current_stock),
-                "avg_daily_sales": float(avg_daily_sales),
-                "safety_stock": float(safety_stock),
-                "lead_time_days": int(lead_time_days),
-                "estimated_days_left": estimated_days_left,
-                "sales_trend": sales_trend,
-                "reorder_qty_suggestion": int(reorder_qty_suggestion),
-                "is_critical": bool(is_critical)
+        store_filter = "" if store_id == ALL_STORES else "AND m.store_id = :store_id"
+        query = f"""
+        SELECT m.store_id, m.product_id, p.name, p.current_stock, p.avg_daily_sales,
+               m.days_of_cover, m.reorder_qty
+        FROM inventory_metrics m JOIN products p ON p.id = m.product_id
+        WHERE m.is_critical = 1 {store_filter}
+        ORDER BY m.days_of_cover
+        LIMIT :limit
+        """
+        values = {"limit": limit}
+        if store_id != ALL_STORES:
+            values["store_id"] = store_id
+        rows = await database.fetch_all(query=query, values=values)
+        items = [
+            {
+                "store_id": row["store_id"],
+                "product_id": row["product_id"],
+                "name": row["name"] or "",
+                "current_stock": float(row["current_stock"] or 0),
+                "avg_daily_sales": float(row["avg_daily_sales"] or 0),
+                "days_of_cover": None if row["days_of_cover"] is None else round(row["days_of_cover"], 1),
+                "reorder_qty": int(row["reorder_qty"] or 0),
             }
-            
-            # None değerleri temizle
-            product_data = {k: v for k, v in product_data.items() if v is not None}
-            products.append(product_data)
-
-        # Summary hesapla
-        total_products = len(products)
-        critical_count = sum(1 for p in products if p.get("is_critical"))
-        low_stock_count = sum(1 for p in products if p.get("estimated_days_left") and p.get("estimated_days_left") <= 30)
-        
-        summary = {
-            "total_products": total_products,
-            "critical_count": critical_count,
-            "low_stock_count": low_stock_count
-        }
+            for row in rows
+        ]
+        return {"store_id": store_id, "items": items}
 
-        return {
-            "store_id": store_id,
-            "products": products,
-            "summary": summary
-        }
-        
     except Exception as e:
-        print(f"Error in get_inventory_items: {e}")
+        print(f"Error in get_critical_items: {e}")
         traceback.print_exc()
-        return {
-            "store_id": store_id,
-            "products": [],
-            "summary": None
-        }
+        return {"store_id": store_id, "items": []}
 
 class StoreResponse(BaseModel):
     id: str
@@ -257,25 +514,187 @@ class StoreResponse(BaseModel):
     location: Optional[str] = None
 
 @inventory_router.get("/stores", response_model=List[StoreResponse])
-async def get_stores():
+async def get_stores(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+):
+    """
+    Stores ordered by id. With `limit`, the id to pass as the next `cursor`
+    comes back in the X-Next-Cursor header.
+    """
+    etag = _etag("stores", versions.get_stores_version(), cursor, limit)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
     try:
-        query = "SELECT * FROM stores"
-        rows = await database.fetch_all(query=query)
-        result = []
-        
-        for row in rows:
-            store = dict(row)
-            store_data = {
-                "id": str(store.get("id") or ""),
-                "name": str(store.get("name") or ""),
-                "location": store.get("location")
+        query = "SELECT id, name, location FROM stores"
+        values = {}
+        if cursor is not None:
+            query += " WHERE id > :cursor"
+            values["cursor"] = cursor
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT :limit"
+            values["limit"] = limit
+        rows = await database.fetch_all(query=query, values=values)
+        result = [
+            {
+                "id": str(row["id"] or ""),
+                "name": str(row["name"] or ""),
+                "location": row["location"]
             }
-            result.append(store_data)
-            
+            for row in rows
+        ]
+
         print(f"get_stores: Found {len(result)} stores")
-        return result
-        
+        headers = {}
+        if limit is not None and len(result) == limit:
+            headers["X-Next-Cursor"] = result[-1]["id"]
+        return _json_response(result, etag, headers)
+
     except Exception as e:
         print(f"get_stores error: {e}")
         traceback.print_exc()
-        return []
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"detail": "Stores unavailable"})
+
+sales_router = APIRouter(tags=["Sales"])
+
+class SaleEvent(BaseModel):
+    store_id: str
+    product_id: str
+    quantity: float
+    unit_price: Optional[float] = None
+    sold_at: Optional[float] = None
+
+class SalesEventsRequest(BaseModel):
+    events: List[SaleEvent]
+
+@sales_router.post("/sales/events")
+async def post_sales_events(request: SalesEventsRequest):
+    recorded = await record_sales(database, [e.dict() for e in request.events])
+    return {"recorded": recorded}
+
+@sales_router.get("/sales/overview")
+async def get_sales_overview(store_id: str, weeks: int = 8):
+    try:
+        return await sales_overview(database, store_id, weeks=weeks)
+
+    except Exception as e:
+        print(f"Error in get_sales_overview: {e}")
+        traceback.print_exc()
+        return {
+            "store_id": store_id,
+            "products": [],
+            "summary": None
+        }
+
+@sales_router.post("/sales/forecast/refresh", status_code=202)
+async def post_forecast_refresh(store_id: Optional[str] = None):
+    """
+    Queues a forecast refit (one store, or all when omitted) as a
+    background job; the fitting itself runs in a process pool.
+    """
+    try:
+        job = await get_jobs().submit("forecast_refresh", {"store_id": store_id})
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs")
+    return {"status": "scheduled", "store_id": store_id, "job_id": job.id}
+
+reports_router = APIRouter(tags=["Reports"])
+
+@reports_router.get("/reports/{name}")
+async def get_report_file(name: str, request: Request, download: bool = False):
+    """
+    Serves an exported report file. Names are content hashes, so files
+    never change and can be cached forever; Range requests get a 206.
+    """
+    path = get_artifacts().path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    etag = f'"{name.split(".")[0]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    size = os.path.getsize(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if download:
+        headers["Content-Disposition"] = f'attachment; filename="{name}"'
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and size:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        if (start, end) != (0, size - 1):
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        file_chunks(path, start, end),
+        status_code=status,
+        media_type=FORMATS[name.rsplit(".", 1)[1]],
+        headers=headers,
+    )
+
+metrics_router = APIRouter(tags=["Metrics"])
+
+_LLM_COUNTERS = {
+    "issued": "Upstream LLM requests issued",
+    "coalesced": "LLM calls served by an identical in-flight request",
+    "retries": "LLM request retries",
+    "hedged": "Hedged LLM requests",
+    "fallbacks": "LLM calls sent to the fallback model",
+    "errors": "LLM calls that failed after retries",
+}
+
+def _app_samples():
+    """
+    Counters the components already keep, read at scrape time.
+    """
+    stats = get_llm().stats()
+    for key, help in _LLM_COUNTERS.items():
+        yield f"llm_{key}_total", "counter", help, {}, stats[key]
+    yield "llm_in_flight", "gauge", "LLM requests in flight", {}, stats["in_flight"]
+    for model, state in stats["breakers"].items():
+        yield "llm_circuit_open", "gauge", "1 while the model's circuit breaker is not closed", {"model": model}, int(state != "closed")
+
+    if _orchestrator is not None:
+        for name, cache in (("decision", _orchestrator.decision_cache), ("response", _orchestrator.response_cache)):
+            cache_stats = cache.stats()
+            yield "cache_hits_total", "counter", "Cache hits", {"cache": name}, cache_stats["hits"]
+            yield "cache_misses_total", "counter", "Cache misses", {"cache": name}, cache_stats["misses"]
+            yield "cache_hit_ratio", "gauge", "Cache hits over lookups", {"cache": name}, cache_stats["hit_rate"]
+            yield "cache_entries", "gauge", "Cache entries", {"cache": name}, cache_stats["entries"]
+        router_stats = _orchestrator.intent_router.stats()
+        yield "router_local_hits_total", "counter", "Requests routed without an LLM call", {}, router_stats["local_hits"]
+        yield "router_llm_fallbacks_total", "counter", "Requests routed by the LLM", {}, router_stats["llm_fallbacks"]
+
+    if hasattr(database, "stats"):
+        db_stats = database.stats()
+        yield "db_idle_readers", "gauge", "Idle SQLite reader connections", {}, db_stats["idle_readers"]
+        yield "db_queued_writes", "gauge", "Writes waiting for the writer thread", {}, db_stats["queued_writes"]
+
+    if _jobs is not None:
+        for status, count in _jobs.stats().items():
+            if status != "workers":
+                yield "jobs", "gauge", "Background jobs by status", {"status": status}, count
+
+REGISTRY.register(_app_samples)
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text exposition: per-stage, HTTP and LLM latency
+    histograms, token counts, cache hit rates and component gauges.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
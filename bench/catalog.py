@@ -0,0 +1,113 @@
+"""
+Synthetic catalogs for benchmarks, loaded through db.bulk_load like real
+data. Rows are generated lazily from a seed, so a 1M-product catalog never
+sits in memory and the same arguments always give the same catalog.
+"""
+import os
+import random
+import time
+from typing import Any, Dict, Iterator, List
+
+from db.bulk_load import BulkLoader
+
+NOUNS = (
+    "Keyboard", "Mouse", "Monitor", "Webcam", "Headphones", "Charger", "Cable", "Hub", "Lamp",
+    "Stand", "Speaker", "Router", "Tablet", "Microphone", "Dock", "Adapter", "Drive", "Printer",
+)
+ADJECTIVES = ("Wireless", "Compact", "Pro", "Ergonomic", "Gaming", "Portable", "Smart", "Ultra", "Mini", "HD")
+CITIES = ("New York", "Los Angeles", "Istanbul", "Berlin", "Tokyo", "London", "Paris", "Madrid")
+
+SALES_WINDOW_DAYS = 28
+
+
+def store_ids(stores: int) -> List[str]:
+    return [f"store-{i:03d}" for i in range(1, stores + 1)]
+
+
+def product_name(index: int) -> str:
+    return f"{ADJECTIVES[index % len(ADJECTIVES)]} {NOUNS[index // len(ADJECTIVES) % len(NOUNS)]}"
+
+
+def generate_stores(stores: int) -> Iterator[Dict[str, Any]]:
+    for i, store_id in enumerate(store_ids(stores)):
+        yield {"id": store_id, "name": f"Store {i + 1}", "location": CITIES[i % len(CITIES)]}
+
+
+def generate_products(products: int, stores: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Products spread round-robin over the stores. The same names recur in
+    every store, as with a shared assortment; stock levels are skewed so
+    that some products are critical.
+    """
+    rng = random.Random(seed)
+    ids = store_ids(stores)
+    for i in range(products):
+        avg_daily_sales = round(rng.uniform(0.2, 12.0), 2)
+        yield {
+            "id": f"PRD-{i:07d}",
+            "name": product_name(i // stores),
+            "price": round(rng.uniform(5, 400), 2),
+            "store_id": ids[i % stores],
+            "current_stock": int(avg_daily_sales * rng.expovariate(1 / 10)),
+            "avg_daily_sales": avg_daily_sales,
+            "safety_stock": rng.randint(5, 50),
+            "lead_time_days": rng.randint(2, 14),
+        }
+
+
+def generate_sales(events: int, products: int, stores: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    `events` sales of random products over the last SALES_WINDOW_DAYS days.
+    """
+    rng = random.Random(seed + 1)
+    ids = store_ids(stores)
+    now = time.time()
+    for _ in range(events):
+        product = rng.randrange(products)
+        yield {
+            "store_id": ids[product % stores],
+            "product_id": f"PRD-{product:07d}",
+            "quantity": rng.randint(1, 5),
+            "unit_price": None,
+            "sold_at": now - rng.uniform(0, SALES_WINDOW_DAYS * 86400),
+        }
+
+
+def create_schema(db_path: str) -> None:
+    # Same schema as db/create_tables.py, on an explicit file
+    from sqlalchemy import create_engine, text
+    from db.materialized import SCHEMA
+    from db.models import Base
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+    engine.dispose()
+
+
+def build_catalog(
+    db_path: str, stores: int, products: int, sales: int = 0, seed: int = 0, verbose: bool = True
+) -> float:
+    """
+    Creates `db_path` with the synthetic catalog unless it already exists.
+    Returns the seconds spent building it (0 when reused).
+    """
+    if os.path.exists(db_path):
+        return 0.0
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    tmp = f"{db_path}.building"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(tmp + suffix):
+            os.remove(tmp + suffix)
+
+    create_schema(tmp)
+    with BulkLoader(tmp, verbose=verbose) as loader:
+        loader.load("stores", generate_stores(stores))
+        loader.load("products", generate_products(products, stores, seed))
+        if sales:
+            loader.load("sales_events", generate_sales(sales, products, stores, seed))
+    os.replace(tmp, db_path)
+    return time.perf_counter() - started
@@ -0,0 +1,113 @@
+"""
+Deterministic stand-in for the OpenAI API, for benchmarks.
+
+`FakeLLM` mimics the slice of `AsyncOpenAI` that config.llm.LLMClient
+uses (`chat.completions.create`, plain or streaming). Answers are derived
+from a hash of the prompt, so the same prompt always gets the same text;
+routing prompts get a valid agent name. Latency is `latency` plus one
+token per `1 / token_rate` seconds, and `error_rate` of the calls fail
+with an HTTP-like error after the base latency.
+"""
+import asyncio
+import hashlib
+import random
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List
+
+_WORDS = (
+    "stock", "sales", "demand", "store", "reorder", "trend", "weekly", "units", "revenue", "cover",
+    "critical", "low", "healthy", "transfer", "forecast", "product", "inventory", "increase", "stable",
+    "decline", "recommend", "monitor", "supply", "days", "level", "margin", "top", "movers",
+)
+
+_ROUTING_MARKER = "Respond with ONLY one of the following values"
+
+
+class FakeUpstreamError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"fake upstream error {status_code}")
+        self.status_code = status_code
+
+
+def route_answer(prompt: str) -> str:
+    request = prompt.rsplit("User request:", 1)[-1].lower()
+    if "report" in request:
+        return "reporting_agent"
+    if any(word in request for word in ("stock", "inventory", "reorder", "transfer")):
+        return "stock_agent"
+    return "sales_agent"
+
+
+class FakeLLM:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        token_rate: float = 200.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        answer_tokens: int = 80,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.answer_tokens = answer_tokens
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def answer(self, prompt: str, max_tokens: int) -> List[str]:
+        if _ROUTING_MARKER in prompt:
+            return [route_answer(prompt)]
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        return [rng.choice(_WORDS) for _ in range(min(self.answer_tokens, max_tokens))]
+
+    def _token_delay(self, tokens: int) -> float:
+        return tokens / self.token_rate if self.token_rate > 0 else 0.0
+
+    def _usage(self, prompt: str, tokens: int) -> SimpleNamespace:
+        return SimpleNamespace(prompt_tokens=len(prompt) // 4 + 1, completion_tokens=tokens)
+
+    async def create(self, messages: List[Dict[str, Any]], max_tokens: int = 1024, stream: bool = False, **kwargs):
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.failures += 1
+            await asyncio.sleep(self.latency)
+            raise FakeUpstreamError(self.error_status)
+
+        words = self.answer(prompt, max_tokens)
+        if stream:
+            await asyncio.sleep(self.latency)
+            return self._stream(prompt, words)
+
+        await asyncio.sleep(self.latency + self._token_delay(len(words)))
+        message = SimpleNamespace(content=" ".join(words))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=self._usage(prompt, len(words)))
+
+    async def _stream(self, prompt: str, words: List[str]) -> AsyncIterator[SimpleNamespace]:
+        delay = self._token_delay(1)
+        for i, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            delta = SimpleNamespace(content=word if i == 0 else f" {word}")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=self._usage(prompt, len(words)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "failures": self.failures}
+
+
+def install(fake: FakeLLM) -> None:
+    """
+    Makes config.settings.get_llm() build its LLMClient on `fake` instead
+    of AsyncOpenAI, with every other LLM setting unchanged. Call it before
+    the orchestrator is first built.
+    """
+    from config import settings
+
+    settings.get_async_client = lambda: fake
+    settings._llm = None
@@ -0,0 +1,297 @@
+"""
+Load and latency benchmark, run in-process against the FastAPI app with a
+fake LLM (bench.fake_llm) and a synthetic catalog (bench.catalog).
+
+    python -m bench.run --stores 20 --products 100000 --requests 2000 --concurrency 64
+    python -m bench.run --save bench/baseline.json
+    python -m bench.run --baseline bench/baseline.json
+
+Each scenario sends `--requests` requests with `--concurrency` in flight
+and reports throughput, p50/p95/p99 latency and process memory. `--save`
+writes the results as JSON; `--baseline` compares against such a file
+and exits with status 1 when a scenario's p95 or throughput got worse by
+more than `--tolerance`.
+
+Catalogs are cached under bench/.data and reused when the arguments match.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+QUESTIONS = (
+    "Which products are running low on stock?",
+    "Show me the sales trend for {product}",
+    "Generate a weekly sales report",
+    "Should I reorder {product}?",
+    "What are the top selling products this month?",
+    "Suggest stock transfers between stores for {product}",
+    "How is {product} selling compared to last week?",
+)
+
+# method, path, query params, JSON body
+Request = Tuple[str, str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def make_scenarios(stores: List[str], products: int, page_size: int) -> Dict[str, Callable[[random.Random], Request]]:
+    from bench.catalog import product_name
+
+    def ai_query(rng: random.Random) -> Request:
+        question = rng.choice(QUESTIONS).format(product=product_name(rng.randrange(max(products // len(stores), 1))))
+        return "POST", "/ai/query", None, {"message": question, "context": f"Current store: {rng.choice(stores)}"}
+
+    def inventory_stock(rng: random.Random) -> Request:
+        return "GET", "/inventory/stock", {"store_id": rng.choice(stores)}, None
+
+    def inventory_items(rng: random.Random) -> Request:
+        return "GET", "/inventory/items", {"store_id": rng.choice(stores), "limit": page_size}, None
+
+    def list_stores(rng: random.Random) -> Request:
+        return "GET", "/stores", None, None
+
+    scenarios = {
+        "ai_query": ai_query,
+        "inventory_stock": inventory_stock,
+        "inventory_items": inventory_items,
+        "stores": list_stores,
+    }
+    single = list(scenarios.values())
+    scenarios["mixed"] = lambda rng: rng.choice(single)(rng)
+    return scenarios
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def memory_mb() -> Dict[str, float]:
+    """
+    Current and peak resident set size of this process.
+    """
+    current = 0.0
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        peak = peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    except ImportError:
+        peak = 0.0
+    return {"rss_mb": round(current, 1), "rss_peak_mb": round(peak, 1)}
+
+
+async def run_scenario(
+    client, build: Callable[[random.Random], Request], requests: int, concurrency: int, seed: int
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    plan = [build(rng) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    position = 0
+
+    async def worker():
+        nonlocal errors, position
+        while position < len(plan):
+            method, path, params, body = plan[position]
+            position += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                failed = response.status_code >= 400 or (path == "/ai/query" and "error" in response.json())
+            except Exception as e:
+                print(f"Request failed: {e}")
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        **memory_mb(),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+
+    from bench.catalog import store_ids
+    from bench.fake_llm import FakeLLM, install
+
+    fake = FakeLLM(
+        latency=args.llm_latency,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    install(fake)
+
+    from config.settings import get_llm
+    from main import app
+
+    stores = store_ids(args.stores)
+    scenarios = make_scenarios(stores, args.products, args.page_size)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(scenarios)})")
+
+    await app.router.startup()
+    results: Dict[str, Any] = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for index, name in enumerate(selected):
+                if args.warmup:
+                    await run_scenario(client, scenarios[name], args.warmup, args.concurrency, args.seed + 1000 + index)
+                llm_before = get_llm().stats()["issued"]
+                result = await run_scenario(client, scenarios[name], args.requests, args.concurrency, args.seed + index)
+                result["llm_requests"] = get_llm().stats()["issued"] - llm_before
+                results[name] = result
+                print(format_row(name, result), flush=True)
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "config": {
+            "stores": args.stores,
+            "products": args.products,
+            "sales": args.sales,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+            "llm_latency": args.llm_latency,
+            "token_rate": args.token_rate,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fake_llm": fake.stats(),
+        "results": results,
+    }
+
+
+HEADER = f"{'scenario':<16}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}"
+
+
+def format_row(name: str, result: Dict[str, Any]) -> str:
+    return (
+        f"{name:<16}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+        f"{result['p99_ms']:>10.2f}{result['errors']:>8}{result['rss_mb']:>9.1f}"
+    )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Prints the change per scenario and returns the regressions found.
+    """
+    if current["config"] != baseline.get("config"):
+        print("Warning: baseline was recorded with a different configuration")
+
+    regressions = []
+    print(f"\n{'scenario':<16}{'rps':>12}{'p95':>12}{'p99':>12}")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+
+        def change(key: str) -> float:
+            return (result[key] - before[key]) / before[key] if before[key] else 0.0
+
+        print(f"{name:<16}{change('throughput_rps'):>+12.1%}{change('p95_ms'):>+12.1%}{change('p99_ms'):>+12.1%}")
+        if change("p95_ms") > tolerance:
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+        if change("throughput_rps") < -tolerance:
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {result['throughput_rps']} rps")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="In-process load and latency benchmark with a fake LLM.")
+    parser.add_argument("--stores", type=int, default=10)
+    parser.add_argument("--products", type=int, default=10000, help="products across all stores (10 to 1M)")
+    parser.add_argument("--sales", type=int, default=50000, help="synthetic sales events to load")
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--page-size", type=int, default=500, help="limit for /inventory/items")
+    parser.add_argument("--scenarios", help="comma-separated subset of: ai_query, inventory_stock, "
+                                            "inventory_items, stores, mixed")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM base latency, seconds")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake LLM tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake LLM calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="catalog SQLite file (default: cached under bench/.data)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    if not 10 <= args.products <= 1_000_000:
+        parser.error("--products must be between 10 and 1,000,000")
+
+    db_path = args.db or os.path.join(
+        DATA_DIR, f"catalog-{args.stores}s-{args.products}p-{args.sales}e-{args.seed}.db"
+    )
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    # Settings are read at import, so point them at the catalog first
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("VECTOR_STORE_PATH", os.path.join(work_dir, "vectors"))
+    os.environ.setdefault("REPORTS_PATH", os.path.join(work_dir, "reports"))
+
+    from bench.catalog import build_catalog
+
+    built = build_catalog(db_path, args.stores, args.products, args.sales, seed=args.seed)
+    print(f"Catalog {db_path}: {'built in %.1fs' % built if built else 'reused'}")
+    print(HEADER)
+
+    current = asyncio.run(run(args))
+    current["catalog_build_seconds"] = round(built, 1)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions beyond tolerance")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
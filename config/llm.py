@@ -0,0 +1,434 @@
+import asyncio
+import hashlib
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from telemetry.metrics import REGISTRY, record_tokens
+
+LLM_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Latency of successful upstream LLM requests", labels=("model",)
+)
+
+
+class LLMError(Exception):
+    """
+    Structured LLM failure. `kind` is one of: timeout, rate_limited,
+    upstream, bad_request, circuit_open.
+    """
+
+    def __init__(self, kind: str, message: str, retryable: bool = False, model: Optional[str] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+        self.retryable = retryable
+        self.model = model
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.kind, "message": self.message, "model": self.model}
+
+
+def classify_error(exc: BaseException, model: Optional[str] = None) -> LLMError:
+    if isinstance(exc, LLMError):
+        return exc
+    name = type(exc).__name__
+    status = getattr(exc, "status_code", None)
+    if status == 429:
+        return LLMError("rate_limited", f"Upstream rate limit: {exc}", retryable=True, model=model)
+    if status is not None and status >= 500:
+        return LLMError("upstream", f"Upstream error {status}: {exc}", retryable=True, model=model)
+    if status is not None:
+        return LLMError("bad_request", f"{name}: {exc}", model=model)
+    if isinstance(exc, asyncio.TimeoutError) or "Timeout" in name:
+        return LLMError("timeout", f"Upstream timed out: {exc}", retryable=True, model=model)
+    if "Connection" in name:
+        return LLMError("upstream", f"Connection failed: {exc}", retryable=True, model=model)
+    return LLMError("upstream", f"{name}: {exc}", model=model)
+
+
+class TokenBucket:
+    """
+    Requests-per-second limiter. `rate` <= 0 disables it.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, deadline: float) -> None:
+        """
+        Waits for a token, or raises rate_limited if none frees up before
+        `deadline` (a time.monotonic() value).
+        """
+        while not self.try_acquire():
+            wait = (1 - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise LLMError("rate_limited", "Local LLM rate limit reached", retryable=False)
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; after `reset_after`
+    seconds one trial call is let through (half-open) and its outcome
+    closes or re-opens the circuit. A trial that ends without an outcome
+    (cancelled, or refused locally) must call `end_trial` so that the
+    next call can take its place.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+    def end_trial(self) -> None:
+        self.trial_running = False
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class LLMClient:
+    """
+    Async LLM callable used by the orchestrator and every agent.
+
+    `await llm(prompt)` returns the completion text or raises LLMError. The
+    underlying AsyncOpenAI client is created lazily by `client_factory` and
+    shared by every call, so connections are pooled instead of re-opened.
+
+    Deterministic calls (temperature 0) are single-flighted: concurrent
+    calls with the same model, prompt and options share one upstream
+    request. Streams are not coalesced.
+
+    Every call has a deadline (`timeout`) covering retries. Within it:
+    - retryable failures (timeouts, 429, 5xx, connection errors) are
+      retried up to `max_retries` times with full-jitter backoff;
+    - with `hedge`, an attempt still pending after the recent p95 latency
+      gets a second, identical request and the first answer wins;
+    - requests pass a token bucket of `rate_limit` requests per second;
+    - each model has a circuit breaker; while the primary's is open,
+      calls go to `fallback_model`, which also takes the last retry.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        model: str = "gpt-4o-mini",
+        temperature: float = 0,
+        max_tokens: int = 1024,
+        timeout: float = 20.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_cap: float = 4.0,
+        hedge: bool = True,
+        rate_limit: float = 0,
+        fallback_model: Optional[str] = None,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        self.client_factory = client_factory
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.fallback_model = fallback_model
+        self.bucket = TokenBucket(rate_limit)
+        self.latency = LatencyTracker()
+        self._breaker_args = (breaker_threshold, breaker_reset)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self.issued = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.hedged = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    def _request(self, prompt: str, **kwargs) -> dict:
+        # Per-call options (e.g. a smaller max_tokens) override the defaults
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            **kwargs,
+        }
+
+    async def __call__(self, prompt: str, **kwargs) -> str:
+        if kwargs.get("temperature", self.temperature) != 0:
+            self.issued += 1
+            return await self._complete(prompt, **kwargs)
+
+        key = (
+            kwargs.get("model", self.model),
+            hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            tuple(sorted(kwargs.items())),
+        )
+        task = self._inflight.get(key)
+        if task is None:
+            self.issued += 1
+            task = asyncio.ensure_future(self._complete(prompt, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # One caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "issued": self.issued,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "fallbacks": self.fallbacks,
+            "errors": self.errors,
+            "p95_seconds": self.latency.p95(),
+            "breakers": {model: breaker.state for model, breaker in self.breakers.items()},
+        }
+
+    # -- resilience ------------------------------------------------------
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker(*self._breaker_args)
+        return breaker
+
+    def _admit(self, model: str) -> Optional[bool]:
+        """
+        None if the model's breaker refuses the call, else whether the call
+        is the half-open trial.
+        """
+        breaker = self._breaker(model)
+        trial = breaker.state == "half_open"
+        return trial if breaker.allow() else None
+
+    def _pick_model(self, model: str, prefer_fallback: bool = False) -> Tuple[str, bool]:
+        """
+        The model to call and whether the call is its breaker's trial.
+        """
+        if not (prefer_fallback and self.fallback_model):
+            trial = self._admit(model)
+            if trial is not None:
+                return model, trial
+        if self.fallback_model and self.fallback_model != model:
+            trial = self._admit(self.fallback_model)
+            if trial is not None:
+                self.fallbacks += 1
+                return self.fallback_model, trial
+        if prefer_fallback:
+            trial = self._admit(model)
+            if trial is not None:
+                return model, trial
+        raise LLMError("circuit_open", f"LLM circuit open for {model}", model=model)
+
+    async def _with_retries(self, attempt: Callable[[str, float], Awaitable[Any]], model: str) -> Any:
+        """
+        Runs `attempt(model, deadline)` until it succeeds, fails with a
+        non-retryable error, runs out of retries or hits the deadline.
+        """
+        deadline = time.monotonic() + self.timeout
+        error: Optional[LLMError] = None
+        for retry in range(self.max_retries + 1):
+            if retry:
+                self.retries += 1
+            try:
+                # The last retry goes to the fallback model, if there is one
+                chosen, trial = self._pick_model(model, prefer_fallback=0 < retry == self.max_retries)
+                try:
+                    await self.bucket.acquire(deadline)
+                    return await attempt(chosen, deadline)
+                finally:
+                    if trial:
+                        # No-op once the trial recorded success or failure
+                        self._breaker(chosen).end_trial()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                error = classify_error(exc, model)
+                if not error.retryable:
+                    break
+            backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** retry))
+            if time.monotonic() + backoff >= deadline:
+                break
+            await asyncio.sleep(backoff)
+
+        self.errors += 1
+        raise error or LLMError("timeout", f"No answer within {self.timeout}s", model=model)
+
+    async def _send(self, request: dict) -> str:
+        model = request["model"]
+        started = time.monotonic()
+        try:
+            client = self.client_factory()
+            response = await client.chat.completions.create(**request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            error = classify_error(exc, model)
+            if error.kind != "bad_request":
+                self._breaker(model).failure()
+            raise error
+        elapsed = time.monotonic() - started
+        self._breaker(model).success()
+        self.latency.add(elapsed)
+        LLM_SECONDS.observe(elapsed, model)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            record_tokens(model, usage.prompt_tokens, usage.completion_tokens)
+        return (response.choices[0].message.content or "").strip()
+
+    async def _attempt(self, prompt: str, model: str, deadline: float, **kwargs) -> str:
+        request = self._request(prompt, **{**kwargs, "model": model})
+        tasks = [asyncio.ensure_future(self._send(request))]
+        try:
+            # A half-open breaker allows a single trial request, so no hedge
+            hedge = self.hedge and self._breaker(model).state == "closed"
+            hedge_after = self.latency.p95() if hedge else None
+            if hedge_after is not None and time.monotonic() + hedge_after < deadline:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done and self.bucket.try_acquire():
+                    self.hedged += 1
+                    tasks.append(asyncio.ensure_future(self._send(request)))
+
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = deadline - time.monotonic()
+                done, _ = await asyncio.wait(tasks, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._breaker(model).failure()
+                    raise LLMError("timeout", f"No answer within {self.timeout}s", model=model)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _complete(self, prompt: str, **kwargs) -> str:
+        model = kwargs.pop("model", self.model)
+        return await self._with_retries(
+            lambda chosen, deadline: self._attempt(prompt, chosen, deadline, **kwargs), model
+        )
+
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Yields completion text deltas as the model produces them. Opening
+        the stream is retried like a normal call; after that each delta
+        must arrive within `timeout`. Failures raise LLMError.
+        """
+        model = kwargs.pop("model", self.model)
+
+        async def open_stream(chosen: str, deadline: float):
+            client = self.client_factory()
+            request = self._request(
+                prompt, stream=True, stream_options={"include_usage": True}, **{**kwargs, "model": chosen}
+            )
+            try:
+                response = await asyncio.wait_for(
+                    client.chat.completions.create(**request), timeout=max(deadline - time.monotonic(), 0)
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                error = classify_error(exc, chosen)
+                if error.kind != "bad_request":
+                    self._breaker(chosen).failure()
+                raise error
+            # The stream opened, so the model is up; this also ends a
+            # half-open trial before the client can walk away mid-stream
+            self._breaker(chosen).success()
+            return chosen, response
+
+        self.issued += 1
+        chosen, response = await self._with_retries(open_stream, model)
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+            except StopAsyncIteration:
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.errors += 1
+                self._breaker(chosen).failure()
+                raise classify_error(exc, chosen)
+            if not chunk.choices:
+                # The last chunk carries the usage and no choices
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    record_tokens(chosen, usage.prompt_tokens, usage.completion_tokens)
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+        self._breaker(chosen).success()
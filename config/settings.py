@@ -1,36 +1,110 @@
 import os
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from databases import Database
+from config.llm import LLMClient
+from db.storage import SQLiteStorage
 
 load_dotenv()
 
-DATABASE_URL = "sqlite:///./db/inventory.db"
-database = Database(DATABASE_URL)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db/inventory.db")
+DB_READERS = int(os.getenv("DB_READERS", "8"))
+DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "256"))
+
+# SQLite gets WAL, a read-connection pool and a group-committing writer;
+# other backends go through `databases` as before
+if DATABASE_URL.startswith("sqlite:///"):
+    database = SQLiteStorage.from_url(DATABASE_URL, readers=DB_READERS, write_batch=DB_WRITE_BATCH)
+else:
+    database = Database(DATABASE_URL)
+
+# Per-store data versions live in SQLite (db/versions.py); each process
+# polls them this often to notice writes made by other processes
+VERSION_POLL_SECONDS = float(os.getenv("VERSION_POLL_SECONDS", "1"))
+
+# Memory-mapped vector index lives next to the SQLite file
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./db/vectors")
+
+# Exported report files; PUBLIC_BASE_URL prefixes their links when the
+# API is reached through another origin
+REPORTS_PATH = os.getenv("REPORTS_PATH", "./db/reports")
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "")
+
+# Background jobs (/ai/jobs) run on this many workers, so batch work never
+# takes more than these slots away from interactive requests
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# /ai/batch: upper bound on concurrent agent runs and on items per request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Compound questions fan out to several agents: how many run at once per
+# request, and how long each may take before its section is dropped
+MAX_PARALLEL_AGENTS = int(os.getenv("MAX_PARALLEL_AGENTS", "3"))
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "25"))
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") not in ("0", "false", "False")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL") or None
+# Requests per second for the whole deployment; each uvicorn worker gets
+# an equal share (0 disables the limiter)
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0"))
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
 
 _client = None
+_async_client = None
+_llm = None
+
+def _get_api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable is not set")
+    return api_key
 
 def get_client():
     global _client
     if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        _client = OpenAI(api_key=api_key)
+        _client = OpenAI(api_key=_get_api_key())
     return _client
 
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        _async_client = AsyncOpenAI(api_key=_get_api_key(), http_client=http_client)
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
 def get_llm():
-    def call_llm(prompt: str) -> str:
-        try:
-            client = get_client()
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=1024,
-            )
-            return (response.choices[0].message.content or "").strip()
-        except Exception as exc:
-            return f"An error occurred during the LLM call: {type(exc).__name__}: {exc}"
-
-    return call_llm
+    """
+    Returns the process-wide async LLM callable: `await llm(prompt) -> str`,
+    raising config.llm.LLMError when the call fails.
+    """
+    global _llm
+    if _llm is None:
+        _llm = LLMClient(
+            get_async_client,
+            model=LLM_MODEL,
+            timeout=LLM_TIMEOUT,
+            max_retries=LLM_MAX_RETRIES,
+            hedge=LLM_HEDGE,
+            rate_limit=LLM_RATE_LIMIT / WEB_CONCURRENCY,
+            fallback_model=LLM_FALLBACK_MODEL,
+        )
+    return _llm
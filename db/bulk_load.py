@@ -0,0 +1,323 @@
+"""
+Bulk loader for stores, products and sales events.
+
+Streams CSV or JSONL files (or any iterable of dicts) into SQLite in large
+`executemany` batches, one explicit transaction per batch, with
+`ON CONFLICT` upserts. Into an empty database, secondary indexes and
+triggers are dropped for the duration of the load and rebuilt once at the
+end, together with inventory_metrics; into a database that already has
+data (possibly served by the API) they stay in place, so every row keeps
+its metrics current. Sales rollups and avg_daily_sales are folded in at
+the end either way. Memory use is bounded by the batch size.
+
+Usage:
+    python db/bulk_load.py --stores stores.csv --products products.jsonl --sales sales.csv
+
+Loading bumps the data_versions counters (db/versions.py), so a running
+API drops its caches and ETags within its version poll interval.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import DATABASE_URL
+from db.materialized import BACKFILL, SCHEMA
+from db.versions import BUMP_ALL, RESET_CHANGES
+from db.sales import AVG_WINDOW_DAYS, SECONDS_PER_DAY, epoch_day
+
+BATCH_SIZE = 50000
+PROGRESS_EVERY = 1000000
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None or value == "" else str(value)
+
+
+def _number(cast: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    def convert(value: Any) -> Any:
+        if value is None or value == "":
+            return None
+        # Exports often write whole numbers as "12.0"
+        return int(float(value)) if cast is int else cast(value)
+    return convert
+
+
+# table -> (columns with their converters, upsert statement). SQLite checks
+# NOT NULL before ON CONFLICT, so an empty cell in a NOT NULL column takes
+# the existing row's value up front; a new row without one still fails.
+TABLES: Dict[str, Tuple[List[Tuple[str, Callable[[Any], Any]]], str]] = {
+    "stores": (
+        [("id", _text), ("name", _text), ("location", _text)],
+        """
+        INSERT INTO stores (id, name, location)
+        VALUES (?1, COALESCE(?2, (SELECT name FROM stores WHERE id = ?1)), ?3)
+        ON CONFLICT (id) DO UPDATE SET
+            name = COALESCE(excluded.name, name),
+            location = COALESCE(excluded.location, location)
+        """,
+    ),
+    "products": (
+        [
+            ("id", _text), ("name", _text), ("price", _number(float)), ("store_id", _text),
+            ("current_stock", _number(int)), ("avg_daily_sales", _number(float)),
+            ("safety_stock", _number(int)), ("lead_time_days", _number(int)),
+        ],
+        """
+        INSERT INTO products
+            (id, name, price, store_id, current_stock, avg_daily_sales, safety_stock, lead_time_days)
+        VALUES (
+            ?1, COALESCE(?2, (SELECT name FROM products WHERE id = ?1)),
+            COALESCE(?3, (SELECT price FROM products WHERE id = ?1)), ?4, ?5, ?6, ?7, ?8
+        )
+        ON CONFLICT (id) DO UPDATE SET
+            name = COALESCE(excluded.name, name),
+            price = COALESCE(excluded.price, price),
+            store_id = COALESCE(excluded.store_id, store_id),
+            current_stock = COALESCE(excluded.current_stock, current_stock),
+            avg_daily_sales = COALESCE(excluded.avg_daily_sales, avg_daily_sales),
+            safety_stock = COALESCE(excluded.safety_stock, safety_stock),
+            lead_time_days = COALESCE(excluded.lead_time_days, lead_time_days)
+        """,
+    ),
+    # Events are append-only; a missing unit_price falls back to the
+    # product's price, as in db.sales.record_sales
+    "sales_events": (
+        [
+            ("store_id", _text), ("product_id", _text), ("quantity", _number(float)),
+            ("unit_price", _number(float)), ("sold_at", _number(float)),
+        ],
+        """
+        INSERT INTO sales_events (store_id, product_id, quantity, unit_price, sold_at)
+        VALUES (?1, ?2, ?3, COALESCE(?4, (SELECT price FROM products WHERE id = ?2), 0), ?5)
+        """,
+    ),
+}
+
+# Rollups of the events loaded after `:first_id`, merged into existing rows
+_ROLLUP = """
+INSERT INTO {table} (store_id, product_id, {period}, quantity, revenue)
+SELECT store_id, product_id, {expr} AS period, SUM(quantity), SUM(quantity * unit_price)
+FROM (SELECT store_id, product_id, quantity, unit_price,
+             CAST(sold_at / {seconds} AS INTEGER) AS day
+      FROM sales_events WHERE id > :first_id)
+WHERE true
+GROUP BY store_id, product_id, period
+ON CONFLICT (store_id, product_id, {period}) DO UPDATE SET
+    quantity = quantity + excluded.quantity,
+    revenue = revenue + excluded.revenue
+"""
+
+_ROLLUP_DAILY = _ROLLUP.format(table="sales_daily", period="day", expr="day", seconds=SECONDS_PER_DAY)
+_ROLLUP_WEEKLY = _ROLLUP.format(
+    table="sales_weekly", period="week", expr="day - (day + 3) % 7", seconds=SECONDS_PER_DAY
+)
+
+_UPDATE_AVG = f"""
+UPDATE products SET avg_daily_sales = (
+    SELECT COALESCE(SUM(d.quantity), 0) FROM sales_daily d
+    WHERE d.store_id = products.store_id AND d.product_id = products.id AND d.day > :since
+) / {AVG_WINDOW_DAYS}.0
+WHERE id IN (SELECT DISTINCT product_id FROM sales_events WHERE id > :first_id)
+"""
+
+
+def sqlite_path(url: str = DATABASE_URL) -> str:
+    prefix = "sqlite:///"
+    if not url.startswith(prefix):
+        raise ValueError(f"Bulk loading needs a SQLite database, got {url}")
+    return url[len(prefix):]
+
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams dict rows from a .csv or .jsonl/.ndjson file.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported file type: {path} (expected .csv or .jsonl)")
+
+
+class BulkLoader:
+    """
+    Context manager around one load:
+
+        with BulkLoader() as loader:
+            loader.load_file("products", "products.csv")
+
+    On an empty database, entering drops the secondary indexes and
+    triggers of the loaded tables; leaving recreates them and rebuilds the
+    derived tables, even when the load failed half-way, so the database is
+    never left without them.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = BATCH_SIZE, verbose: bool = True):
+        self.db_path = db_path or sqlite_path()
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.conn: Optional[sqlite3.Connection] = None
+        self._deferred: List[str] = []
+        self._deferring = False
+        self._first_event_id: Optional[int] = None
+        self._loaded: set = set()
+
+    def __enter__(self) -> "BulkLoader":
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        self.conn.execute("PRAGMA cache_size = -262144")
+        self._defer_schema()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self._rebuild()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def _defer_schema(self) -> None:
+        # Only a fresh database is safe to run without triggers: with data
+        # in it, the API may be serving and writing while we load
+        for table in TABLES:
+            if self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None:
+                return
+        self._deferring = True
+        tables = tuple(TABLES) + ("inventory_metrics", "sales_daily", "sales_weekly")
+        rows = self.conn.execute(
+            f"""
+            SELECT type, name, sql FROM sqlite_master
+            WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+              AND tbl_name IN ({', '.join('?' for _ in tables)})
+            """,
+            tables,
+        ).fetchall()
+        for kind, name, sql in rows:
+            self.conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+            self._deferred.append(sql)
+
+    def _rebuild(self) -> None:
+        started = time.perf_counter()
+        self.conn.execute("BEGIN")
+        try:
+            if self._first_event_id is not None:
+                values = {"first_id": self._first_event_id}
+                self.conn.execute(_ROLLUP_DAILY, values)
+                self.conn.execute(_ROLLUP_WEEKLY, values)
+                self.conn.execute(
+                    _UPDATE_AVG, {**values, "since": epoch_day(time.time()) - AVG_WINDOW_DAYS}
+                )
+            for sql in self._deferred:
+                self.conn.execute(sql)
+            for sql in SCHEMA:
+                self.conn.execute(sql)
+            if self._deferring and self._loaded & {"products", "sales_events"}:
+                self.conn.execute("DELETE FROM inventory_metrics")
+                self.conn.execute(BACKFILL)
+            if self._loaded:
+                for sql in BUMP_ALL + (RESET_CHANGES if self._deferring else []):
+                    self.conn.execute(sql)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("ANALYZE")
+        self._log(f"rebuilt indexes, triggers and derived tables in {time.perf_counter() - started:.1f}s")
+
+    def load(self, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Upserts `rows` into `table` in batches and returns the row count.
+        """
+        columns, statement = TABLES[table]
+        self._loaded.add(table)
+        if table == "sales_events" and self._first_event_id is None:
+            self._first_event_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales_events").fetchone()[0]
+
+        now = time.time()
+
+        def convert_row(number: int, row: Dict[str, Any]) -> tuple:
+            values = []
+            for name, convert in columns:
+                try:
+                    value = convert(row.get(name))
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f"{table} row {number}: bad {name} {row.get(name)!r} ({e})") from None
+                values.append(now if value is None and name == "sold_at" else value)
+            return tuple(values)
+
+        params = (convert_row(number, row) for number, row in enumerate(rows, start=1))
+
+        started = time.perf_counter()
+        total = 0
+        next_report = PROGRESS_EVERY
+        while True:
+            batch = list(islice(params, self.batch_size))
+            if not batch:
+                break
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(statement, batch)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            total += len(batch)
+            if total >= next_report:
+                self._log(self._rate(table, total, started))
+                next_report += PROGRESS_EVERY
+
+        self._log(self._rate(table, total, started) + " done")
+        return total
+
+    def load_file(self, table: str, path: str) -> int:
+        return self.load(table, read_rows(path))
+
+    @staticmethod
+    def _rate(table: str, total: int, started: float) -> str:
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        return f"{table}: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)"
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message, flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load stores, products and sales events into SQLite.")
+    parser.add_argument("--stores", help="CSV/JSONL with id, name, location")
+    parser.add_argument("--products", help="CSV/JSONL with id, name, price, store_id, current_stock, "
+                                           "avg_daily_sales, safety_stock, lead_time_days")
+    parser.add_argument("--sales", help="CSV/JSONL with store_id, product_id, quantity, unit_price, sold_at")
+    parser.add_argument("--db", help="SQLite file (defaults to DATABASE_URL)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if not (args.stores or args.products or args.sales):
+        parser.error("nothing to load; pass --stores, --products and/or --sales")
+
+    with BulkLoader(args.db, batch_size=args.batch_size) as loader:
+        # Stores before products before events, so lookups find their rows
+        if args.stores:
+            loader.load_file("stores", args.stores)
+        if args.products:
+            loader.load_file("products", args.products)
+        if args.sales:
+            loader.load_file("sales_events", args.sales)
+
+
+if __name__ == "__main__":
+    main()
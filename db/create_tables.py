@@ -4,9 +4,14 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.models import Base
+from db.materialized import SCHEMA
 from config.settings import DATABASE_URL
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 engine = create_engine(DATABASE_URL)
 Base.metadata.create_all(engine)
+
+with engine.begin() as conn:
+    for statement in SCHEMA:
+        conn.execute(text(statement))
 print("Tables created!")
@@ -0,0 +1,180 @@
+"""
+Materialized `inventory_metrics` table.
+
+One row per (store_id, product_id) with the derived metrics the inventory
+endpoints and agents read: days_of_cover, is_critical and reorder_qty.
+SQLite triggers on `products` keep it in sync row by row, for every
+writer (API, seed scripts, bulk loads), so reads never recompute them.
+The formulas match analytics.inventory.InventoryMetrics.
+
+days_of_cover is stored unrounded; readers round it for display. The
+flags are exact for Python's round(days, 1) (see `_rounded_at_most`).
+
+The reorder quantity uses the fitted safety stock from
+`product_forecasts` when there is one (analytics/forecast.py), else the
+product's own; triggers on `product_forecasts` refresh it after a refit.
+"""
+import re
+from typing import Dict, List, Optional
+
+from analytics.inventory import CRITICAL_DAYS, LOW_STOCK_DAYS
+from db import versions
+
+
+def _rounded_at_most(days_sql: str, limit: int) -> str:
+    """
+    SQL for `round(days, 1) <= limit` as Python's round() decides it.
+    SQLite's ROUND() breaks ties and near-ties differently (141 / 20 is
+    7.1 there, 7.0 in Python), so compare the raw value with the double
+    nearest `limit + 0.05`, which is never an exact tie.
+    """
+    bound = float(f"{limit}.05")
+    return f"{days_sql} {'<=' if round(bound, 1) <= limit else '<'} {bound!r}"
+
+
+def _metric_values(row: str) -> str:
+    """
+    SQL for (store_id, product_id, days_of_cover, is_critical, reorder_qty)
+    of a products row; `row` is "NEW." inside triggers, "products." in a SELECT.
+    """
+    days = f"COALESCE({row}current_stock, 0) * 1.0 / {row}avg_daily_sales"
+    selling = f"COALESCE({row}avg_daily_sales, 0) > 0"
+    fitted = (
+        f"SELECT f.safety_stock FROM product_forecasts f"
+        f" WHERE f.store_id = {row}store_id AND f.product_id = {row}id"
+    )
+    return f"""
+        {row}store_id,
+        {row}id,
+        CASE WHEN {selling} THEN {days} END,
+        CASE WHEN {selling} AND {_rounded_at_most(days, CRITICAL_DAYS)} THEN 1 ELSE 0 END,
+        MAX(0, CAST(
+            COALESCE(({fitted}), {row}safety_stock, 0)
+            + COALESCE({row}avg_daily_sales, 0) * COALESCE({row}lead_time_days, 0)
+            - COALESCE({row}current_stock, 0)
+        AS INTEGER))
+    """
+
+
+_COLUMNS = "(store_id, product_id, days_of_cover, is_critical, reorder_qty)"
+
+_UPSERT = f"INSERT OR REPLACE INTO inventory_metrics {_COLUMNS} VALUES ({_metric_values('NEW.')});"
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_products_store_id ON products (store_id)",
+    """
+    CREATE INDEX IF NOT EXISTS ix_inventory_metrics_critical
+    ON inventory_metrics (store_id, days_of_cover) WHERE is_critical = 1
+    """,
+]
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_products_metrics_insert
+    AFTER INSERT ON products
+    BEGIN
+        {_UPSERT}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_products_metrics_update
+    AFTER UPDATE OF id, store_id, current_stock, avg_daily_sales, safety_stock, lead_time_days ON products
+    BEGIN
+        DELETE FROM inventory_metrics WHERE store_id = OLD.store_id AND product_id = OLD.id;
+        {_UPSERT}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_metrics_delete
+    AFTER DELETE ON products
+    BEGIN
+        DELETE FROM inventory_metrics WHERE store_id = OLD.store_id AND product_id = OLD.id;
+    END
+    """,
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_forecasts_metrics_{event.lower()}
+    AFTER {event} ON product_forecasts
+    BEGIN
+        INSERT OR REPLACE INTO inventory_metrics {_COLUMNS}
+        SELECT {_metric_values('products.')} FROM products
+        WHERE products.id = {row}.product_id AND products.store_id = {row}.store_id;
+    END
+    """
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+]
+
+BACKFILL = f"""
+    INSERT OR REPLACE INTO inventory_metrics {_COLUMNS}
+    SELECT {_metric_values('products.')} FROM products
+"""
+
+SCHEMA = INDEXES + TRIGGERS + versions.SCHEMA
+
+
+def _normalized(sql: str) -> str:
+    # sqlite_master keeps the statement without IF NOT EXISTS
+    return " ".join(sql.replace("IF NOT EXISTS ", "").split())
+
+
+async def _stale_triggers(database) -> List[str]:
+    """
+    Metrics triggers whose stored definition differs from TRIGGERS.
+    """
+    expected = {re.search(r"TRIGGER IF NOT EXISTS (\w+)", sql).group(1): _normalized(sql) for sql in TRIGGERS}
+    rows = await database.fetch_all("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+    return [
+        row["name"] for row in rows
+        if row["name"] in expected and _normalized(row["sql"]) != expected[row["name"]]
+    ]
+
+
+async def ensure_inventory_metrics(database) -> None:
+    """
+    Idempotently creates the indexes and triggers (including the
+    data_versions ones from db/versions.py), and backfills the table
+    when it is out of step with `products` (e.g. a database created before
+    the table existed). Triggers from an older definition are replaced and
+    the table rebuilt with the current formulas.
+    """
+    stale = await _stale_triggers(database)
+    for name in stale:
+        await database.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+    for statement in SCHEMA:
+        await database.execute(statement)
+
+    products = await database.fetch_val("SELECT COUNT(*) FROM products")
+    metrics = await database.fetch_val("SELECT COUNT(*) FROM inventory_metrics")
+    if stale or products != metrics:
+        await database.execute("DELETE FROM inventory_metrics")
+        await database.execute(BACKFILL)
+
+
+async def metrics_summary(database, store_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Per-store product/critical/low-stock counts straight from
+    inventory_metrics, without loading product rows.
+    """
+    store_filter = "" if store_id is None else "WHERE store_id = :store_id"
+    rows = await database.fetch_all(
+        f"""
+        SELECT store_id,
+               COUNT(*) AS total_products,
+               COALESCE(SUM(is_critical), 0) AS critical_count,
+               COALESCE(SUM(
+                   NOT ({_rounded_at_most("days_of_cover", 0)})
+                   AND {_rounded_at_most("days_of_cover", LOW_STOCK_DAYS)}
+               ), 0) AS low_stock_count
+        FROM inventory_metrics {store_filter}
+        GROUP BY store_id
+        """,
+        values={} if store_id is None else {"store_id": store_id},
+    )
+    return {
+        row["store_id"]: {
+            "total_products": int(row["total_products"]),
+            "critical_count": int(row["critical_count"]),
+            "low_stock_count": int(row["low_stock_count"]),
+        }
+        for row in rows
+    }
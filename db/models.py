@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Text, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -16,8 +16,119 @@ class Product(Base):
     id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
     price = Column(Float, nullable=False)
-    store_id = Column(String, ForeignKey("stores.id"))
+    store_id = Column(String, ForeignKey("stores.id"), index=True)
     current_stock = Column(Integer, default=0)
     avg_daily_sales = Column(Float, default=0)
     safety_stock = Column(Integer, default=0)
     lead_time_days = Column(Integer, default=7)
+
+class InventoryMetric(Base):
+    """
+    Materialized per-product metrics, maintained by triggers on `products`
+    (see db/materialized.py).
+    """
+    __tablename__ = "inventory_metrics"
+
+    store_id = Column(String, primary_key=True)
+    product_id = Column(String, ForeignKey("products.id"), primary_key=True)
+    days_of_cover = Column(Float)
+    is_critical = Column(Boolean, nullable=False, default=False)
+    reorder_qty = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index(
+            "ix_inventory_metrics_critical",
+            "store_id",
+            "days_of_cover",
+            sqlite_where=text("is_critical = 1"),
+        ),
+    )
+
+class DataVersion(Base):
+    """
+    Change counters per store, bumped by triggers (see db/versions.py).
+    """
+    __tablename__ = "data_versions"
+
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+class ConversationTurn(Base):
+    __tablename__ = "conversation_turns"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False, index=True)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+class SalesEvent(Base):
+    """
+    Append-only log of individual sales.
+    """
+    __tablename__ = "sales_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    store_id = Column(String, ForeignKey("stores.id"), nullable=False)
+    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Float, nullable=False)
+    unit_price = Column(Float, nullable=False, default=0)
+    sold_at = Column(Float, nullable=False)
+
+class SalesDaily(Base):
+    """
+    Daily rollup of sales_events; `day` is days since the Unix epoch.
+    """
+    __tablename__ = "sales_daily"
+
+    store_id = Column(String, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    day = Column(Integer, primary_key=True)
+    quantity = Column(Float, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class SalesWeekly(Base):
+    """
+    Weekly rollup of sales_events; `week` is the epoch day of the week's Monday.
+    """
+    __tablename__ = "sales_weekly"
+
+    store_id = Column(String, primary_key=True)
+    product_id = Column(String, primary_key=True)
+    week = Column(Integer, primary_key=True)
+    quantity = Column(Float, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class ProductForecast(Base):
+    """
+    Latest demand forecast per product, written by analytics/forecast.py.
+    """
+    __tablename__ = "product_forecasts"
+
+    store_id = Column(String, primary_key=True)
+    product_id = Column(String, ForeignKey("products.id"), primary_key=True)
+    method = Column(String, nullable=False)
+    daily_forecast = Column(Float, nullable=False)
+    sigma = Column(Float, nullable=False)
+    safety_stock = Column(Integer, nullable=False)
+    horizon_days = Column(Integer, nullable=False)
+    fitted_at = Column(Float, nullable=False)
+
+class Job(Base):
+    """
+    Background jobs run by jobs/queue.py; queued and running rows are
+    picked up again after a restart.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    priority = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, index=True)
+    payload = Column(Text, nullable=False)
+    result = Column(Text)
+    error = Column(Text)
+    timeout = Column(Float)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float)
+    finished_at = Column(Float)
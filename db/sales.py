@@ -0,0 +1,113 @@
+import time
+from typing import Any, Dict, List, Tuple
+
+from db import versions
+
+SECONDS_PER_DAY = 86400
+
+# avg_daily_sales is the mean over this trailing window of daily rollups
+AVG_WINDOW_DAYS = 28
+
+
+def epoch_day(timestamp: float) -> int:
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+def week_start(day: int) -> int:
+    # 1970-01-01 was a Thursday; weeks start on Monday
+    return day - (day + 3) % 7
+
+
+_INSERT_EVENT = """
+INSERT INTO sales_events (store_id, product_id, quantity, unit_price, sold_at)
+VALUES (:store_id, :product_id, :quantity, :unit_price, :sold_at)
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO sales_daily (store_id, product_id, day, quantity, revenue)
+VALUES (:store_id, :product_id, :period, :quantity, :revenue)
+ON CONFLICT (store_id, product_id, day) DO UPDATE SET
+    quantity = quantity + excluded.quantity,
+    revenue = revenue + excluded.revenue
+"""
+
+_UPSERT_WEEKLY = """
+INSERT INTO sales_weekly (store_id, product_id, week, quantity, revenue)
+VALUES (:store_id, :product_id, :period, :quantity, :revenue)
+ON CONFLICT (store_id, product_id, week) DO UPDATE SET
+    quantity = quantity + excluded.quantity,
+    revenue = revenue + excluded.revenue
+"""
+
+_UPDATE_AVG = f"""
+UPDATE products SET avg_daily_sales = (
+    SELECT COALESCE(SUM(quantity), 0) FROM sales_daily
+    WHERE store_id = :store_id AND product_id = :product_id AND day > :since
+) / {AVG_WINDOW_DAYS}.0
+WHERE id = :product_id AND store_id = :store_id
+"""
+
+
+def _rollup(events: List[Dict[str, Any]], period) -> List[Dict[str, Any]]:
+    totals: Dict[Tuple[str, str, int], List[float]] = {}
+    for e in events:
+        key = (e["store_id"], e["product_id"], period(epoch_day(e["sold_at"])))
+        acc = totals.setdefault(key, [0.0, 0.0])
+        acc[0] += e["quantity"]
+        acc[1] += e["quantity"] * e["unit_price"]
+    return [
+        {"store_id": s, "product_id": p, "period": d, "quantity": q, "revenue": r}
+        for (s, p, d), (q, r) in totals.items()
+    ]
+
+
+async def record_sales(database, events: List[Dict[str, Any]]) -> int:
+    """
+    Appends sales events and, in the same transaction, folds them into the
+    daily/weekly rollups and refreshes `avg_daily_sales` of the touched
+    products from the trailing daily window.
+
+    Each event needs store_id, product_id and quantity; unit_price defaults
+    to the product's price and sold_at to now.
+    """
+    if not events:
+        return 0
+
+    now = time.time()
+    prepared = []
+    for e in events:
+        prepared.append({
+            "store_id": e["store_id"],
+            "product_id": e["product_id"],
+            "quantity": float(e["quantity"]),
+            "unit_price": e.get("unit_price"),
+            "sold_at": float(e.get("sold_at") or now),
+        })
+
+    missing_prices = {e["product_id"] for e in prepared if e["unit_price"] is None}
+    prices: Dict[str, float] = {}
+    if missing_prices:
+        rows = await database.fetch_all(
+            f"SELECT id, price FROM products WHERE id IN ({', '.join(f':p{i}' for i in range(len(missing_prices)))})",
+            values={f"p{i}": pid for i, pid in enumerate(missing_prices)},
+        )
+        prices = {row["id"]: row["price"] or 0.0 for row in rows}
+    for e in prepared:
+        if e["unit_price"] is None:
+            e["unit_price"] = float(prices.get(e["product_id"], 0.0))
+
+    touched = {(e["store_id"], e["product_id"]) for e in prepared}
+    since = epoch_day(now) - AVG_WINDOW_DAYS
+
+    # Writes only: SQLiteStorage applies the block at exit, so reads here would fail
+    async with database.transaction():
+        await database.execute_many(_INSERT_EVENT, values=prepared)
+        await database.execute_many(_UPSERT_DAILY, values=_rollup(prepared, lambda day: day))
+        await database.execute_many(_UPSERT_WEEKLY, values=_rollup(prepared, week_start))
+        await database.execute_many(
+            _UPDATE_AVG,
+            values=[{"store_id": s, "product_id": p, "since": since} for s, p in touched],
+        )
+
+    await versions.after_write(database)
+    return len(prepared)
@@ -1,33 +1,18 @@
-import asyncio
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from databases import Database
-from db.models import Store, Product
-from config.settings import DATABASE_URL
+from db.bulk_load import BulkLoader
 
 
-database = Database(DATABASE_URL)
-
-async def seed():
-    await database.connect()
-
+def seed():
     stores = [
         {"id": "store-001", "name": "Main Warehouse", "location": "New York"},
         {"id": "store-002", "name": "West Coast Hub", "location": "Los Angeles"},
         {"id": "store-003", "name": "Istanbul Branch", "location": "Istanbul"},
     ]
 
-    for store in stores:
-        query = """
-        INSERT OR IGNORE INTO stores
-        (id, name, location)
-        VALUES (:id, :name, :location)
-        """
-        await database.execute(query=query, values=store)
-
     products = [
         {"id": "PRD-001", "name": "Wireless Keyboard", "price": 79.99, "store_id": "store-001", "current_stock": 45, "avg_daily_sales": 8.5, "safety_stock": 30, "lead_time_days": 7},
         {"id": "PRD-002", "name": "USB-C Hub", "price": 49.99, "store_id": "store-001", "current_stock": 120, "avg_daily_sales": 3.2, "safety_stock": 20, "lead_time_days": 5},
@@ -40,16 +25,12 @@ async def seed():
         {"id": "PRD-009", "name": "Noise-Cancelling Headphones", "price": 199.99, "store_id": "store-001", "current_stock": 20, "avg_daily_sales": 1.2, "safety_stock": 10, "lead_time_days": 10},
         {"id": "PRD-010", "name": "HDMI Cable", "price": 14.99, "store_id": "store-002", "current_stock": 150, "avg_daily_sales": 7, "safety_stock": 50, "lead_time_days": 3},
     ]
-    for product in products:
-        query = """
-        INSERT OR IGNORE INTO products
-        (id, name, price, store_id, current_stock, avg_daily_sales, safety_stock, lead_time_days)
-        VALUES (:id, :name, :price, :store_id, :current_stock, :avg_daily_sales, :safety_stock, :lead_time_days)
-        """
-        await database.execute(query=query, values=product)
-
-    await database.disconnect()
+
+    with BulkLoader(verbose=False) as loader:
+        loader.load("stores", stores)
+        loader.load("products", products)
+
     print("Seed data inserted!")
 
 if __name__ == "__main__":
-    asyncio.run(seed())
+    seed()
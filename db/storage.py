@@ -0,0 +1,291 @@
+"""
+SQLite storage with concurrent readers and a single group-committing writer.
+
+`SQLiteStorage` exposes the subset of the `databases.Database` API the app
+uses (connect/disconnect, fetch_all, fetch_one, fetch_val, iterate,
+execute, execute_many, transaction) so it can stand in for it:
+
+- The file runs in WAL mode, so readers never block on the writer and
+  the writer never waits for readers.
+- Reads go to a pool of read-only connections, each used by one thread
+  at a time, so read throughput scales with request concurrency.
+- Every write is queued to one writer thread. It drains whatever is
+  queued (up to `write_batch` jobs) into a single transaction, each job
+  under its own SAVEPOINT, and commits once for the whole group. A
+  failing job is rolled back alone and its caller gets the exception.
+- Statements issued inside `transaction()` are collected and applied as
+  one job when the block exits, atomically. Unlike `databases`, nothing
+  has run yet inside the block: `execute` returns None instead of a
+  rowid, and reads raise RuntimeError rather than silently missing the
+  pending writes.
+"""
+import asyncio
+import contextvars
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from telemetry.metrics import span
+
+# (query, values, many)
+Statement = Tuple[str, Any, bool]
+
+PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+_transaction: contextvars.ContextVar[Optional[List[Statement]]] = contextvars.ContextVar(
+    "sqlite_transaction", default=None
+)
+
+
+class _WriteJob:
+    def __init__(self, statements: List[Statement], loop: asyncio.AbstractEventLoop):
+        self.statements = statements
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        def settle():
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+        self.loop.call_soon_threadsafe(settle)
+
+
+class _Transaction:
+    def __init__(self, storage: "SQLiteStorage"):
+        self.storage = storage
+        self._token = None
+
+    async def __aenter__(self) -> "_Transaction":
+        if _transaction.get() is None:
+            self._token = _transaction.set([])
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._token is None:
+            # Nested block: the outermost one applies everything
+            return
+        statements = _transaction.get()
+        _transaction.reset(self._token)
+        if exc_type is None and statements:
+            await self.storage._write(statements)
+
+
+class SQLiteStorage:
+    def __init__(self, path: str, readers: int = 4, write_batch: int = 256):
+        self.path = path
+        self.readers = readers
+        self.write_batch = write_batch
+        self.is_connected = False
+        self._pool: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writes: "queue.Queue[Optional[_WriteJob]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "SQLiteStorage":
+        prefix = "sqlite:///"
+        if not url.startswith(prefix):
+            raise ValueError(f"Not a SQLite URL: {url}")
+        return cls(url[len(prefix):], **kwargs)
+
+    # -- lifecycle -------------------------------------------------------
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def connect(self) -> None:
+        if self.is_connected:
+            return
+        # The writer connection creates the file and switches it to WAL
+        # before any reader opens it
+        writer = self._open(read_only=False)
+        writer.execute("PRAGMA journal_mode = WAL")
+        self._writer = threading.Thread(target=self._write_loop, args=(writer,), name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+        self._pool = asyncio.Queue()
+        for _ in range(self.readers):
+            self._pool.put_nowait(self._open(read_only=True))
+        self._executor = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="sqlite-reader")
+        self.is_connected = True
+
+    async def disconnect(self) -> None:
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self._writes.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+        self._writer = None
+
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._pool = None
+        self._executor = None
+
+    # -- reads -----------------------------------------------------------
+
+    @staticmethod
+    def _check_no_transaction() -> None:
+        if _transaction.get() is not None:
+            raise RuntimeError(
+                "SQLiteStorage reads inside transaction() would not see its pending writes; "
+                "read before or after the block"
+            )
+
+    async def _read(self, fn, *args):
+        self._check_no_transaction()
+        with span("db"):
+            conn = await self._pool.get()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, conn, *args)
+            finally:
+                self._pool.put_nowait(conn)
+
+    async def fetch_all(self, query: str, values: Optional[Mapping[str, Any]] = None) -> List[sqlite3.Row]:
+        return await self._read(lambda conn: conn.execute(query, values or {}).fetchall())
+
+    async def fetch_one(self, query: str, values: Optional[Mapping[str, Any]] = None) -> Optional[sqlite3.Row]:
+        return await self._read(lambda conn: conn.execute(query, values or {}).fetchone())
+
+    async def fetch_val(self, query: str, values: Optional[Mapping[str, Any]] = None, column: Any = 0) -> Any:
+        row = await self.fetch_one(query, values)
+        return None if row is None else row[column]
+
+    async def iterate(
+        self, query: str, values: Optional[Mapping[str, Any]] = None, chunk_size: int = 1000
+    ) -> AsyncIterator[sqlite3.Row]:
+        """
+        Streams rows in chunks while holding one reader connection.
+        Consumers that may stop early should close the iterator (aclose)
+        so the connection goes back to the pool right away.
+        """
+        self._check_no_transaction()
+        loop = asyncio.get_running_loop()
+        conn = await self._pool.get()
+        cursor = None
+
+        def release() -> None:
+            # Closing the cursor ends its read transaction, so the next
+            # user of the connection gets a fresh WAL snapshot
+            try:
+                if cursor is not None:
+                    cursor.close()
+            finally:
+                loop.call_soon_threadsafe(self._pool.put_nowait, conn)
+
+        try:
+            cursor = await loop.run_in_executor(self._executor, lambda: conn.execute(query, values or {}))
+            while True:
+                rows = await loop.run_in_executor(self._executor, cursor.fetchmany, chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            # Shielded: a cancelled consumer must not cancel the release
+            await asyncio.shield(asyncio.wrap_future(self._executor.submit(release)))
+
+    # -- writes ----------------------------------------------------------
+
+    async def _write(self, statements: List[Statement]) -> Any:
+        with span("db_write"):
+            job = _WriteJob(statements, asyncio.get_running_loop())
+            self._writes.put(job)
+            return await job.future
+
+    async def execute(self, query: str, values: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Returns the last inserted rowid, or None inside a transaction
+        (the statement only runs when the block exits).
+        """
+        pending = _transaction.get()
+        if pending is not None:
+            pending.append((query, values or {}, False))
+            return None
+        return await self._write([(query, values or {}, False)])
+
+    async def execute_many(self, query: str, values: Sequence[Mapping[str, Any]]) -> None:
+        pending = _transaction.get()
+        if pending is not None:
+            pending.append((query, list(values), True))
+            return None
+        await self._write([(query, list(values), True)])
+
+    def transaction(self) -> _Transaction:
+        return _Transaction(self)
+
+    def _write_loop(self, conn: sqlite3.Connection) -> None:
+        stopping = False
+        while not stopping:
+            job = self._writes.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.write_batch:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._commit_group(conn, batch)
+        conn.close()
+
+    def _commit_group(self, conn: sqlite3.Connection, batch: List[_WriteJob]) -> None:
+        outcomes: List[Tuple[_WriteJob, Any, Optional[BaseException]]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = None
+                    for query, values, many in job.statements:
+                        if many:
+                            conn.executemany(query, values)
+                        else:
+                            result = conn.execute(query, values).lastrowid
+                    conn.execute("RELEASE job")
+                    outcomes.append((job, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((job, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(job, None, e) for job in batch]
+
+        for job, result, error in outcomes:
+            job.resolve(result, error)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "readers": self.readers,
+            "idle_readers": self._pool.qsize() if self._pool is not None else 0,
+            "queued_writes": self._writes.qsize(),
+        }
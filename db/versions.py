@@ -0,0 +1,269 @@
+"""
+Per-store inventory versions, kept in SQLite.
+
+`data_versions` holds one counter per store ("store:<id>"), bumped by
+triggers on every insert, update or delete of that store's `products`
+or `product_forecasts` rows (a refit moves reorder quantities), and a
+"stores" counter bumped on changes to `stores`. Every writer
+moves them: this process, other workers, the bulk loader, manual SQL.
+
+Hot paths, ETags included, read an in-memory mirror of the table
+(`get_version`, `get_global_version`, `get_stores_version`) without a
+query. `refresh()` reloads the mirror and tells subscribers which stores
+changed; the app calls it after its own writes and every `interval`
+seconds from `start()` to pick up everyone else's. Mirrored values are
+the table's own counters, so they agree across workers and restarts.
+
+The same triggers append the id of every changed product to
+`product_changes`, so incremental consumers (the retriever) fetch only
+the rows that changed. Entries older than CHANGE_LOG_SECONDS are pruned;
+`product_changes()` reports when a consumer fell behind the pruned head.
+"""
+import asyncio
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+STORE_PREFIX = "store:"
+STORES = "stores"
+
+CHANGE_LOG_SECONDS = 3600.0
+PRUNE_EVERY_SECONDS = 300.0
+
+
+def _bump(scope_sql: str, condition: str = "true") -> str:
+    # `WHERE` keeps SQLite from reading ON CONFLICT as a join constraint
+    return f"""
+        INSERT INTO data_versions (scope, version) SELECT {scope_sql}, 1 WHERE {condition}
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+    """
+
+
+_STORE_OF = "'" + STORE_PREFIX + "' || COALESCE({row}.store_id, '')"
+
+
+def _log(product_id_sql: str, condition: str = "true") -> str:
+    return f"""
+        INSERT INTO product_changes (product_id, changed_at)
+        SELECT {product_id_sql}, (julianday('now') - 2440587.5) * 86400.0 WHERE {condition};
+    """
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        scope VARCHAR NOT NULL PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id VARCHAR NOT NULL,
+        changed_at FLOAT NOT NULL
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_products_version_insert
+    AFTER INSERT ON products
+    BEGIN
+        {_bump(_STORE_OF.format(row="NEW"))}
+        {_log("NEW.id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_products_version_update
+    AFTER UPDATE ON products
+    BEGIN
+        {_bump(_STORE_OF.format(row="NEW"))}
+        {_bump(_STORE_OF.format(row="OLD"), "OLD.store_id IS NOT NEW.store_id")}
+        {_log("NEW.id")}
+        {_log("OLD.id", "OLD.id IS NOT NEW.id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_products_version_delete
+    AFTER DELETE ON products
+    BEGIN
+        {_bump(_STORE_OF.format(row="OLD"))}
+        {_log("OLD.id")}
+    END
+    """,
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_stores_version_{event.lower()}
+    AFTER {event} ON stores
+    BEGIN
+        {_bump(repr(STORES))}
+    END
+    """
+    for event in ("INSERT", "UPDATE", "DELETE")
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_forecasts_version_{event.lower()}
+    AFTER {event} ON product_forecasts
+    BEGIN
+        {_bump(_STORE_OF.format(row=row))}
+    END
+    """
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+]
+
+# For writers that bypass the triggers (bulk loads with deferred schema)
+BUMP_ALL = [
+    f"""
+    INSERT INTO data_versions (scope, version)
+    SELECT DISTINCT '{STORE_PREFIX}' || COALESCE(store_id, ''), 1 FROM products WHERE true
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1
+    """,
+    _bump(repr(STORES)),
+]
+
+# For writers that bypass the change-log triggers: advances the log and
+# empties it, so every consumer sees a pruned gap and resyncs in full
+RESET_CHANGES = [
+    "INSERT INTO product_changes (product_id, changed_at) VALUES ('', 0)",
+    "DELETE FROM product_changes",
+]
+
+_versions: Dict[str, int] = {}
+_global_version = 0
+_stores_version = 0
+_listeners: List[Callable[[Optional[str]], None]] = []
+_refreshes = itertools.count(1)
+_applied = 0
+_watcher: Optional[asyncio.Task] = None
+
+
+def get_version(store_id: str) -> int:
+    return _versions.get(store_id, 0)
+
+
+def get_global_version() -> int:
+    """
+    Sum of every store's version, so it moves whenever any store changes;
+    used for cross-store views.
+    """
+    return _global_version
+
+
+def get_stores_version() -> int:
+    """
+    Moves on any change to the `stores` table.
+    """
+    return _stores_version
+
+
+def subscribe(listener: Callable[[Optional[str]], None]) -> None:
+    """
+    `listener(store_id)` is called for each store whose version moved.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+async def refresh(database) -> List[str]:
+    """
+    Reloads the mirror and notifies subscribers; returns the changed stores.
+    """
+    global _applied, _global_version, _stores_version
+    sequence = next(_refreshes)
+    rows = await database.fetch_all("SELECT scope, version FROM data_versions")
+    if sequence < _applied:
+        # A refresh that started later already applied newer counters
+        return []
+    _applied = sequence
+
+    changed = []
+    for row in rows:
+        scope, version = row["scope"], int(row["version"])
+        if scope.startswith(STORE_PREFIX):
+            store_id = scope[len(STORE_PREFIX):]
+            if _versions.get(store_id) != version:
+                _versions[store_id] = version
+                changed.append(store_id)
+        elif scope == STORES:
+            _stores_version = version
+    if changed:
+        _global_version = sum(_versions.values())
+        for store_id in changed:
+            for listener in list(_listeners):
+                listener(store_id)
+    return changed
+
+
+async def last_change(database) -> int:
+    """
+    Current end of the product change log.
+    """
+    return int(await database.fetch_val("SELECT COALESCE(MAX(seq), 0) FROM product_changes") or 0)
+
+
+async def product_changes(database, after: int, limit: int = 5000) -> Optional[Tuple[int, List[str]]]:
+    """
+    (new position, ids) of up to `limit` product changes logged after
+    position `after`; the ids may repeat. None when entries after `after`
+    were already pruned, so the caller must resync in full.
+    """
+    rows = await database.fetch_all(
+        "SELECT seq, product_id FROM product_changes WHERE seq > :after ORDER BY seq LIMIT :limit",
+        values={"after": after, "limit": limit},
+    )
+    # Committed seqs have no holes (a rollback also rolls back the
+    # AUTOINCREMENT counter), so a jump past `after + 1` means pruning
+    if rows:
+        if rows[0]["seq"] > after + 1:
+            return None
+        return int(rows[-1]["seq"]), [row["product_id"] for row in rows]
+    issued = await database.fetch_val("SELECT seq FROM sqlite_sequence WHERE name = 'product_changes'")
+    return None if (issued or 0) > after else (after, [])
+
+
+async def prune_changes(database, older_than: float = CHANGE_LOG_SECONDS) -> None:
+    await database.execute(
+        "DELETE FROM product_changes WHERE changed_at < :cutoff", values={"cutoff": time.time() - older_than}
+    )
+
+
+async def after_write(database) -> None:
+    """
+    Call after this process changes store data, so that its own caches
+    see the change now instead of at the next poll.
+    """
+    try:
+        await refresh(database)
+    except Exception as e:
+        print(f"Version refresh failed: {e}")
+
+
+async def _watch(database, interval: float) -> None:
+    pruned_at = 0.0
+    while True:
+        try:
+            await refresh(database)
+            if time.monotonic() - pruned_at >= PRUNE_EVERY_SECONDS:
+                pruned_at = time.monotonic()
+                await prune_changes(database)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Version refresh failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def start(database, interval: float = 1.0) -> None:
+    global _watcher
+    if _watcher is None:
+        await after_write(database)
+        _watcher = asyncio.create_task(_watch(database, interval))
+
+
+async def stop() -> None:
+    global _watcher
+    if _watcher is not None:
+        _watcher.cancel()
+        try:
+            await _watcher
+        except asyncio.CancelledError:
+            pass
+        _watcher = None
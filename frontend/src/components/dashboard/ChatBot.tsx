@@ -6,7 +6,7 @@ import { ScrollArea } from "@/components/ui/scroll-area";
 import { Badge } from "@/components/ui/badge";
 import { useStore } from "@/context/StoreContext";
 import { ChatMessage, ChatIntent } from "@/types/inventory";
-import { orchestrate } from "@/services/api";
+import { orchestrateStream, resolveApiUrl } from "@/services/api";
 import { MessageSquare, Send, Bot, User } from "lucide-react";
 import { cn } from "@/lib/utils";
 
@@ -37,6 +37,8 @@ export function ChatBot({ onStockData, onSalesData, onReportData }: ChatBotProps
   const [isOpen, setIsOpen] = useState(false);
   const { currentStoreId } = useStore();
   const scrollRef = useRef<HTMLDivElement>(null);
+  // One server-side conversation memory per store
+  const sessionIds = useRef<Record<string, string>>({});
 
   const messages = storeMessages[currentStoreId] || [];
 
@@ -63,30 +65,56 @@ export function ChatBot({ onStockData, onSalesData, onReportData }: ChatBotProps
     setInput("");
     setIsLoading(true);
 
+    const sessionId = (sessionIds.current[currentStoreId] ??= `${currentStoreId}-${Date.now()}-${Math.random().toString(36).slice(2)}`);
+    const botId = `bot-${Date.now()}`;
+    const updateBotMessage = (patch: Partial<ChatMessage>) => {
+      setStoreMessages(prev => {
+        const current = prev[currentStoreId] || [];
+        const exists = current.some(m => m.id === botId);
+        const next = exists
+          ? current.map(m => (m.id === botId ? { ...m, ...patch } : m))
+          : [...current, { id: botId, type: "bot" as const, content: "", timestamp: new Date(), ...patch }];
+        return { ...prev, [currentStoreId]: next };
+      });
+    };
+
     try {
-      const response = await orchestrate(input, `Store: ${currentStoreId}\nPrevious messages: ${JSON.stringify(messages)}`);
-      const { agent, output = response.response, data, publicUrl } = response;
+      let streamed = "";
+      const response = await orchestrateStream(
+        input,
+        currentStoreId,
+        {
+          onToken: (text) => {
+            streamed += text;
+            setIsLoading(false);
+            updateBotMessage({ content: streamed });
+          },
+        },
+        sessionId
+      );
+      const { agent, output = response.response, data, meta } = response;
+      const publicUrl = resolveApiUrl(response.publicUrl);
+      const downloadUrl = resolveApiUrl(response.downloadUrl) ?? publicUrl;
 
-      const botMessage: ChatMessage = {
-        id: `bot-${Date.now()}`,
-        type: "bot",
+      updateBotMessage({
         content: output,
         intent: agent ? (agent.replace("_agent", "") as ChatIntent) : "general",
         data,
         publicUrl,
-        downloadUrl: publicUrl,
+        downloadUrl,
         timestamp: new Date(),
-        meta: { cached: false },
-      };
-
-      setStoreMessages(prev => ({
-        ...prev,
-        [currentStoreId]: [...(prev[currentStoreId] || []), botMessage],
-      }));
+        meta: { cached: false, ...meta },
+      });
 
-      if (agent === "stock_agent") onStockData?.(data);
-      if (agent === "sales_agent") onSalesData?.(data);
-      if (agent === "reporting_agent") onReportData?.({ publicUrl });
+      // Multi-agent answers carry each agent's data in meta.sections
+      const sections = meta?.sections ?? [{ agent, data }];
+      for (const section of sections) {
+        if (section.agent === "stock_agent") onStockData?.(section.data);
+        if (section.agent === "sales_agent") onSalesData?.(section.data);
+        if (section.agent === "reporting_agent") {
+          onReportData?.({ ...response, data: section.data, publicUrl, downloadUrl });
+        }
+      }
     } catch (error) {
       const errorMessage: ChatMessage = {
         id: `error-${Date.now()}`,
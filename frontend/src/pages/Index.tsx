@@ -49,11 +49,12 @@ const Index = () => {
     if (data?.publicUrl) {
       setReports((prev) => [
         {
-          title: "AI Generated Report",
-          type: "inventory",
+          title: data.data?.title || "AI Generated Report",
+          type: data.data?.type || "inventory",
           publicUrl: data.publicUrl,
-          downloadUrl: data.publicUrl,
-          generatedAt: new Date().toISOString(),
+          downloadUrl: data.downloadUrl || data.publicUrl,
+          generatedAt: data.data?.generatedAt || new Date().toISOString(),
+          data: data.data,
         },
         ...prev,
       ]);
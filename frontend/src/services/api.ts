@@ -2,6 +2,12 @@ import { AIQueryResponse, StockResponse, SalesResponse, Store } from "@/types/in
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || "http://127.0.0.1:8000";
 
+// Report links from the API may be relative to the API origin
+export function resolveApiUrl(url?: string | null): string | undefined {
+  if (!url) return undefined;
+  return /^https?:\/\//.test(url) ? url : `${API_BASE_URL}${url}`;
+}
+
 
 // Convert camelCase to snake_case for API params
 function toSnakeCase(obj: Record<string, any>): Record<string, any> {
@@ -56,6 +62,65 @@ export async function orchestrate(message: string, storeId: string): Promise<AIQ
   });
 }
 
+export interface StreamHandlers {
+  onRoute?: (agent: string) => void;
+  onToken?: (text: string) => void;
+}
+
+// AI Orchestrator (Server-Sent Events): resolves with the final envelope
+export async function orchestrateStream(
+  message: string,
+  storeId: string,
+  handlers: StreamHandlers = {},
+  sessionId?: string
+): Promise<AIQueryResponse> {
+  const context = `Current store: ${storeId}`;
+  const response = await fetch(`${API_BASE_URL}/ai/query/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ message, context, session_id: sessionId }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`API Error: ${response.status} ${response.statusText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let final: AIQueryResponse | null = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      for (const line of chunk.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === "route") handlers.onRoute?.(payload.agent);
+      else if (event === "token") handlers.onToken?.(payload.text);
+      else if (event === "final") final = payload as AIQueryResponse;
+    }
+  }
+
+  if (!final) {
+    throw new Error("API Error: stream ended without a final response");
+  }
+  return final;
+}
 
 // Normalize backend agent names to frontend intents
 export function normalizeIntent(agent: string): "report" | "sales" | "stock" | "general" {
@@ -76,6 +76,17 @@ export interface ChatMessage {
   timestamp: Date;
 }
 
+// One agent's part of a multi-agent answer
+export interface AgentSection {
+  agent: string;
+  response: string;
+  data?: any;
+  elapsed_ms: number;
+  error?: { type: string; message: string };
+  publicUrl?: string;
+  downloadUrl?: string;
+}
+
 export interface AIQueryResponse {
   agent: string;
   response: string;
@@ -87,5 +98,7 @@ export interface AIQueryResponse {
     planner?: string;
     summarizer?: string;
     cached?: boolean;
+    agents?: string[];
+    sections?: AgentSection[];
   };
 }
@@ -0,0 +1,322 @@
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class Job:
+    def __init__(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        priority: int = 0,
+        timeout: Optional[float] = None,
+        job_id: Optional[str] = None,
+        created_at: Optional[float] = None,
+    ):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.timeout = timeout
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = created_at or time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def touch(self) -> None:
+        # Wake current watchers and give later ones a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def report(self, progress: float, message: str = "") -> None:
+        """
+        Called by handlers to publish progress in [0, 1].
+        """
+        self.progress = max(0.0, min(1.0, progress))
+        self.message = message
+        self.touch()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+Handler = Callable[[Dict[str, Any], Job], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    In-process background jobs.
+
+    - `submit` persists the job and queues it by priority (higher first,
+      FIFO within a priority); it is refused while `max_queued` jobs wait.
+    - `workers` tasks run the handler registered for each job's kind, with
+      the job's timeout, so heavy work never holds more than `workers`
+      slots no matter how many jobs are submitted.
+    - Queued jobs can be cancelled before they start; running ones are
+      cancelled through their task.
+    - Job rows live in the `jobs` table. On `start`, jobs that were queued
+      or running when the process stopped are queued again, all of them,
+      even past `max_queued`.
+    """
+
+    def __init__(
+        self,
+        database,
+        handlers: Dict[str, Handler],
+        workers: int = 2,
+        max_queued: int = 1000,
+        keep_finished: int = 1000,
+    ):
+        self.database = database
+        self.handlers = handlers
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.jobs: Dict[str, Job] = {}
+        # Unbounded so restored jobs always fit; `submit` enforces max_queued
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        # Jobs still QUEUED; the queue also holds cancelled entries until a worker skips them
+        self._waiting = 0
+        self._sequence = itertools.count()
+        self._finished: List[str] = []
+        self._tasks: List[asyncio.Task] = []
+
+    # -- persistence -----------------------------------------------------
+
+    async def _insert(self, job: Job) -> None:
+        await self.database.execute(
+            """
+            INSERT INTO jobs (id, kind, priority, status, payload, timeout, created_at)
+            VALUES (:id, :kind, :priority, :status, :payload, :timeout, :created_at)
+            """,
+            values={
+                "id": job.id,
+                "kind": job.kind,
+                "priority": job.priority,
+                "status": job.status,
+                "payload": json.dumps(job.payload),
+                "timeout": job.timeout,
+                "created_at": job.created_at,
+            },
+        )
+
+    async def _save(self, job: Job) -> None:
+        try:
+            await self.database.execute(
+                """
+                UPDATE jobs SET status = :status, result = :result, error = :error,
+                       started_at = :started_at, finished_at = :finished_at
+                WHERE id = :id
+                """,
+                values={
+                    "id": job.id,
+                    "status": job.status,
+                    "result": None if job.result is None else json.dumps(job.result, default=str),
+                    "error": job.error,
+                    "started_at": job.started_at,
+                    "finished_at": job.finished_at,
+                },
+            )
+        except Exception as e:
+            print(f"Job {job.id} state not saved: {e}")
+
+    # -- lifecycle -------------------------------------------------------
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        try:
+            rows = await self.database.fetch_all(
+                """
+                SELECT id, kind, priority, payload, timeout, created_at FROM jobs
+                WHERE status IN (:queued, :running)
+                ORDER BY created_at
+                """,
+                values={"queued": QUEUED, "running": RUNNING},
+            )
+        except Exception as e:
+            print(f"Job restore failed: {e}")
+            rows = []
+        for row in rows:
+            job = Job(
+                row["kind"], json.loads(row["payload"]), priority=row["priority"],
+                timeout=row["timeout"], job_id=row["id"], created_at=row["created_at"],
+            )
+            self.jobs[job.id] = job
+            self._enqueue(job)
+            await self._save(job)
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        # Running jobs stay "running" in SQLite and are retried on restart
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    # -- API -------------------------------------------------------------
+
+    def _enqueue(self, job: Job) -> None:
+        self._queue.put_nowait((-job.priority, next(self._sequence), job.id))
+        self._waiting += 1
+
+    async def submit(
+        self, kind: str, payload: Dict[str, Any], priority: int = 0, timeout: Optional[float] = None
+    ) -> Job:
+        """
+        Raises KeyError for an unknown kind and asyncio.QueueFull when
+        `max_queued` jobs are already waiting.
+        """
+        if kind not in self.handlers:
+            raise KeyError(kind)
+        if self._waiting >= self.max_queued:
+            raise asyncio.QueueFull()
+        job = Job(kind, payload, priority=priority, timeout=timeout)
+        await self._insert(job)
+        self.jobs[job.id] = job
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        row = await self.database.fetch_one(
+            """
+            SELECT id, kind, priority, status, result, error, created_at, started_at, finished_at
+            FROM jobs WHERE id = :id
+            """,
+            values={"id": job_id},
+        )
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "progress": 1.0 if row["status"] == SUCCEEDED else 0.0,
+            "message": "",
+            "result": None if row["result"] is None else json.loads(row["result"]),
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return await self.get(job_id)
+        if job.status == QUEUED:
+            # The worker skips it when it comes up in the queue
+            self._waiting -= 1
+            await self._finish(job, CANCELLED)
+        elif job.status == RUNNING and job.task is not None:
+            job.task.cancel()
+        return job.snapshot()
+
+    async def watch(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the job's snapshot now and after every change until it finishes.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            snapshot = await self.get(job_id)
+            if snapshot is not None:
+                yield snapshot
+            return
+        while True:
+            changed = job._changed
+            yield job.snapshot()
+            if job.status in FINISHED:
+                return
+            await changed.wait()
+
+    def stats(self) -> Dict[str, int]:
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {**counts, "workers": self.workers}
+
+    # -- workers ---------------------------------------------------------
+
+    async def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        if status == SUCCEEDED:
+            job.progress = 1.0
+        job.touch()
+        await self._save(job)
+
+        # Finished jobs stay readable from SQLite once dropped from memory
+        self._finished.append(job.id)
+        while len(self._finished) > self.keep_finished:
+            self.jobs.pop(self._finished.pop(0), None)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue
+
+            self._waiting -= 1
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.touch()
+            await self._save(job)
+
+            job.task = asyncio.create_task(self.handlers[job.kind](job.payload, job))
+            try:
+                result = await asyncio.wait_for(asyncio.shield(job.task), timeout=job.timeout)
+            except asyncio.TimeoutError:
+                job.task.cancel()
+                await self._finish(job, FAILED, error=f"Timed out after {job.timeout}s")
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    # The worker itself is being stopped
+                    job.task.cancel()
+                    raise
+                await self._finish(job, CANCELLED)
+            except Exception as e:
+                await self._finish(job, FAILED, error=f"{type(e).__name__}: {e}")
+            else:
+                await self._finish(job, SUCCEEDED, result=result)
+            finally:
+                job.task = None
@@ -1,7 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import router, inventory_router
-from config.settings import database
+from api.routes import (
+    router, inventory_router, sales_router, reports_router, metrics_router,
+    get_retriever, get_memory, get_jobs,
+)
+from config.settings import database, close_async_client, VERSION_POLL_SECONDS
+from db import versions
+from db.materialized import ensure_inventory_metrics
+from analytics.forecast import shutdown_process_pool
+from telemetry.metrics import MetricsMiddleware
 
 app = FastAPI(
     title="Smart Sales AI",
@@ -18,13 +25,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(router)
 app.include_router(inventory_router)
+app.include_router(sales_router)
+app.include_router(reports_router)
+app.include_router(metrics_router)
 
 @app.on_event("startup")
 async def startup():
     await database.connect()
+    await get_memory().start()
+    try:
+        await ensure_inventory_metrics(database)
+    except Exception as e:
+        print(f"inventory_metrics not prepared: {e}")
+    await versions.start(database, VERSION_POLL_SECONDS)
+    try:
+        await get_retriever().load()
+    except Exception as e:
+        print(f"Retriever index not loaded: {e}")
+    await get_jobs().start()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await get_jobs().stop()
+    try:
+        get_retriever().vector_store.flush()
+    except Exception as e:
+        print(f"Vector index not flushed: {e}")
+    await versions.stop()
+    await close_async_client()
+    await get_memory().stop()
+    shutdown_process_pool()
     await database.disconnect()
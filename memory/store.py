@@ -0,0 +1,223 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token), good enough for budgeting.
+    """
+    return len(text or "") // 4 + 1
+
+
+class SessionMemory:
+    """
+    Conversation state of one session: recent turns in a ring buffer plus a
+    rolling summary of the turns that were compacted out of it.
+    """
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Tuple[str, str, int]] = deque(maxlen=max_turns)
+        self.summary = ""
+        self.tokens = 0
+        self.rendered: Optional[str] = ""
+
+    def render(self) -> str:
+        if self.rendered is None:
+            lines = []
+            if self.summary:
+                lines.append(f"Earlier in this conversation: {self.summary}")
+            lines.extend(f"{role}: {text}" for role, text, _ in self.turns)
+            self.rendered = "\n".join(lines)
+        return self.rendered
+
+
+class MemoryStore:
+    """
+    Per-session conversation memory.
+
+    - Each session keeps its recent turns in a ring buffer. When they exceed
+      `token_budget`, the oldest turns are folded into a short rolling
+      summary, so prompts carry a bounded amount of history.
+    - `history()` returns the pre-rendered slice for a session in O(1); it is
+      only re-rendered after the session changes.
+    - Idle sessions are evicted LRU-first beyond `max_sessions`; they are
+      reloaded from SQLite on their next request, together with their
+      turns not written yet. Concurrent requests share one reload.
+    - Turns are persisted by a background writer (write-behind), so the
+      request path never waits on disk. While SQLite keeps failing, at
+      most `max_pending` unwritten turns are kept, oldest dropped first.
+    """
+
+    def __init__(
+        self,
+        database,
+        max_sessions: int = 10000,
+        max_turns: int = 20,
+        token_budget: int = 800,
+        summary_budget: int = 200,
+        flush_interval: float = 0.5,
+        batch_size: int = 256,
+        max_pending: int = 10000,
+    ):
+        self.database = database
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        # Turns not committed yet, oldest first; a batch leaves only once written
+        self._pending: List[dict] = []
+        # Held while a batch is being written, so a restore sees every turn
+        # either in SQLite or in _pending, never in between
+        self._flush_lock = asyncio.Lock()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._writer: Optional[asyncio.Task] = None
+
+    # -- request path ----------------------------------------------------
+
+    def _session(self, session_id: str) -> SessionMemory:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = SessionMemory(self.max_turns)
+            self.sessions[session_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        return session
+
+    def history(self, session_id: Optional[str]) -> str:
+        if not session_id or session_id not in self.sessions:
+            return ""
+        return self._session(session_id).render()
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        session = self._session(session_id)
+        self._add_turn(session, role, text)
+        self._pending.append({
+            "session_id": session_id,
+            "role": role,
+            "content": text,
+            "created_at": time.time(),
+        })
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _add_turn(self, session: SessionMemory, role: str, text: str) -> None:
+        if len(session.turns) == session.turns.maxlen:
+            self._compact(session, session.turns.popleft())
+
+        tokens = estimate_tokens(text)
+        session.turns.append((role, text, tokens))
+        session.tokens += tokens
+        while session.tokens > self.token_budget and len(session.turns) > 1:
+            self._compact(session, session.turns.popleft())
+        session.rendered = None
+
+    def _compact(self, session: SessionMemory, turn: Tuple[str, str, int]) -> None:
+        role, text, tokens = turn
+        session.tokens -= tokens
+
+        words = text.split()
+        gist = " ".join(words[:24]) + (" ..." if len(words) > 24 else "")
+        summary = f"{session.summary} {role}: {gist}".strip()
+
+        # Keep the most recent part of the summary within its budget
+        max_chars = self.summary_budget * 4
+        if len(summary) > max_chars:
+            summary = "... " + summary[-max_chars:]
+        session.summary = summary
+
+    async def ensure_loaded(self, session_id: Optional[str]) -> None:
+        """
+        Restores a session evicted from RAM (or lost in a restart) from SQLite.
+        """
+        if not session_id or session_id in self.sessions:
+            return
+        loading = self._loading.get(session_id)
+        if loading is None:
+            loading = self._loading[session_id] = asyncio.ensure_future(self._restore(session_id))
+            loading.add_done_callback(lambda _: self._loading.pop(session_id, None))
+        await asyncio.shield(loading)
+
+    async def _restore(self, session_id: str) -> None:
+        async with self._flush_lock:
+            try:
+                rows = await self.database.fetch_all(
+                    """
+                    SELECT role, content FROM conversation_turns
+                    WHERE session_id = :session_id
+                    ORDER BY id DESC LIMIT :limit
+                    """,
+                    values={"session_id": session_id, "limit": self.max_turns * 2},
+                )
+            except Exception as e:
+                print(f"Memory restore failed for {session_id}: {e}")
+                rows = []
+            unflushed = [turn for turn in self._pending if turn["session_id"] == session_id]
+
+        # Unwritten turns are newer than every written one
+        self.sessions.pop(session_id, None)
+        session = self._session(session_id)
+        for row in reversed(rows):
+            self._add_turn(session, row["role"], row["content"])
+        for turn in unflushed:
+            self._add_turn(session, turn["role"], turn["content"])
+
+    # -- write-behind ----------------------------------------------------
+
+    async def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        if self._writer is not None:
+            # Let the writer finish its current batch rather than cancel a
+            # write that may already be committing
+            self._stopping = True
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+            self._stopping = False
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                try:
+                    await self.database.execute_many(
+                        """
+                        INSERT INTO conversation_turns (session_id, role, content, created_at)
+                        VALUES (:session_id, :role, :content, :created_at)
+                        """,
+                        values=batch,
+                    )
+                except Exception:
+                    # Keep the turns for the next attempt, within the cap
+                    overflow = len(self._pending) - self.max_pending
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        print(f"Memory write-behind dropped {overflow} unwritten turns")
+                    raise
+                # New turns are only ever appended, so the batch is still in front
+                del self._pending[:len(batch)]
+
+    async def _write_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Memory write-behind failed: {e}")
@@ -0,0 +1,329 @@
+import asyncio
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from db import versions
+from rag.vector_store import VectorStore
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "do", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "our", "should", "the", "this", "to",
+    "we", "what", "which", "with", "current", "store",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental inverted index with Okapi BM25 scoring.
+
+    Documents can be added, replaced and removed one at a time; only the
+    postings of the touched terms change, nothing is rebuilt. Postings are
+    split by partition (the store id) so a store-scoped search only walks
+    that store's documents.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Optional[str], Dict[str, int]]] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_partition: Dict[str, Optional[str]] = {}
+        self.doc_freq: Dict[str, int] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, doc_id: str, text: str, partition: Optional[str] = None) -> None:
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[doc_id] = terms
+        self.doc_partition[doc_id] = partition
+        self.doc_len[doc_id] = sum(terms.values())
+        self.total_len += self.doc_len[doc_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {}).setdefault(partition, {})[doc_id] = tf
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+
+    def remove(self, doc_id: str) -> None:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        partition = self.doc_partition.pop(doc_id)
+        self.total_len -= self.doc_len.pop(doc_id)
+        for term in terms:
+            partitions = self.postings[term]
+            docs = partitions[partition]
+            del docs[doc_id]
+            if not docs:
+                del partitions[partition]
+            self.doc_freq[term] -= 1
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+                del self.postings[term]
+
+    def search(self, query: str, k: int = 10, partition: Optional[str] = None) -> List[tuple]:
+        """
+        Returns [(doc_id, score)] best first, optionally within one partition.
+        """
+        n_docs = len(self.doc_terms)
+        if not n_docs:
+            return []
+        avg_len = self.total_len / n_docs
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            partitions = self.postings.get(term)
+            if not partitions:
+                continue
+            df = self.doc_freq[term]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            if partition is None:
+                candidates = [doc for docs in partitions.values() for doc in docs.items()]
+            else:
+                candidates = partitions.get(partition, {}).items()
+            for doc_id, tf in candidates:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class HybridRetriever:
+    """
+    Finds the products relevant to a question by fusing BM25 hits over
+    product names with vector-store hits (reciprocal rank fusion). Store
+    names and locations live in their own BM25 index and resolve which
+    store a question is about when the context doesn't say.
+
+    Rows are loaded from the `products`/`stores` tables once. After an
+    inventory version moves, the next search fetches only the products
+    listed in the change log since the last sync (db/versions.py) and
+    updates them row by row; concurrent searches share one sync. A full
+    per-store resync only happens when the log was pruned past that point.
+    """
+
+    RRF_K = 60
+    FETCH_CHUNK = 500
+    # Products embedded per worker-thread call while loading
+    EMBED_BATCH = 2000
+
+    def __init__(self, database, vector_store: VectorStore):
+        self.database = database
+        self.vector_store = vector_store
+        self.product_index = BM25Index()
+        self.store_index = BM25Index()
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.stores: Dict[str, Dict[str, Any]] = {}
+        self.store_products: Dict[str, Set[str]] = {}
+        self._dirty = False
+        self._change_seq = 0
+        self._sync_lock = asyncio.Lock()
+        versions.subscribe(self._mark_dirty)
+
+    def _mark_dirty(self, store_id: Optional[str]) -> None:
+        self._dirty = True
+
+    # -- indexing --------------------------------------------------------
+
+    async def load(self) -> None:
+        # Taken first: changes made while loading are applied again, harmlessly
+        self._change_seq = await versions.last_change(self.database)
+        stores = await self.database.fetch_all("SELECT * FROM stores")
+        for row in stores:
+            self.upsert_store(dict(row))
+
+        rows = await self.database.fetch_all("SELECT * FROM products")
+        products = [dict(row) for row in rows]
+        for product in products:
+            self._index_product(product)
+
+        # Only embed what the persisted vector index doesn't have yet, and
+        # drop vectors of products deleted while the server was down
+        missing = [p for p in products if not self.vector_store.contains(str(p["id"]))]
+        for start in range(0, len(missing), self.EMBED_BATCH):
+            await self._embed_in_thread(missing[start:start + self.EMBED_BATCH])
+        stale = [pid for pid in self.vector_store.item_ids() if pid not in self.products]
+        if stale:
+            self.vector_store.delete(ids=stale)
+        await asyncio.to_thread(self.vector_store.flush)
+
+    async def _embed_in_thread(self, products: List[Dict[str, Any]]) -> None:
+        """
+        Embeds off the event loop, then stores the vectors on it. Rows a
+        sync changed or removed meanwhile are skipped; the sync has
+        already embedded their current text.
+        """
+        texts = [str(p.get("name") or "") for p in products]
+        vectors = await asyncio.to_thread(self.vector_store.embedder, texts)
+        keep = []
+        for i, product in enumerate(products):
+            current = self.products.get(str(product["id"]))
+            if current is not None and (current.get("name"), current.get("store_id")) == (
+                product.get("name"), product.get("store_id")
+            ):
+                keep.append(i)
+        if keep:
+            self.vector_store.upsert(
+                ids=[str(products[i]["id"]) for i in keep],
+                store_ids=[str(products[i].get("store_id") or "") for i in keep],
+                vectors=vectors[keep],
+            )
+
+    def upsert_store(self, store: Dict[str, Any]) -> None:
+        store_id = str(store["id"])
+        self.stores[store_id] = store
+        self.store_index.add(store_id, f"{store.get('name') or ''} {store.get('location') or ''}")
+
+    def upsert_products(self, products: List[Dict[str, Any]]) -> None:
+        for product in products:
+            self._index_product(product)
+        self._embed(products)
+
+    def remove_products(self, product_ids: List[str]) -> None:
+        for product_id in product_ids:
+            product = self.products.pop(product_id, None)
+            if product is not None:
+                self.store_products.get(str(product.get("store_id")), set()).discard(product_id)
+            self.product_index.remove(product_id)
+        self.vector_store.delete(ids=product_ids)
+
+    def _index_product(self, product: Dict[str, Any]) -> None:
+        product_id = str(product["id"])
+        store_id = str(product.get("store_id") or "")
+        previous = self.products.get(product_id)
+        if previous is not None and previous.get("store_id") != product.get("store_id"):
+            self.store_products.get(str(previous.get("store_id")), set()).discard(product_id)
+
+        self.products[product_id] = product
+        self.store_products.setdefault(store_id, set()).add(product_id)
+        self.product_index.add(product_id, str(product.get("name") or ""), partition=store_id)
+
+    def _embed(self, products: List[Dict[str, Any]]) -> None:
+        if not products:
+            return
+        self.vector_store.upsert(
+            ids=[str(p["id"]) for p in products],
+            store_ids=[str(p.get("store_id") or "") for p in products],
+            texts=[str(p.get("name") or "") for p in products],
+        )
+
+    def _apply(self, candidates: Iterable[str], fresh: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Indexes the `fresh` rows and removes the `candidates` missing from them.
+        """
+        removed = [pid for pid in candidates if pid not in fresh and pid in self.products]
+        renamed = []
+        for pid, product in fresh.items():
+            previous = self.products.get(pid)
+            if (
+                previous is None
+                or previous.get("name") != product.get("name")
+                or previous.get("store_id") != product.get("store_id")
+            ):
+                self._index_product(product)
+                renamed.append(product)
+            else:
+                # Stock figures changed only: the text indexes stay as they are
+                self.products[pid] = product
+
+        if removed:
+            self.remove_products(removed)
+        self._embed(renamed)
+        if removed or renamed:
+            self.vector_store.flush()
+
+    async def _sync_products(self, product_ids: List[str]) -> None:
+        ids = list(dict.fromkeys(product_ids))
+        fresh: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(ids), self.FETCH_CHUNK):
+            chunk = ids[start:start + self.FETCH_CHUNK]
+            rows = await self.database.fetch_all(
+                f"SELECT * FROM products WHERE id IN ({', '.join(f':p{i}' for i in range(len(chunk)))})",
+                values={f"p{i}": pid for i, pid in enumerate(chunk)},
+            )
+            fresh.update((str(row["id"]), dict(row)) for row in rows)
+        self._apply(ids, fresh)
+
+    async def _sync_store(self, store_id: str) -> None:
+        rows = await self.database.fetch_all(
+            "SELECT * FROM products WHERE store_id = :store_id", values={"store_id": store_id}
+        )
+        self._apply(list(self.store_products.get(store_id, ())), {str(row["id"]): dict(row) for row in rows})
+
+    async def _sync_changes(self) -> None:
+        while True:
+            batch = await versions.product_changes(self.database, self._change_seq)
+            if batch is None:
+                # Behind the pruned head of the log: resync every store
+                self._change_seq = await versions.last_change(self.database)
+                rows = await self.database.fetch_all("SELECT DISTINCT store_id FROM products")
+                for store_id in {str(row["store_id"] or "") for row in rows} | set(self.store_products):
+                    await self._sync_store(store_id)
+                return
+            seq, product_ids = batch
+            if not product_ids:
+                return
+            await self._sync_products(product_ids)
+            self._change_seq = seq
+
+    async def refresh(self) -> None:
+        if not self._dirty and not self._sync_lock.locked():
+            return
+        # Searches arriving mid-sync wait for it instead of reading a half-updated index
+        async with self._sync_lock:
+            while self._dirty:
+                self._dirty = False
+                try:
+                    await self._sync_changes()
+                except Exception:
+                    self._dirty = True
+                    raise
+
+    # -- queries ---------------------------------------------------------
+
+    async def search(self, query: str, store_id: Optional[str] = None, k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Returns up to `k` product rows relevant to `query`, best first.
+        """
+        await self.refresh()
+
+        if store_id is None:
+            store_hits = self.store_index.search(query, k=1)
+            if store_hits:
+                store_id = store_hits[0][0]
+
+        ranks: Dict[str, float] = {}
+        for rank, (pid, _) in enumerate(self.product_index.search(query, k=k * 2, partition=store_id)):
+            ranks[pid] = ranks.get(pid, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+
+        for rank, hit in enumerate(self.vector_store.query(query, k=k * 2, store_id=store_id)):
+            if hit["score"] <= 0:
+                continue
+            ranks[hit["id"]] = ranks.get(hit["id"], 0.0) + 1.0 / (self.RRF_K + rank + 1)
+
+        best = sorted(ranks.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [self.products[pid] for pid, _ in best if pid in self.products]
+
+    def format_rows(self, rows: List[Dict[str, Any]]) -> str:
+        """
+        Compact one-line-per-product rendering for agent prompts.
+        """
+        lines = ["product_name | store_name | current_stock | avg_daily_sales | days_of_cover"]
+        for row in rows:
+            store = self.stores.get(str(row.get("store_id")), {})
+            stock = row.get("current_stock") or 0
+            sales = row.get("avg_daily_sales") or 0
+            cover = round(stock / sales, 1) if sales > 0 else "n/a"
+            lines.append(f"{row.get('name')} | {store.get('name') or row.get('store_id')} | {stock} | {sales} | {cover}")
+        return "\n".join(lines)
@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+EmbeddingFunction = Callable[[Sequence[str]], np.ndarray]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Growing an index whose rows are at least this share of tombstones
+# compacts it instead of keeping the dead rows
+COMPACT_DEAD_FRACTION = 0.5
+
+
+class HashingEmbedder:
+    """
+    Deterministic, offline embedder: signed feature hashing of words and
+    character trigrams into a fixed-size, L2-normalized float32 vector.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN.findall((text or "").lower())
+            grams = list(words)
+            for word in words:
+                padded = f"#{word}#"
+                grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+            for gram in grams:
+                h = zlib.crc32(gram.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        return _normalize(out)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorStore:
+    """
+    Embedded vector index persisted as memory-mapped NumPy files.
+
+    Layout under `path`:
+    - vectors.npy: float32 [capacity, dim], rows L2-normalized
+    - ids.npy:     fixed-width unicode ids (product ids)
+    - stores.npy:  int32 store codes, mapped through meta.json
+    - alive.npy:   bool tombstone mask
+    - meta.json:   row count, dim and the store-code vocabulary
+
+    Opening the store maps the files without reading or re-embedding
+    anything; queries are one matrix-vector product over the live rows.
+    An index built with another `dim` is discarded on open, since its
+    vectors cannot be compared with the embedder's; callers re-add rows.
+    Writes land in the mapped files right away, but meta.json only moves
+    on `flush()`, so writers flush after each batch of changes.
+    """
+
+    ID_DTYPE = "<U64"
+
+    def __init__(
+        self,
+        path: str,
+        dim: int = 256,
+        embedder: Optional[EmbeddingFunction] = None,
+        initial_capacity: int = 1024,
+    ):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder(dim)
+        self.dim = dim
+        self.count = 0
+        self.store_codes: Dict[str, int] = {}
+        self._id_index: Optional[Dict[str, int]] = None
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._file("meta.json")):
+            self._load()
+        if not os.path.exists(self._file("meta.json")):
+            self._allocate(initial_capacity)
+            self.flush()
+
+    # -- persistence -----------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        with open(self._file("meta.json")) as f:
+            meta = json.load(f)
+        if meta["dim"] != self.dim:
+            print(f"Vector index at {self.path} has dim {meta['dim']}, expected {self.dim}; rebuilding it")
+            os.remove(self._file("meta.json"))
+            return
+        self.count = meta["count"]
+        self.store_codes = meta["store_codes"]
+        self.vectors = open_memmap(self._file("vectors.npy"), mode="r+")
+        self.ids = open_memmap(self._file("ids.npy"), mode="r+")
+        self.stores = open_memmap(self._file("stores.npy"), mode="r+")
+        self.alive = open_memmap(self._file("alive.npy"), mode="r+")
+
+    def _allocate(self, capacity: int, compact: bool = False) -> None:
+        """
+        (Re)create the backing files with `capacity` rows, keeping the
+        first `count` rows, or only the live ones with `compact`. Files are
+        written beside the old ones and swapped in, so a crash never leaves
+        a half-written index.
+        """
+        keep = np.flatnonzero(self.alive[:self.count]) if compact else slice(0, self.count)
+        kept = len(keep) if compact else self.count
+        arrays = {
+            "vectors.npy": (np.float32, (capacity, self.dim)),
+            "ids.npy": (self.ID_DTYPE, (capacity,)),
+            "stores.npy": (np.int32, (capacity,)),
+            "alive.npy": (np.bool_, (capacity,)),
+        }
+        for name, (dtype, shape) in arrays.items():
+            arr = open_memmap(self._file(name + ".tmp"), mode="w+", dtype=dtype, shape=shape)
+            if kept:
+                arr[:kept] = getattr(self, name[:-4])[keep]
+            arr.flush()
+            del arr
+
+        for name in arrays:
+            os.replace(self._file(name + ".tmp"), self._file(name))
+
+        self.vectors = open_memmap(self._file("vectors.npy"), mode="r+")
+        self.ids = open_memmap(self._file("ids.npy"), mode="r+")
+        self.stores = open_memmap(self._file("stores.npy"), mode="r+")
+        self.alive = open_memmap(self._file("alive.npy"), mode="r+")
+        if compact:
+            # Rows moved: the old count and id positions are void now
+            self.count = kept
+            self._id_index = None
+            self.flush()
+
+    def flush(self) -> None:
+        for arr in (self.vectors, self.ids, self.stores, self.alive):
+            arr.flush()
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"count": self.count, "dim": self.dim, "store_codes": self.store_codes}, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    # -- writes ----------------------------------------------------------
+
+    @property
+    def capacity(self) -> int:
+        return self.vectors.shape[0]
+
+    def _index(self) -> Dict[str, int]:
+        # Built on first write only, so read-only startups stay O(1).
+        if self._id_index is None:
+            live = np.flatnonzero(self.alive[:self.count])
+            self._id_index = dict(zip(self.ids[live].tolist(), live.tolist()))
+        return self._id_index
+
+    def _store_code(self, store_id: str) -> int:
+        code = self.store_codes.get(store_id)
+        if code is None:
+            code = len(self.store_codes)
+            self.store_codes[store_id] = code
+        return code
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        store_ids: Sequence[str],
+        texts: Optional[Sequence[str]] = None,
+        vectors: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Insert or replace rows. Pass either `texts` (embedded with the
+        configured embedder) or precomputed `vectors`.
+        """
+        if not len(ids):
+            return
+        if vectors is None:
+            vectors = self.embedder(list(texts or []))
+        vectors = _normalize(vectors)
+
+        index = self._index()
+        new = len({item_id for item_id in ids if item_id not in index})
+        if self.count + new > self.capacity:
+            live = len(index)
+            compact = self.count - live >= self.count * COMPACT_DEAD_FRACTION
+            needed = (live if compact else self.count) + new
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._allocate(capacity, compact=compact)
+            index = self._index()
+
+        rows = np.empty(len(ids), dtype=np.int64)
+        new = 0
+        for i, item_id in enumerate(ids):
+            row = index.get(item_id)
+            if row is None:
+                row = self.count + new
+                index[item_id] = row
+                new += 1
+            rows[i] = row
+
+        self.vectors[rows] = vectors
+        self.ids[rows] = np.asarray(ids, dtype=self.ID_DTYPE)
+        self.stores[rows] = np.fromiter((self._store_code(s) for s in store_ids), dtype=np.int32, count=len(ids))
+        self.alive[rows] = True
+        self.count += new
+
+    def delete(self, ids: Optional[Iterable[str]] = None, store_id: Optional[str] = None) -> int:
+        """
+        Tombstone rows by id and/or every row of a store. Returns rows removed.
+        """
+        index = self._index()
+        mask = np.zeros(self.count, dtype=bool)
+        if ids is not None:
+            rows = [index[i] for i in ids if i in index]
+            mask[rows] = True
+        if store_id is not None and store_id in self.store_codes:
+            mask |= self.stores[:self.count] == self.store_codes[store_id]
+        mask &= self.alive[:self.count]
+
+        removed = np.flatnonzero(mask)
+        self.alive[removed] = False
+        for item_id in self.ids[removed].tolist():
+            index.pop(item_id, None)
+        return int(removed.size)
+
+    # -- reads -----------------------------------------------------------
+
+    def contains(self, item_id: str) -> bool:
+        return item_id in self._index()
+
+    def item_ids(self) -> List[str]:
+        return list(self._index())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def query(
+        self,
+        text: Optional[str] = None,
+        k: int = 10,
+        store_id: Optional[str] = None,
+        vector: Optional[np.ndarray] = None,
+    ) -> List[Dict[str, object]]:
+        """
+        Top-k cosine similarity search, optionally restricted to one store.
+        """
+        if self.count == 0:
+            return []
+        if vector is None:
+            vector = self.embedder([text or ""])[0]
+        vector = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+
+        mask = self.alive[:self.count]
+        if store_id is not None:
+            code = self.store_codes.get(store_id)
+            if code is None:
+                return []
+            mask = mask & (self.stores[:self.count] == code)
+
+        # Score only the candidate rows: a store filter usually keeps a
+        # small slice of the matrix, so gathering it beats a full product.
+        rows = np.flatnonzero(mask)
+        k = min(k, rows.size)
+        if k <= 0:
+            return []
+        if rows.size == self.count:
+            scores = self.vectors[:self.count] @ vector
+        else:
+            scores = self.vectors[rows] @ vector
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top_scores = scores[top]
+        top = rows[top]
+
+        stores_by_code = {code: sid for sid, code in self.store_codes.items()}
+        return [
+            {
+                "id": str(self.ids[row]),
+                "store_id": stores_by_code.get(int(self.stores[row])),
+                "score": float(score),
+            }
+            for row, score in zip(top, top_scores)
+        ]
@@ -0,0 +1,209 @@
+"""
+Report artifacts on local disk.
+
+Exports stream rows from an async iterator into a file chunk by chunk,
+hashing as they go; the file is then stored under its SHA-256, so an
+identical export is kept once and its URL stays stable. Files are served
+by the `/reports/{name}` route with HTTP range support.
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import os
+import re
+import uuid
+from typing import Any, AsyncIterator, Dict, Hashable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+_NAME = re.compile(r"^[0-9a-f]{64}\.(csv|parquet)$")
+
+READ_CHUNK = 64 * 1024
+
+
+class ArtifactStore:
+    def __init__(self, root: str, base_url: str = "", chunk_rows: int = 5000, max_memo: int = 256):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.chunk_rows = chunk_rows
+        self.max_memo = max_memo
+        # Export fingerprint -> artifact, so unchanged reports skip the query
+        self._memo: Dict[Hashable, Dict[str, Any]] = {}
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str) -> Optional[str]:
+        if not _NAME.match(name):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def _artifact(self, name: str, fmt: str, rows: int, size: int) -> Dict[str, Any]:
+        url = f"{self.base_url}/reports/{name}"
+        return {
+            "name": name,
+            "format": fmt,
+            "rows": rows,
+            "bytes": size,
+            "sha256": name.split(".")[0],
+            "publicUrl": url,
+            "downloadUrl": f"{url}?download=1",
+        }
+
+    async def export(
+        self,
+        rows: AsyncIterator[Mapping[str, Any]],
+        columns: Sequence[str],
+        fmt: str = "csv",
+        fingerprint: Optional[Hashable] = None,
+    ) -> Dict[str, Any]:
+        """
+        Writes `rows` to a content-addressed file and returns its metadata.
+        At most `chunk_rows` rows are held in memory at a time.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if fingerprint is not None:
+            cached = self._memo.get((fingerprint, fmt))
+            if cached is not None and self.path(cached["name"]):
+                return cached
+
+        loop = asyncio.get_running_loop()
+        tmp = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        writer = _CsvWriter(tmp, columns) if fmt == "csv" else _ParquetWriter(tmp, columns)
+        count = 0
+        try:
+            chunk: List[Tuple[Any, ...]] = []
+            async for row in rows:
+                chunk.append(tuple(row[c] for c in columns))
+                if len(chunk) >= self.chunk_rows:
+                    await loop.run_in_executor(None, writer.write, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                await loop.run_in_executor(None, writer.write, chunk)
+                count += len(chunk)
+            digest = await loop.run_in_executor(None, writer.close)
+        except BaseException:
+            writer.abort()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            # Hands a database cursor back to its pool when we stop early
+            aclose = getattr(rows, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        name = f"{digest}.{fmt}"
+        final = os.path.join(self.root, name)
+        if os.path.exists(final):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, final)
+
+        artifact = self._artifact(name, fmt, count, os.path.getsize(final))
+        if fingerprint is not None:
+            if len(self._memo) >= self.max_memo:
+                self._memo.pop(next(iter(self._memo)))
+            self._memo[(fingerprint, fmt)] = artifact
+        return artifact
+
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.file = open(path, "wb")
+        self.digest = hashlib.sha256()
+        self._emit([columns])
+
+    def _emit(self, rows) -> None:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        data = buffer.getvalue().encode("utf-8")
+        self.digest.update(data)
+        self.file.write(data)
+
+    def write(self, rows: List[Tuple[Any, ...]]) -> None:
+        self._emit(rows)
+
+    def close(self) -> str:
+        self.file.close()
+        return self.digest.hexdigest()
+
+    def abort(self) -> None:
+        self.file.close()
+
+
+class _ParquetWriter:
+    """
+    One row group per chunk. Needs pyarrow, which is optional.
+    """
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)") from e
+        self.pa = pa
+        self.path = path
+        self.columns = list(columns)
+        self.writer = None
+        self._pq = pq
+
+    def write(self, rows: List[Tuple[Any, ...]]) -> None:
+        table = self.pa.Table.from_pydict(
+            {name: [row[i] for row in rows] for i, name in enumerate(self.columns)}
+        )
+        if self.writer is None:
+            self.writer = self._pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self) -> str:
+        if self.writer is None:
+            self.write([])
+        self.writer.close()
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as f:
+            for block in iter(lambda: f.read(READ_CHUNK), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single "bytes=" range, or None when it
+    cannot be satisfied. Multi-range requests are served whole.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return 0, size - 1
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return 0, size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def file_chunks(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(READ_CHUNK, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
@@ -0,0 +1,281 @@
+"""
+In-process metrics and per-request timings.
+
+- `span(stage)` times a block. The duration goes into the
+  `stage_duration_seconds{stage}` histogram and, inside `collect()`, into
+  the current request's timings. A span costs two perf_counter calls and
+  a bisect, so it is safe on hot paths.
+- Counters the app already keeps (cache hits, LLM retries, ...) are read
+  at scrape time by collectors passed to `REGISTRY.register`, so they
+  cost nothing per request.
+- Failures that are handled (the request still gets a degraded answer)
+  are counted with `record_failure(stage, error)` instead of printed.
+- `REGISTRY.render()` produces the Prometheus text exposition format.
+"""
+import bisect
+import contextvars
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+NAMESPACE = "smart_sales"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name, type, help, labels, value) for collector output
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labels, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self, namespace: str = NAMESPACE):
+        self.namespace = namespace
+        self.metrics: Dict[str, Any] = {}
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        name = self._name(name)
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, help, labels)
+        return self.metrics[name]
+
+    def histogram(
+        self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        name = self._name(name)
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, help, labels, buckets)
+        return self.metrics[name]
+
+    def register(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """
+        `collector()` is called on every scrape and yields
+        (name, type, help, labels, value) samples.
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+
+        described = set()
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help, labels, value in samples:
+                name = self._name(name)
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_duration_seconds", "Time spent in each stage of request handling", labels=("stage",)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", labels=("method", "route", "status")
+)
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM tokens reported by the API", labels=("model", "type"))
+FAILURES = REGISTRY.counter(
+    "handled_failures_total", "Failures answered with a degraded response", labels=("stage", "error")
+)
+
+
+class Trace:
+    """
+    Stage timings and token counts of one request. Repeated stages (e.g.
+    several DB reads) add up, and stages may nest.
+    """
+
+    __slots__ = ("started", "timings", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def meta(self) -> Dict[str, Any]:
+        """
+        `timings` in milliseconds, with `total` since the trace started.
+        """
+        timings = {stage: round(seconds * 1000, 2) for stage, seconds in self.timings.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return {
+            "timings": timings,
+            "tokens": {"prompt": self.prompt_tokens, "completion": self.completion_tokens},
+        }
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+class collect:
+    """
+    `with collect() as trace:` gathers the spans and tokens of the code
+    inside it (and of tasks it starts) into `trace`.
+    """
+
+    __slots__ = ("trace", "_token")
+
+    def __enter__(self) -> Trace:
+        self.trace = Trace()
+        self._token = _trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc) -> None:
+        try:
+            _trace.reset(self._token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned stream
+            pass
+
+
+class span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, self.stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(self.stage, elapsed)
+
+
+def record_tokens(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+    LLM_TOKENS.inc(prompt_tokens, model, "prompt")
+    LLM_TOKENS.inc(completion_tokens, model, "completion")
+    trace = _trace.get()
+    if trace is not None:
+        trace.prompt_tokens += prompt_tokens
+        trace.completion_tokens += completion_tokens
+
+
+def record_failure(stage: str, error: BaseException) -> None:
+    """
+    Counts a failure the caller recovered from, by stage and exception
+    type (not message, to keep label cardinality bounded).
+    """
+    FAILURES.inc(1, stage, type(error).__name__)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording HTTP_SECONDS per route template (not raw
+    path, to keep label cardinality bounded). Streaming responses are
+    timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status[0]),
+            )
@@ -0,0 +1,101 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from agents import reporting_agent
+from agents.reporting_agent import ReportingAgent
+from api import routes
+from reports.artifacts import ArtifactStore, parse_range
+from telemetry.metrics import FAILURES
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    # Open-ended, and an end past the file is clamped
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+    # Suffix: the last N bytes, or the whole file when N exceeds it
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=-5000", 1000) == (0, 999)
+    # Unsatisfiable
+    assert parse_range("bytes=1000-", 1000) is None
+    assert parse_range("bytes=1500-1600", 1000) is None
+    assert parse_range("bytes=-0", 1000) is None
+    assert parse_range("bytes=50-10", 1000) is None
+    # Unsupported units, multi-range and malformed specs get the whole file
+    assert parse_range("items=0-1", 1000) == (0, 999)
+    assert parse_range("bytes=0-1,5-6", 1000) == (0, 999)
+    assert parse_range("bytes=abc-", 1000) == (0, 999)
+
+
+async def one_export(store: ArtifactStore, data: bytes):
+    async def rows():
+        for line in data.decode().splitlines():
+            yield {"line": line}
+
+    return await store.export(rows(), ["line"])
+
+
+def test_report_route_serves_ranges(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path))
+    artifact = asyncio.run(one_export(store, "\n".join(f"row {i}" for i in range(100)).encode()))
+    monkeypatch.setattr(routes, "_artifacts", store)
+    app = FastAPI()
+    app.include_router(routes.reports_router)
+    client = TestClient(app)
+    url = f"/reports/{artifact['name']}"
+    with open(store.path(artifact["name"]), "rb") as f:
+        body = f.read()
+    size = len(body)
+
+    whole = client.get(url)
+    assert whole.status_code == 200
+    assert whole.content == body
+    assert whole.headers["accept-ranges"] == "bytes"
+    assert "content-range" not in whole.headers
+
+    part = client.get(url, headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == body[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{size}"
+    assert part.headers["content-length"] == "10"
+
+    tail = client.get(url, headers={"Range": "bytes=-7"})
+    assert tail.status_code == 206
+    assert tail.content == body[-7:]
+    assert tail.headers["content-range"] == f"bytes {size - 7}-{size - 1}/{size}"
+
+    opened = client.get(url, headers={"Range": f"bytes={size - 3}-"})
+    assert opened.status_code == 206
+    assert opened.content == body[-3:]
+
+    # A range covering the whole file is a plain 200
+    assert client.get(url, headers={"Range": "bytes=0-"}).status_code == 200
+
+    unsatisfiable = client.get(url, headers={"Range": f"bytes={size}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{size}"
+
+    assert client.get(url, headers={"If-None-Match": f'"{artifact["sha256"]}"'}).status_code == 304
+    assert client.get(f"/reports/{'0' * 64}.csv").status_code == 404
+
+
+def test_reporting_agent_keeps_the_report_when_export_fails(monkeypatch):
+    async def report(database, store_id):
+        return {"kpis": {}, "tables": {}}
+
+    async def failing_export(database, artifacts, report):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(reporting_agent, "build_report", report)
+    monkeypatch.setattr(reporting_agent, "export_report", failing_export)
+    monkeypatch.setattr(reporting_agent, "report_digest", lambda report: "digest")
+    agent = ReportingAgent(name="reporting_agent", llm=None, system_prompt="", database=object(), artifacts=object())
+    before = FAILURES.values.get(("report_export", "OSError"), 0)
+
+    prompt, data = asyncio.run(agent.prepare("weekly report", "store_id: s1"))
+
+    assert data == {"kpis": {}, "tables": {}}
+    assert "digest" in prompt
+    assert FAILURES.values[("report_export", "OSError")] == before + 1
@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from db.bulk_load import BulkLoader
+from db.materialized import SCHEMA
+from db.models import Base
+from db.sales import record_sales
+from db.storage import SQLiteStorage
+
+NOW = time.time()
+
+STORES = [{"id": "s1", "name": "North", "location": "A"}, {"id": "s2", "name": "South", "location": "B"}]
+PRODUCTS = [
+    {"id": f"P{i}", "name": f"Item {i}", "price": "2.5", "store_id": f"s{i % 2 + 1}",
+     "current_stock": str(10 * i), "avg_daily_sales": "1.0", "safety_stock": "3", "lead_time_days": "7"}
+    for i in range(1, 7)
+]
+EVENTS = [
+    {"store_id": f"s{i % 2 + 1}", "product_id": f"P{i}", "quantity": str(q),
+     "unit_price": "" if q % 3 else "4.0", "sold_at": str(NOW - days * 86400)}
+    for i in range(1, 7)
+    for q, days in ((1, 0), (2, 1), (3, 9), (5, 40))
+]
+
+
+def make_db(path):
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def query(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def schema_objects(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ? AND sql IS NOT NULL", (kind,))}
+
+
+def metrics(path):
+    return query(path, "SELECT store_id, product_id, days_of_cover, is_critical, reorder_qty FROM inventory_metrics ORDER BY product_id")
+
+
+def test_empty_cells_keep_existing_values(tmp_path):
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    with BulkLoader(path, verbose=False) as loader:
+        loader.load("stores", STORES)
+        loader.load("products", PRODUCTS)
+    with BulkLoader(path, verbose=False) as loader:
+        loader.load("stores", [{"id": "s1", "name": "", "location": "C"}])
+        loader.load("products", [{"id": "P1", "name": "", "price": "", "current_stock": "99.0", "safety_stock": ""}])
+
+    assert query(path, "SELECT name, location FROM stores WHERE id = 's1'") == [("North", "C")]
+    assert query(path, "SELECT name, price, store_id, current_stock, safety_stock FROM products WHERE id = 'P1'") == [
+        ("Item 1", 2.5, "s2", 99, 3)
+    ]
+    # The triggers stayed in place for the second load
+    assert ("s2", "P1", 99.0, 0, 0) in metrics(path)
+
+    # A new row still needs its NOT NULL values
+    with pytest.raises(sqlite3.IntegrityError):
+        with BulkLoader(path, verbose=False) as loader:
+            loader.load("products", [{"id": "P99", "name": "", "price": "1"}])
+
+
+def test_empty_database_defers_and_rebuilds_schema(tmp_path):
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    conn = sqlite3.connect(path)
+    triggers, indexes = schema_objects(conn, "trigger"), schema_objects(conn, "index")
+    conn.close()
+    assert {"trg_products_metrics_insert", "trg_products_version_insert"} <= triggers
+
+    with BulkLoader(path, verbose=False) as loader:
+        assert not {"trg_products_metrics_insert", "trg_products_version_insert"} & schema_objects(loader.conn, "trigger")
+        loader.load("stores", STORES)
+        loader.load("products", PRODUCTS)
+        assert loader.conn.execute("SELECT COUNT(*) FROM inventory_metrics").fetchone() == (0,)
+
+    conn = sqlite3.connect(path)
+    assert schema_objects(conn, "trigger") == triggers
+    assert schema_objects(conn, "index") == indexes
+    conn.close()
+    assert len(metrics(path)) == len(PRODUCTS)
+    assert ("s2", "P1", 10.0, 0, 0) in metrics(path)
+    assert query(path, "SELECT COUNT(*) FROM data_versions WHERE scope LIKE 'store:%'") == [(2,)]
+
+
+def test_loading_into_live_database_keeps_triggers(tmp_path):
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO stores (id, name) VALUES ('s1', 'North')")
+    conn.commit()
+    conn.close()
+
+    with BulkLoader(path, verbose=False) as loader:
+        assert "trg_products_metrics_insert" in schema_objects(loader.conn, "trigger")
+        loader.load("products", PRODUCTS[:2])
+        # Every row gets its metrics as it lands
+        assert loader.conn.execute("SELECT COUNT(*) FROM inventory_metrics").fetchone() == (2,)
+    assert len(metrics(path)) == 2
+
+
+def test_sales_rollups_match_record_sales(tmp_path):
+    loaded, recorded = str(tmp_path / "loaded.db"), str(tmp_path / "recorded.db")
+    for path in (loaded, recorded):
+        make_db(path)
+        with BulkLoader(path, verbose=False) as loader:
+            loader.load("stores", STORES)
+            loader.load("products", PRODUCTS)
+
+    with BulkLoader(loaded, verbose=False) as loader:
+        loader.load("sales_events", EVENTS[:10])
+    with BulkLoader(loaded, verbose=False) as loader:
+        loader.load("sales_events", EVENTS[10:])
+
+    async def record():
+        database = SQLiteStorage(recorded, readers=1)
+        await database.connect()
+        try:
+            events = [
+                {**e, "quantity": float(e["quantity"]), "sold_at": float(e["sold_at"]),
+                 "unit_price": float(e["unit_price"]) if e["unit_price"] else None}
+                for e in EVENTS
+            ]
+            await record_sales(database, events[:10])
+            await record_sales(database, events[10:])
+        finally:
+            await database.disconnect()
+
+    asyncio.run(record())
+
+    for sql in (
+        "SELECT store_id, product_id, day, quantity, ROUND(revenue, 6) FROM sales_daily ORDER BY 1, 2, 3",
+        "SELECT store_id, product_id, week, quantity, ROUND(revenue, 6) FROM sales_weekly ORDER BY 1, 2, 3",
+        "SELECT id, ROUND(avg_daily_sales, 9) FROM products ORDER BY id",
+        "SELECT * FROM inventory_metrics ORDER BY product_id",
+    ):
+        assert query(loaded, sql) == query(recorded, sql), sql
+    assert query(loaded, "SELECT COUNT(*) FROM sales_daily") != [(0,)]
+
+
+def test_failed_load_still_rebuilds_schema(tmp_path):
+    path = str(tmp_path / "data.db")
+    make_db(path)
+    rows = PRODUCTS[:3] + [{**PRODUCTS[3], "current_stock": "lots"}]
+
+    with pytest.raises(ValueError, match="products row 4: bad current_stock"):
+        with BulkLoader(path, batch_size=2, verbose=False) as loader:
+            loader.load("products", rows)
+
+    conn = sqlite3.connect(path)
+    assert "trg_products_metrics_insert" in schema_objects(conn, "trigger")
+    assert "ix_inventory_metrics_critical" in schema_objects(conn, "index")
+    conn.close()
+    # The committed first batch has its metrics
+    assert [row[1] for row in metrics(path)] == ["P1", "P2"]
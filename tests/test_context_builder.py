@@ -0,0 +1,11 @@
+from agents.context_builder import RISK_CRITICAL_DAYS, RISK_LOW_DAYS, risk_band
+
+
+def test_risk_band_boundaries():
+    assert (RISK_CRITICAL_DAYS, RISK_LOW_DAYS) == (3, 7)
+    assert risk_band(None) == "NO_SALES"
+    assert risk_band(0.0) == "CRITICAL"
+    assert risk_band(2.9) == "CRITICAL"
+    assert risk_band(3.0) == "LOW"
+    assert risk_band(6.9) == "LOW"
+    assert risk_band(7.0) == "HEALTHY"
@@ -0,0 +1,141 @@
+import asyncio
+import math
+import sqlite3
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from analytics import forecast
+from analytics.forecast import (
+    CROSTON_ALPHA, INTERMITTENT_ADI, SERVICE_Z, SES_ALPHAS, fit_demand, refresh_forecasts,
+)
+from analytics.inventory import InventoryMetrics
+from db.materialized import SCHEMA
+from db.models import Base
+from db.sales import epoch_day
+from db.storage import SQLiteStorage
+
+
+def ses_reference(series):
+    best = None
+    for alpha in SES_ALPHAS:
+        level = sum(series[:7]) / 7
+        sse = 0.0
+        for value in series:
+            error = value - level
+            sse += error * error
+            level += alpha * error
+        if best is None or sse < best[1]:
+            best = (level, sse)
+    return best[0], math.sqrt(best[1] / len(series))
+
+
+def croston_reference(series):
+    days, alpha = len(series), CROSTON_ALPHA
+    hits = [value for value in series if value > 0]
+    size = sum(hits) / len(hits) if hits else 0.0
+    interval = days / len(hits) if hits else 1.0
+    since, sse, correction = 1.0, 0.0, 1 - alpha / 2
+    for value in series:
+        error = value - correction * size / interval
+        sse += error * error
+        if value > 0:
+            size += alpha * (value - size)
+            interval += alpha * (since - interval)
+            since = 1.0
+        else:
+            since += 1.0
+    return correction * size / interval, math.sqrt(sse / days)
+
+
+def fit_reference(series, lead_time):
+    demand_days = sum(1 for value in series if value)
+    intermittent = len(series) / max(demand_days, 1) > INTERMITTENT_ADI
+    forecast, sigma = (croston_reference if intermittent else ses_reference)(series)
+    return int(intermittent), max(forecast, 0.0), sigma, math.ceil(SERVICE_Z * sigma * math.sqrt(max(lead_time, 0)))
+
+
+def demand_matrix(rng, rows=40, days=91):
+    demand = rng.poisson(3.0, size=(rows, days)).astype(float)
+    # Every other row is intermittent: mostly zero days
+    demand[::2] *= rng.random(demand[::2].shape) < 0.2
+    demand[-1] = 0.0
+    return demand
+
+
+def test_fit_matches_scalar_reference():
+    rng = np.random.default_rng(3)
+    demand = demand_matrix(rng)
+    lead_times = rng.integers(0, 15, size=demand.shape[0]).astype(float)
+    fit = fit_demand(demand, lead_times)
+    assert fit["method"][::2].all() and not fit["method"][1:-1:2].any()
+    for i, series in enumerate(demand.tolist()):
+        method, value, sigma, safety = fit_reference(series, lead_times[i])
+        assert fit["method"][i] == method
+        assert math.isclose(fit["forecast"][i], value, rel_tol=1e-9, abs_tol=1e-12)
+        assert math.isclose(fit["sigma"][i], sigma, rel_tol=1e-9, abs_tol=1e-12)
+        assert fit["safety_stock"][i] == safety
+
+
+def test_process_pool_chunks_match_direct_fit(monkeypatch):
+    rng = np.random.default_rng(5)
+    demand = demand_matrix(rng, rows=25)
+    lead_times = rng.integers(1, 10, size=demand.shape[0]).astype(float)
+    monkeypatch.setattr(forecast, "CHUNK_ROWS", 7)
+    try:
+        pooled = asyncio.run(forecast._fit_in_pool(demand, lead_times))
+    finally:
+        forecast.shutdown_process_pool()
+    direct = fit_demand(demand, lead_times)
+    for key in direct:
+        np.testing.assert_array_equal(pooled[key], direct[key])
+
+
+def test_refresh_keeps_manual_safety_stock(tmp_path):
+    path = str(tmp_path / "data.db")
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO stores (id, name) VALUES ('s1', 'North')")
+    conn.executemany(
+        "INSERT INTO products (id, name, price, store_id, current_stock, avg_daily_sales, safety_stock, lead_time_days)"
+        " VALUES (?, ?, 1.0, 's1', 10, 2.0, 40, 9)",
+        [("P1", "Selling"), ("P2", "Idle")],
+    )
+    now = time.time()
+    today = epoch_day(now)
+    rng = np.random.default_rng(11)
+    conn.executemany(
+        "INSERT INTO sales_daily (store_id, product_id, day, quantity, revenue) VALUES ('s1', 'P1', ?, ?, 0)",
+        [(today - d, float(q)) for d, q in zip(range(60), rng.poisson(4.0, 60))],
+    )
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        try:
+            assert await refresh_forecasts(database, "s1", now=now) == 1
+            fitted = await database.fetch_val("SELECT safety_stock FROM product_forecasts WHERE product_id = 'P1'")
+            assert fitted != 40
+            manual = await database.fetch_all("SELECT id, safety_stock FROM products ORDER BY id")
+            assert [tuple(row) for row in manual] == [("P1", 40), ("P2", 40)]
+
+            metrics = await InventoryMetrics.fetch(database, "s1")
+            assert metrics.safety_stock.tolist() == [fitted, 40]
+            reorder = await database.fetch_all("SELECT reorder_qty FROM inventory_metrics ORDER BY product_id")
+            assert [row["reorder_qty"] for row in reorder] == metrics.reorder_qty.tolist()
+            assert reorder[0]["reorder_qty"] == max(0, fitted + 18 - 10)
+
+            # Once P1's history ages out, its own safety stock applies again
+            await database.execute("DELETE FROM sales_daily")
+            assert await refresh_forecasts(database, "s1", now=now) == 0
+            reorder = await database.fetch_all("SELECT reorder_qty FROM inventory_metrics ORDER BY product_id")
+            assert [row["reorder_qty"] for row in reorder] == [48, 48]
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+import random
+
+from analytics.inventory import InventoryMetrics
+
+
+def baseline_product(row, store_id):
+    """
+    The per-row formulas /inventory/stock used before the vectorized engine.
+    """
+    current_stock = row["current_stock"] or 0
+    avg_daily_sales = row["avg_daily_sales"] or 0
+    safety_stock = row["safety_stock"] or 0
+    lead_time_days = row["lead_time_days"] or 0
+
+    estimated_days_left = None
+    if avg_daily_sales > 0:
+        estimated_days_left = round(current_stock / avg_daily_sales, 1)
+
+    sales_trend = "stable"
+    if estimated_days_left is not None:
+        if estimated_days_left <= 7:
+            sales_trend = "decreasing"
+        elif estimated_days_left >= 30:
+            sales_trend = "increasing"
+
+    product = {
+        "id": str(row["id"] or ""),
+        "product_id": str(row["id"] or ""),
+        "name": str(row["name"] or ""),
+        "price": row["price"],
+        "store_id": str(row["store_id"] or store_id),
+        "current_stock": float(current_stock),
+        "avg_daily_sales": float(avg_daily_sales),
+        "safety_stock": float(safety_stock),
+        "lead_time_days": int(lead_time_days),
+        "estimated_days_left": estimated_days_left,
+        "sales_trend": sales_trend,
+        "reorder_qty_suggestion": max(0, int(safety_stock + avg_daily_sales * lead_time_days - current_stock)),
+        "is_critical": estimated_days_left is not None and estimated_days_left <= 7,
+    }
+    return {k: v for k, v in product.items() if v is not None}
+
+
+def baseline_summary(products):
+    return {
+        "total_products": len(products),
+        "critical_count": sum(1 for p in products if p.get("is_critical")),
+        "low_stock_count": sum(
+            1 for p in products if p.get("estimated_days_left") and p.get("estimated_days_left") <= 30
+        ),
+    }
+
+
+def make_row(index, stock, sales, safety=None, lead=None, price=None, store_id="s1"):
+    return {
+        "id": f"P{index}", "name": f"Product {index}", "price": price, "store_id": store_id,
+        "current_stock": stock, "avg_daily_sales": sales, "safety_stock": safety, "lead_time_days": lead,
+    }
+
+
+# Ties and near-ties where NumPy's rounding and Python's round disagree,
+# plus the threshold edges and NULL/zero columns
+EDGES = [
+    (7, 20), (601, 20), (141, 20), (139, 20), (29, 4), (70, 10), (70.5, 10), (300, 10), (299.4, 10),
+    (0, 3), (5, 0), (5, None), (None, 2), (1, 3), (2, 3), (10**9 + 1, 2), (71, 10), (7.05, 1),
+]
+
+
+def test_vectorized_metrics_match_the_per_row_formulas():
+    rng = random.Random(9)
+    rows = [make_row(i, stock, sales, lead=5) for i, (stock, sales) in enumerate(EDGES)]
+    for i in range(len(rows), 2000):
+        rows.append(make_row(
+            i,
+            rng.choice([rng.randint(0, 500), round(rng.uniform(0, 500), 2), None]),
+            rng.choice([rng.randint(0, 40), round(rng.uniform(0, 40), 2), 0, None]),
+            safety=rng.choice([None, rng.randint(0, 50), round(rng.uniform(0, 50), 1)]),
+            lead=rng.choice([None, rng.randint(0, 30)]),
+            price=rng.choice([None, round(rng.uniform(1, 100), 2)]),
+            store_id=rng.choice(["s1", "s2", None]),
+        ))
+
+    metrics = InventoryMetrics(rows, default_store_id="s1")
+    expected = [baseline_product(row, "s1") for row in rows]
+
+    assert metrics.products() == expected
+    assert metrics.summary() == baseline_summary(expected)
+    by_store = metrics.summary_by_store()
+    for store in ("s1", "s2"):
+        assert by_store[store] == baseline_summary([p for p in expected if p["store_id"] == store])
+
+
+def test_empty_batch():
+    metrics = InventoryMetrics([])
+    assert metrics.products() == []
+    assert metrics.summary() == {"total_products": 0, "critical_count": 0, "low_stock_count": 0}
+    assert metrics.summary_by_store() == {}
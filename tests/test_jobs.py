@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import pytest
+
+from jobs.queue import QUEUED, JobQueue
+
+
+class FakeJobsTable:
+    """
+    The slice of the database API JobQueue uses, over persisted job rows.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch_all(self, query, values=None):
+        return self.rows
+
+    async def execute(self, query, values=None):
+        return None
+
+
+def test_restore_past_max_queued_and_bound_submit():
+    async def scenario():
+        rows = [
+            {
+                "id": f"job-{i}", "kind": "noop", "priority": 0, "payload": json.dumps({}),
+                "timeout": None, "created_at": float(i),
+            }
+            for i in range(5)
+        ]
+
+        async def noop(payload, job):
+            return None
+
+        jobs = JobQueue(FakeJobsTable(rows), {"noop": noop}, workers=0, max_queued=2)
+        await jobs.start()
+        try:
+            assert len(jobs.jobs) == 5
+            assert all(job.status == QUEUED for job in jobs.jobs.values())
+            with pytest.raises(asyncio.QueueFull):
+                await jobs.submit("noop", {})
+        finally:
+            await jobs.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_jobs_free_their_queue_slots():
+    async def scenario():
+        async def noop(payload, job):
+            return None
+
+        jobs = JobQueue(FakeJobsTable([]), {"noop": noop}, workers=0, max_queued=2)
+        await jobs.start()
+        try:
+            for _ in range(5):
+                first = await jobs.submit("noop", {})
+                second = await jobs.submit("noop", {})
+                with pytest.raises(asyncio.QueueFull):
+                    await jobs.submit("noop", {})
+                await jobs.cancel(first.id)
+                await jobs.cancel(second.id)
+            # Ten cancelled entries still sit in the queue, none of them waiting
+            assert jobs._queue.qsize() == 10
+            await jobs.submit("noop", {})
+        finally:
+            await jobs.stop()
+
+    asyncio.run(scenario())
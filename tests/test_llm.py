@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from config.llm import LLMClient, LLMError
+
+
+class SlowThenFast:
+    """
+    Upstream that takes `delay` seconds per call; set `delay` to 0 to heal it.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def make_client(upstream, **options) -> LLMClient:
+    options = {"timeout": 0.2, "max_retries": 0, "breaker_threshold": 1, "breaker_reset": 0.1, **options}
+    return LLMClient(lambda: upstream, **options)
+
+
+def test_breaker_recovers_after_half_open_trial_times_out():
+    async def scenario():
+        upstream = SlowThenFast(delay=1.0)
+        llm = make_client(upstream)
+
+        with pytest.raises(LLMError) as first:
+            await llm("q1")
+        assert first.value.kind == "timeout"
+        assert llm.breakers["gpt-4o-mini"].state == "open"
+
+        await asyncio.sleep(0.15)
+        # The half-open trial times out as well and re-opens the circuit
+        with pytest.raises(LLMError) as trial:
+            await llm("q2")
+        assert trial.value.kind == "timeout"
+
+        upstream.delay = 0
+        await asyncio.sleep(0.15)
+        assert await llm("q3") == "ok"
+        assert llm.breakers["gpt-4o-mini"].state == "closed"
+        assert await llm("q4") == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_half_open_trial_frees_the_breaker():
+    async def scenario():
+        upstream = SlowThenFast(delay=1.0)
+        # Not single-flighted, so cancelling the caller cancels the request
+        llm = make_client(upstream, timeout=5.0, temperature=0.5)
+        breaker = llm._breaker("gpt-4o-mini")
+        breaker.failure()
+        await asyncio.sleep(0.15)
+
+        call = asyncio.ensure_future(llm("q1"))
+        await asyncio.sleep(0.05)
+        assert breaker.trial_running
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        assert not breaker.trial_running
+
+        upstream.delay = 0
+        assert await llm("q2") == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_no_hedge_while_half_open():
+    async def scenario():
+        upstream = SlowThenFast(delay=0.05)
+        llm = make_client(upstream, timeout=1.0)
+        for _ in range(llm.latency.min_samples):
+            llm.latency.add(0.01)
+        llm._breaker("gpt-4o-mini").failure()
+        await asyncio.sleep(0.15)
+
+        assert await llm("q") == "ok"
+        assert llm.hedged == 0
+        assert upstream.calls == 1
+
+    asyncio.run(scenario())
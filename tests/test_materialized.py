@@ -0,0 +1,139 @@
+import asyncio
+import math
+import sqlite3
+
+from analytics.inventory import PRODUCT_COLUMNS, InventoryMetrics
+from db.materialized import BACKFILL, SCHEMA, ensure_inventory_metrics, metrics_summary
+from db.storage import SQLiteStorage
+
+TABLES = [
+    "CREATE TABLE stores (id VARCHAR PRIMARY KEY, name VARCHAR, location VARCHAR)",
+    """
+    CREATE TABLE products (
+        id VARCHAR PRIMARY KEY, name VARCHAR, price FLOAT, store_id VARCHAR,
+        current_stock INTEGER, avg_daily_sales FLOAT, safety_stock INTEGER, lead_time_days INTEGER
+    )
+    """,
+    """
+    CREATE TABLE product_forecasts (
+        store_id VARCHAR, product_id VARCHAR, safety_stock INTEGER,
+        PRIMARY KEY (store_id, product_id)
+    )
+    """,
+    """
+    CREATE TABLE inventory_metrics (
+        store_id VARCHAR, product_id VARCHAR, days_of_cover FLOAT,
+        is_critical BOOLEAN NOT NULL, reorder_qty INTEGER NOT NULL,
+        PRIMARY KEY (store_id, product_id)
+    )
+    """,
+]
+
+PRODUCTS = [
+    # (id, store_id, current_stock, avg_daily_sales, safety_stock, lead_time_days)
+    ("P1", "s1", 141, 20.0, 10, 7),   # 7.05: Python rounds to 7.0, SQLite's ROUND to 7.1
+    ("P2", "s1", 29, 4.0, 5, 3),      # 7.25, an exact tie
+    ("P3", "s1", 0, 2.5, 3, 2),
+    ("P4", "s1", 500, 3.0, 0, 10),
+    ("P5", "s2", 12, 0.0, 4, 5),
+    ("P6", "s2", None, 1.5, None, None),
+    ("P7", "s2", 8, None, 2, 1),
+    ("P8", "s2", 61, 2.0, 0, 30),
+]
+
+
+def connect(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    for statement in TABLES + SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO products (id, name, price, store_id, current_stock, avg_daily_sales, safety_stock, lead_time_days)"
+        " VALUES (?1, 'Item ' || ?1, 1.0, ?2, ?3, ?4, ?5, ?6)",
+        PRODUCTS,
+    )
+    return conn
+
+
+def assert_matches(conn):
+    rows = conn.execute(f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products ORDER BY id").fetchall()
+    metrics = InventoryMetrics(rows)
+    stored = {
+        (row["store_id"], row["product_id"]): row
+        for row in conn.execute("SELECT * FROM inventory_metrics")
+    }
+    assert set(stored) == {(store_id, pid) for store_id, pid in zip(metrics.store_ids, metrics.ids)}
+    for i, pid in enumerate(metrics.ids):
+        row = stored[(metrics.store_ids[i], pid)]
+        days = None if row["days_of_cover"] is None else round(row["days_of_cover"], 1)
+        expected = None if math.isnan(metrics.days_left[i]) else float(metrics.days_left[i])
+        assert days == expected, pid
+        assert bool(row["is_critical"]) == bool(metrics.is_critical[i]), pid
+        assert row["reorder_qty"] == int(metrics.reorder_qty[i]), pid
+
+
+def test_triggers_match_inventory_metrics(tmp_path):
+    conn = connect(str(tmp_path / "data.db"))
+    assert_matches(conn)
+
+    conn.execute("UPDATE products SET current_stock = 140 WHERE id = 'P1'")
+    conn.execute("UPDATE products SET avg_daily_sales = 0.5, lead_time_days = 20 WHERE id = 'P4'")
+    conn.execute("UPDATE products SET store_id = 's2' WHERE id = 'P2'")
+    conn.execute("UPDATE products SET id = 'P9' WHERE id = 'P3'")
+    conn.execute("UPDATE products SET name = 'Renamed', price = 2.0 WHERE id = 'P8'")
+    assert_matches(conn)
+
+    conn.execute("DELETE FROM products WHERE id IN ('P5', 'P9')")
+    assert_matches(conn)
+
+    conn.execute("DELETE FROM inventory_metrics")
+    conn.execute(BACKFILL)
+    assert_matches(conn)
+
+
+def test_summary_counts_match_inventory_metrics(tmp_path):
+    path = str(tmp_path / "data.db")
+    connect(path).close()
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        try:
+            by_store = await metrics_summary(database)
+            rows = await database.fetch_all(f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products")
+            assert by_store == InventoryMetrics(rows).summary_by_store()
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_outdated_update_trigger_is_replaced(tmp_path):
+    path = str(tmp_path / "data.db")
+    conn = connect(path)
+    # The definition before `id` was in the column list
+    conn.execute("DROP TRIGGER trg_products_metrics_update")
+    conn.execute(
+        """
+        CREATE TRIGGER trg_products_metrics_update
+        AFTER UPDATE OF store_id, current_stock ON products
+        BEGIN
+            DELETE FROM inventory_metrics WHERE store_id = OLD.store_id AND product_id = OLD.id;
+        END
+        """
+    )
+    conn.close()
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        try:
+            await ensure_inventory_metrics(database)
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("UPDATE products SET id = 'P10' WHERE id = 'P1'")
+    assert_matches(conn)
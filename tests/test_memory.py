@@ -0,0 +1,56 @@
+import asyncio
+
+from db.storage import SQLiteStorage
+from memory.store import MemoryStore
+
+SCHEMA = """
+CREATE TABLE conversation_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id VARCHAR, role VARCHAR, content VARCHAR, created_at FLOAT
+)
+"""
+
+
+def test_evicted_session_restores_once_with_unflushed_turns(tmp_path):
+    path = str(tmp_path / "data.db")
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=2)
+        await database.connect()
+        try:
+            await database.execute(SCHEMA)
+            memory = MemoryStore(database, max_sessions=1)
+            memory.append("a", "user", "written")
+            await memory.flush()
+            memory.append("a", "assistant", "not written yet")
+            memory.append("b", "user", "evicts a")
+            assert "a" not in memory.sessions
+
+            await asyncio.gather(*(memory.ensure_loaded("a") for _ in range(3)))
+            assert memory.history("a") == "user: written\nassistant: not written yet"
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_pending_turns_are_capped_while_writes_fail(tmp_path):
+    path = str(tmp_path / "data.db")
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        try:
+            # No conversation_turns table: every flush fails
+            memory = MemoryStore(database, max_pending=5)
+            for i in range(8):
+                memory.append("a", "user", str(i))
+            try:
+                await memory.flush()
+            except Exception:
+                pass
+            assert [turn["content"] for turn in memory._pending] == ["3", "4", "5", "6", "7"]
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+import asyncio
+
+from agents.orchestrator import Orchestrator
+from telemetry.metrics import FAILURES
+
+
+async def fake_llm(prompt: str, **kwargs) -> str:
+    return "sales_agent"
+
+
+def test_route_batch_keeps_input_order_and_isolates_failures():
+    orchestrator = Orchestrator(fake_llm)
+    calls = []
+
+    async def route(message, context=None, session_id=None):
+        calls.append(message)
+        # Later items finish first, so completion order differs from input order
+        await asyncio.sleep({"first": 0.03, "second": 0.01}.get(message, 0))
+        if message == "broken":
+            raise ValueError("agent exploded")
+        return {"agent": "sales_agent", "response": f"answer to {message}", "meta": {"cached": False}}
+
+    orchestrator.route = route
+    items = [
+        {"message": "first"},
+        {"message": "broken"},
+        {"message": "second"},
+        {"message": "First "},
+        {"message": "first", "context": "store_id: S2"},
+    ]
+    failures_before = FAILURES.values.get(("batch", "ValueError"), 0)
+    results = asyncio.run(orchestrator.route_batch(items, concurrency=2))
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert results[0]["response"] == "answer to first"
+    assert results[2]["response"] == "answer to second"
+    assert results[4]["response"] == "answer to first"
+
+    broken = results[1]
+    assert broken["agent"] == "error"
+    assert broken["error"] == {"type": "internal", "message": "agent exploded"}
+    assert "agent exploded" in broken["response"]
+    assert all("error" not in r for i, r in enumerate(results) if i != 1)
+    assert FAILURES.values[("batch", "ValueError")] == failures_before + 1
+
+    # "First " normalizes to "first" with the same context: it shares item 0's run
+    assert calls.count("first") == 2 and "First " not in calls
+    assert [r["meta"]["deduplicated"] for r in results] == [False, False, False, True, False]
+    assert results[3]["timing"] == results[0]["timing"]
+
+
+def test_compound_request_fans_out_and_merges_with_a_failing_agent():
+    orchestrator = Orchestrator(fake_llm, agent_timeout=0.2, max_parallel_agents=3)
+    plan = ["reporting_agent", "sales_agent", "stock_agent"]
+    contexts = []
+    running = []
+
+    async def planned(user_input):
+        return plan
+
+    async def build_context(name, user_input, context=None, history=""):
+        contexts.append(name)
+        return f"context for {name in Orchestrator.INVENTORY_AGENTS}"
+
+    def agent_run(name, delay, error=None):
+        async def run(user_input, context):
+            running.append(name)
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return {"agent": name, "response": f"{name} says hi", "data": {"context": context}}
+
+        return run
+
+    orchestrator.plan = planned
+    orchestrator.build_context = build_context
+    orchestrator.agents["reporting_agent"].run = agent_run("reporting_agent", 0.01, RuntimeError("db is down"))
+    orchestrator.agents["sales_agent"].run = agent_run("sales_agent", 0.05)
+    orchestrator.agents["stock_agent"].run = agent_run("stock_agent", 5)
+    failures_before = FAILURES.values.get(("reporting_agent", "RuntimeError"), 0)
+    timeouts_before = FAILURES.values.get(("stock_agent", "TimeoutError"), 0)
+
+    result = asyncio.run(orchestrator.route("sales trend and what to reorder?"))
+
+    # All three started together and the inventory context was built once
+    assert sorted(running) == sorted(plan)
+    assert sorted(contexts) in (["reporting_agent", "sales_agent"], ["reporting_agent", "stock_agent"])
+
+    sections = result["meta"]["sections"]
+    assert [s["agent"] for s in sections] == plan
+    assert result["meta"]["agents"] == plan
+    assert result["meta"]["incomplete"] is True
+    assert sections[0]["error"] == {"type": "internal", "message": "db is down"}
+    assert "error" not in sections[1]
+    assert sections[2]["error"]["type"] == "timeout"
+    assert FAILURES.values[("reporting_agent", "RuntimeError")] == failures_before + 1
+    assert FAILURES.values[("stock_agent", "TimeoutError")] == timeouts_before + 1
+
+    # The first agent that answered fills the top-level fields
+    assert "error" not in result
+    assert result["agent"] == "sales_agent"
+    assert result["data"] == {"context": "context for True"}
+    assert result["response"].split("\n\n")[1] == "Sales:\nsales_agent says hi"
+    assert result["response"].startswith("Report:\nThe report analysis failed: db is down")
+    assert result["meta"]["elapsed_ms"] < 1000
+
+    # Incomplete answers are not cached
+    assert orchestrator.response_cache.get(
+        ("sales trend and what to reorder?", "", "", tuple(plan))
+    ) is None
+
+
+def test_merge_reports_an_error_when_every_agent_failed():
+    orchestrator = Orchestrator(fake_llm)
+    outcomes = [
+        ("stock_agent", {"agent": "stock_agent", "response": "x", "error": {"type": "timeout", "message": "x"}}, 5.0),
+        ("sales_agent", {"agent": "sales_agent", "response": "y", "error": {"type": "internal", "message": "y"}}, 1.0),
+    ]
+    merged = orchestrator._merge(["sales_agent", "stock_agent"], outcomes, 0.0)
+    assert merged["agent"] == "sales_agent"
+    assert merged["error"] == {"type": "internal", "message": "y"}
+    assert [s["elapsed_ms"] for s in merged["meta"]["sections"]] == [1.0, 5.0]
+    assert merged["response"] == "Sales:\ny\n\nStock:\nx"
@@ -0,0 +1,131 @@
+import asyncio
+import sqlite3
+import threading
+
+from db import versions
+from db.storage import SQLiteStorage
+from rag.retriever import HybridRetriever
+from rag.vector_store import HashingEmbedder, VectorStore
+
+
+def make_db(path) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE stores (id VARCHAR PRIMARY KEY, name VARCHAR, location VARCHAR)")
+    conn.execute(
+        "CREATE TABLE products (id VARCHAR PRIMARY KEY, name VARCHAR, store_id VARCHAR, "
+        "current_stock INTEGER, avg_daily_sales FLOAT)"
+    )
+    conn.execute("CREATE TABLE product_forecasts (store_id VARCHAR, product_id VARCHAR, safety_stock INTEGER)")
+    for statement in versions.SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO stores VALUES ('store-001', 'Main', 'New York')")
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?, 'store-001', 10, 1.0)",
+        [(f"PRD-{i}", f"Item {i}") for i in range(50)],
+    )
+    conn.commit()
+    conn.close()
+
+
+class CountingStorage(SQLiteStorage):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = []
+
+    async def fetch_all(self, query, values=None):
+        self.queries.append(query)
+        return await super().fetch_all(query, values)
+
+
+def write(path, *statements) -> None:
+    conn = sqlite3.connect(path)
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def test_sync_fetches_only_changed_products(tmp_path):
+    path = str(tmp_path / "inventory.db")
+    make_db(path)
+
+    async def scenario():
+        database = CountingStorage(path, readers=2)
+        await database.connect()
+        retriever = HybridRetriever(database, VectorStore(str(tmp_path / "vectors")))
+        try:
+            await retriever.load()
+            write(
+                path,
+                "UPDATE products SET current_stock = 0 WHERE id = 'PRD-1'",
+                "UPDATE products SET name = 'Wireless Keyboard' WHERE id = 'PRD-2'",
+                "DELETE FROM products WHERE id = 'PRD-3'",
+                "INSERT INTO products VALUES ('PRD-99', 'Gaming Mouse', 'store-001', 5, 2.0)",
+            )
+            await versions.refresh(database)
+            database.queries.clear()
+
+            hits = await asyncio.gather(*(retriever.search("wireless keyboard", "store-001") for _ in range(3)))
+            assert all(rows and rows[0]["id"] == "PRD-2" for rows in hits)
+            assert not any("WHERE store_id" in query for query in database.queries)
+            assert sum("WHERE id IN" in query for query in database.queries) == 1
+
+            assert retriever.products["PRD-1"]["current_stock"] == 0
+            assert "PRD-3" not in retriever.products
+            assert not retriever.vector_store.contains("PRD-3")
+            assert (await retriever.search("gaming mouse", "store-001"))[0]["id"] == "PRD-99"
+        finally:
+            versions._listeners.remove(retriever._mark_dirty)
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_pruned_log_falls_back_to_full_resync(tmp_path):
+    path = str(tmp_path / "inventory.db")
+    make_db(path)
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        retriever = HybridRetriever(database, VectorStore(str(tmp_path / "vectors")))
+        try:
+            await retriever.load()
+            write(path, "DELETE FROM products WHERE id = 'PRD-4'", *versions.RESET_CHANGES)
+            await versions.refresh(database)
+            await retriever.search("item", "store-001")
+            assert "PRD-4" not in retriever.products
+            assert len(retriever.products) == 49
+        finally:
+            versions._listeners.remove(retriever._mark_dirty)
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+
+def test_load_embeds_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "inventory.db")
+    make_db(path)
+    calls = []
+    embedder = HashingEmbedder(64)
+
+    def recording_embedder(texts):
+        calls.append((len(texts), threading.current_thread() is threading.main_thread()))
+        return embedder(texts)
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        retriever = HybridRetriever(database, VectorStore(str(tmp_path / "vectors"), dim=64, embedder=recording_embedder))
+        retriever.EMBED_BATCH = 20
+        try:
+            await retriever.load()
+            assert calls == [(20, False), (20, False), (10, False)]
+            assert len(retriever.vector_store) == 50
+            assert (await retriever.search("item 7", "store-001"))[0]["id"] == "PRD-7"
+        finally:
+            versions._listeners.remove(retriever._mark_dirty)
+            await database.disconnect()
+
+    asyncio.run(scenario())
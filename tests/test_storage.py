@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from db.storage import SQLiteStorage
+
+
+def test_iterate_stopped_early_releases_a_fresh_connection(tmp_path):
+    path = str(tmp_path / "data.db")
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        try:
+            await database.execute("CREATE TABLE t (x INTEGER)")
+            await database.execute_many("INSERT INTO t VALUES (:x)", [{"x": i} for i in range(100)])
+
+            rows = database.iterate("SELECT x FROM t", chunk_size=10)
+            async for _ in rows:
+                break
+            await rows.aclose()
+            assert database.stats()["idle_readers"] == 1
+
+            await database.execute("INSERT INTO t VALUES (1000)")
+            # The only reader must see the new row, not the iterator's snapshot
+            assert await database.fetch_val("SELECT COUNT(*) FROM t") == 101
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_reads_inside_transaction_raise(tmp_path):
+    path = str(tmp_path / "data.db")
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        try:
+            await database.execute("CREATE TABLE t (x INTEGER)")
+            async with database.transaction():
+                assert await database.execute("INSERT INTO t VALUES (1)") is None
+                with pytest.raises(RuntimeError):
+                    await database.fetch_all("SELECT x FROM t")
+            assert await database.fetch_val("SELECT COUNT(*) FROM t") == 1
+        finally:
+            await database.disconnect()
+
+    asyncio.run(scenario())
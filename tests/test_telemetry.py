@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from agents.sales_agent import SalesAgent
+from config.llm import LLM_SECONDS, LLMClient
+from telemetry.metrics import FAILURES, LLM_TOKENS, REGISTRY, STAGE_SECONDS, collect, record_failure
+
+MODEL = "telemetry-test-model"
+
+
+class Upstream:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        message = SimpleNamespace(content="ok")
+        usage = SimpleNamespace(prompt_tokens=11, completion_tokens=3)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def histogram_count(histogram, *labels) -> int:
+    series = histogram.series.get(labels)
+    return series[2] if series else 0
+
+
+def test_llm_call_updates_counters_histograms_and_trace():
+    upstream = Upstream()
+    agent = SalesAgent(name="telemetry_agent", llm=LLMClient(lambda: upstream, model=MODEL), system_prompt="")
+    prompt_before = LLM_TOKENS.values.get((MODEL, "prompt"), 0)
+    completion_before = LLM_TOKENS.values.get((MODEL, "completion"), 0)
+    llm_before = histogram_count(LLM_SECONDS, MODEL)
+    stage_before = histogram_count(STAGE_SECONDS, "telemetry_agent.llm")
+
+    async def scenario():
+        with collect() as trace:
+            result = await agent.run("how are sales?")
+        return result, trace
+
+    result, trace = asyncio.run(scenario())
+
+    assert result["response"] == "ok"
+    assert LLM_TOKENS.values[(MODEL, "prompt")] == prompt_before + 11
+    assert LLM_TOKENS.values[(MODEL, "completion")] == completion_before + 3
+    assert histogram_count(LLM_SECONDS, MODEL) == llm_before + 1
+    assert histogram_count(STAGE_SECONDS, "telemetry_agent.llm") == stage_before + 1
+    assert histogram_count(STAGE_SECONDS, "telemetry_agent.prepare") >= 1
+
+    meta = trace.meta()
+    assert meta["tokens"] == {"prompt": 11, "completion": 3}
+    assert {"telemetry_agent.prepare", "telemetry_agent.llm", "total"} <= set(meta["timings"])
+
+    text = REGISTRY.render()
+    assert f'smart_sales_llm_tokens_total{{model="{MODEL}",type="prompt"}}' in text
+    assert f'smart_sales_llm_request_duration_seconds_count{{model="{MODEL}"}}' in text
+    assert f'smart_sales_llm_request_duration_seconds_bucket{{model="{MODEL}",le="+Inf"}}' in text
+
+
+def test_record_failure_counts_by_stage_and_type():
+    before = FAILURES.values.get(("telemetry_test", "ValueError"), 0)
+    record_failure("telemetry_test", ValueError("boom"))
+    record_failure("telemetry_test", ValueError("other message"))
+    assert FAILURES.values[("telemetry_test", "ValueError")] == before + 2
+    assert 'smart_sales_handled_failures_total{stage="telemetry_test",error="ValueError"}' in REGISTRY.render()
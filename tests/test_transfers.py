@@ -0,0 +1,143 @@
+import asyncio
+
+import numpy as np
+
+from agents.stock_agent import StockAgent
+from analytics.inventory import InventoryMetrics
+from analytics.transfers import plan_transfers
+from telemetry.metrics import FAILURES
+
+
+def row(product_id, name, store_id, stock, sales, safety=0, lead=5):
+    return {
+        "id": product_id, "name": name, "price": None, "store_id": store_id,
+        "current_stock": stock, "avg_daily_sales": sales, "safety_stock": safety, "lead_time_days": lead,
+    }
+
+
+ROWS = [
+    # Widget: s1 has 85 above its reorder point, s2 and s3 are short 10 and 5
+    row("W1", "Widget", "s1", 100, 1, safety=10),
+    row("W2", "Widget", "s2", 0, 2),
+    row("W3", "Widget", "s3", 5, 1, lead=10),
+    # Gadget: 10 spare units for 30 + 19 short; s2 has the least cover
+    row("G1", "Gadget", "s1", 20, 1, safety=5),
+    row("G2", "Gadget", "s2", 0, 1, lead=30),
+    row("G3", "Gadget", "s3", 1, 2, lead=10),
+    # Bolt: two donors (3 and 4 spare) for one receiver short 5
+    row("B1", "Bolt", "s1", 13, 1, safety=5),
+    row("B2", "bolt ", "s2", 0, 1),
+    row("B3", "Bolt", "s3", 14, 1, safety=5),
+    # Only stocked in s2
+    row("S2", "Solo", "s2", 0, 5),
+]
+
+
+def reorder_point(r):
+    return r["safety_stock"] + r["avg_daily_sales"] * r["lead_time_days"]
+
+
+def sent_and_received(plan, rows):
+    sent, received = np.zeros(len(rows)), np.zeros(len(rows))
+    np.add.at(sent, plan.source_row, plan.quantity)
+    np.add.at(received, plan.target_row, plan.quantity)
+    return sent, received
+
+
+def check_invariants(rows, plan):
+    sent, received = sent_and_received(plan, rows)
+    names = [r["name"].strip().lower() for r in rows]
+    for name in set(names):
+        members = [i for i, n in enumerate(names) if n == name]
+        supply = sum(max(0, np.floor(rows[i]["current_stock"] - reorder_point(rows[i]))) for i in members)
+        demand = sum(max(0, np.ceil(rows[i]["avg_daily_sales"] * rows[i]["lead_time_days"] - rows[i]["current_stock"]))
+                     for i in members)
+        expected = min(supply, demand) if len(members) > 1 else 0
+        assert sent[members].sum() == received[members].sum() == expected, name
+    for i, r in enumerate(rows):
+        if sent[i]:
+            assert r["current_stock"] - sent[i] >= reorder_point(r)
+            assert not received[i]
+
+
+def test_moves_min_of_supply_and_demand_without_draining_donors():
+    plan = plan_transfers(InventoryMetrics(ROWS))
+    check_invariants(ROWS, plan)
+    assert plan.summary["units"] == 15 + 10 + 5
+    assert plan.summary["products_considered"] == 3
+    assert plan.summary["unmet_units"] == 39
+
+
+def test_least_covered_receivers_are_served_first():
+    plan = plan_transfers(InventoryMetrics(ROWS))
+    _, received = sent_and_received(plan, ROWS)
+    ids = [r["id"] for r in ROWS]
+    assert received[ids.index("G2")] == 10
+    assert received[ids.index("G3")] == 0
+    # Transfers are listed most urgent receiver first
+    assert list(plan.cover_before) == sorted(plan.cover_before)
+
+
+def test_single_store_products_get_no_transfers():
+    plan = plan_transfers(InventoryMetrics(ROWS))
+    ids = [r["id"] for r in ROWS]
+    assert ids.index("S2") not in plan.target_row
+    assert plan_transfers(InventoryMetrics([row("X1", "Solo", "s1", 100, 1), row("X2", "Other", "s2", 0, 1)])).summary[
+        "transfers"] == 0
+
+
+def test_view_totals_per_store():
+    plan = plan_transfers(InventoryMetrics(ROWS))
+    everything = plan.view(None)
+    assert sum(t["quantity"] for t in everything["transfers"]) == 30
+
+    for store in ("s1", "s2", "s3"):
+        view = plan.view(store)
+        units_in = sum(t["quantity"] for t in everything["transfers"] if t["to_store"] == store)
+        units_out = sum(t["quantity"] for t in everything["transfers"] if t["from_store"] == store)
+        assert view["summary"]["store_units_in"] == units_in
+        assert view["summary"]["store_units_out"] == units_out
+        assert all(store in (t["from_store"], t["to_store"]) for t in view["transfers"])
+    assert plan.view("s2")["summary"]["store_units_in"] == 25
+    assert plan.view("s2")["summary"]["store_units_out"] == 0
+
+    assert plan.view("s1", max_rows=1)["summary"]["listed"] == 1
+
+
+def test_view_of_unknown_store_is_empty():
+    plan = plan_transfers(InventoryMetrics(ROWS))
+    for store in ("s0", "s9", "zzz"):
+        view = plan.view(store)
+        assert view["transfers"] == []
+        assert view["summary"]["store_transfers"] == 0
+        assert view["summary"]["store_units_in"] == view["summary"]["store_units_out"] == 0
+        assert view["summary"]["units"] == 30
+
+
+def test_random_networks_keep_invariants():
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        rows = [
+            row(f"P{p}-S{s}", f"Product {p}", f"s{s}",
+                int(rng.integers(0, 60)), float(rng.integers(0, 5)), int(rng.integers(0, 10)), int(rng.integers(1, 8)))
+            for p in range(int(rng.integers(1, 8)))
+            for s in range(4)
+            if rng.random() < 0.7
+        ]
+        if rows:
+            check_invariants(rows, plan_transfers(InventoryMetrics(rows)))
+
+
+def test_stock_agent_prompts_without_transfers_when_planning_fails():
+    async def failing_plan(store_id):
+        raise RuntimeError("pool closed")
+
+    agent = StockAgent(name="stock_agent", llm=None, system_prompt="", database=object())
+    agent.transfers.for_store = failing_plan
+    before = FAILURES.values.get(("transfers", "RuntimeError"), 0)
+
+    prompt, data = asyncio.run(agent.prepare("what should I move?", "store_id: s1"))
+
+    assert data is None
+    assert "Transfer plan" not in prompt and "store_id: s1" in prompt
+    assert FAILURES.values[("transfers", "RuntimeError")] == before + 1
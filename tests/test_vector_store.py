@@ -0,0 +1,51 @@
+import os
+
+from rag.vector_store import VectorStore
+
+NAMES = ["wireless keyboard", "usb hub", "monitor stand", "webcam", "desk lamp", "gaming mouse", "hdmi cable", "headphones"]
+
+
+def test_reopening_with_another_dim_rebuilds(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = VectorStore(path, dim=64)
+    store.upsert(["P1"], ["s1"], texts=["wireless keyboard"])
+    store.flush()
+
+    reopened = VectorStore(path, dim=128)
+    assert reopened.dim == 128 and len(reopened) == 0
+    assert reopened.query("keyboard") == []
+    reopened.upsert(["P1"], ["s1"], texts=["wireless keyboard"])
+    reopened.flush()
+    assert VectorStore(path, dim=128).query("keyboard")[0]["id"] == "P1"
+
+
+def test_delete_and_readd_churn_is_compacted(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = VectorStore(path, dim=64, initial_capacity=16)
+    ids = [f"P{i}" for i in range(len(NAMES))]
+    store.upsert(ids, ["s1"] * len(ids), texts=NAMES)
+    for _ in range(50):
+        store.delete(ids=ids[:4])
+        store.upsert(ids[:4], ["s2"] * 4, texts=NAMES[:4])
+
+    assert len(store) == len(ids)
+    assert store.capacity == 16 and store.count <= 16
+    assert os.path.getsize(os.path.join(path, "vectors.npy")) < 16 * 64 * 4 + 1024
+    assert sorted(store.item_ids()) == sorted(ids)
+    assert store.query("gaming mouse", k=1)[0]["id"] == "P5"
+    assert {hit["id"] for hit in store.query("", k=10, store_id="s2")} == set(ids[:4])
+
+    store.flush()
+    reopened = VectorStore(path, dim=64)
+    assert len(reopened) == len(ids)
+    assert reopened.query("webcam", k=1, store_id="s2")[0]["id"] == "P3"
+
+
+def test_growth_without_tombstones_keeps_rows(tmp_path):
+    store = VectorStore(str(tmp_path / "vectors"), dim=64, initial_capacity=2)
+    ids = [f"P{i}" for i in range(len(NAMES))]
+    store.upsert(ids[:1], ["s1"], texts=NAMES[:1])
+    store.delete(ids=ids[:1])
+    store.upsert(ids, ["s1"] * len(ids), texts=NAMES)
+    assert len(store) == len(ids) and store.capacity == 8
+    assert store.query("desk lamp", k=1)[0]["id"] == "P4"
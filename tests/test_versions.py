@@ -0,0 +1,54 @@
+import asyncio
+import sqlite3
+
+from db import versions
+from db.storage import SQLiteStorage
+
+
+def make_db(path) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE stores (id VARCHAR PRIMARY KEY, name VARCHAR)")
+    conn.execute("CREATE TABLE products (id VARCHAR PRIMARY KEY, store_id VARCHAR, current_stock INTEGER)")
+    conn.execute("CREATE TABLE product_forecasts (store_id VARCHAR, product_id VARCHAR, safety_stock INTEGER)")
+    for statement in versions.SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO stores VALUES ('store-001', 'Main')")
+    conn.execute("INSERT INTO products VALUES ('PRD-1', 'store-001', 5)")
+    conn.commit()
+    conn.close()
+
+
+def test_external_write_moves_versions(tmp_path):
+    path = str(tmp_path / "inventory.db")
+    make_db(path)
+
+    async def scenario():
+        database = SQLiteStorage(path, readers=1)
+        await database.connect()
+        changed = []
+        versions.subscribe(changed.append)
+        try:
+            await versions.refresh(database)
+            before = versions.get_version("store-001")
+            global_before = versions.get_global_version()
+            stores_before = versions.get_stores_version()
+
+            # Another process writes straight to the file
+            conn = sqlite3.connect(path)
+            conn.execute("UPDATE products SET current_stock = 0 WHERE id = 'PRD-1'")
+            conn.execute("UPDATE stores SET name = 'Renamed' WHERE id = 'store-001'")
+            conn.commit()
+            conn.close()
+
+            changed.clear()
+            assert await versions.refresh(database) == ["store-001"]
+            assert changed == ["store-001"]
+            assert versions.get_version("store-001") > before
+            assert versions.get_global_version() > global_before
+            assert versions.get_stores_version() > stores_before
+            assert await versions.refresh(database) == []
+        finally:
+            versions._listeners.remove(changed.append)
+            await database.disconnect()
+
+    asyncio.run(scenario())